@@ -0,0 +1,294 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Measures the speed of the memoized calls.
+
+    python -m benchmarks.run [--quick] [--only NAME ...] [--out FILE]
+
+The results are printed as a table to stderr, and as JSON to stdout or to
+the `--out` file. The JSON files of two runs can be compared to find
+regressions.
+"""
+
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from filememo import memoize
+from filememo._constants import __version__
+from filememo._keys import args_fingerprint
+
+BACKENDS = ('pickledir', 'sqlite')
+
+SIZES = {'small': 1, 'large': 1024 * 1024}
+
+
+class Recorder:
+    def __init__(self):
+        self.results: List[Dict] = []
+
+    def add(self, name: str, unit: str, samples: List[float], **params):
+        samples = sorted(samples)
+        result = {
+            'name': name,
+            'params': params,
+            'unit': unit,
+            'count': len(samples),
+            'min': samples[0],
+            'median': statistics.median(samples),
+            'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            'max': samples[-1],
+        }
+        self.results.append(result)
+        params_str = ' '.join(f'{k}={v}' for k, v in params.items())
+        print(f'{name:<24} {params_str:<40} '
+              f'median {result["median"]:>12.2f} {unit}',
+              file=sys.stderr)
+
+
+def _timed_us(func: Callable, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - started) * 1e6
+
+
+def _value(size: str) -> bytes:
+    return b'x' * SIZES[size]
+
+
+def _decorate(dir_path: Path, backend: str, max_age=dt.timedelta.max,
+              memory_items: Optional[int] = None, size: str = 'small'):
+    # the same inner function each time, so every decorator created by this
+    # call shares the same cache
+    value = _value(size)
+
+    def function(i):
+        return value
+
+    return memoize(function, dir_path=dir_path, backend=backend,
+                   max_age=max_age, memory_items=memory_items)
+
+
+def bench_latency(rec: Recorder, root: Path, calls: int) -> None:
+    for backend in BACKENDS:
+        for size in SIZES:
+            n = calls if size == 'small' else max(calls // 10, 10)
+            dir_path = root / f'latency_{backend}_{size}'
+            f = _decorate(dir_path, backend, size=size)
+
+            rec.add('cold_miss', 'us', [_timed_us(f, i) for i in range(n)],
+                    backend=backend, size=size)
+            rec.add('warm_hit', 'us', [_timed_us(f, i) for i in range(n)],
+                    backend=backend, size=size)
+
+            # the records are on disk, but too old for this decorator
+            time.sleep(0.01)
+            expired = _decorate(dir_path, backend, size=size,
+                                max_age=dt.timedelta(microseconds=1))
+            rec.add('expired_hit', 'us',
+                    [_timed_us(expired, i) for i in range(n)],
+                    backend=backend, size=size)
+
+            memory = _decorate(dir_path, backend, size=size, memory_items=n)
+            for i in range(n):
+                memory(i)
+            rec.add('memory_hit', 'us', [_timed_us(memory, i)
+                                         for i in range(n)],
+                    backend=backend, size=size)
+
+
+def bench_hot(rec: Recorder, root: Path, calls: int) -> None:
+    # The cost of a single hit is close to the cost of timing it, so the
+    # calls are timed in loops, and the time is divided by the number of
+    # calls
+    def function(*args, **kwargs):
+        return 1
+
+    cases = {
+        'none': ((), {}),
+        'positional': ((1, 'abc'), {}),
+        'keyword': ((), {'a': 1, 'b': 'abc'}),
+    }
+    for tier in ('memory', 'disk'):
+        f = memoize(function, dir_path=root / f'hot_{tier}',
+                    memory_items=100 if tier == 'memory' else None)
+        loop = calls * 10 if tier == 'memory' else calls
+        for name, (args, kwargs) in cases.items():
+            f(*args, **kwargs)
+            samples = []
+            for _ in range(5):
+                started = time.perf_counter()
+                for _ in range(loop):
+                    f(*args, **kwargs)
+                samples.append((time.perf_counter() - started) / loop * 1e6)
+            rec.add('hot_hit', 'us', samples, tier=tier, args=name)
+
+
+def bench_decoration(rec: Recorder, root: Path, calls: int) -> None:
+    def function(i):
+        return i
+
+    rec.add('decorate', 'us',
+            [_timed_us(memoize, function) for _ in range(calls)])
+
+    samples = []
+    for _ in range(5):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import filememo'], check=True)
+        samples.append((time.perf_counter() - started) * 1e3)
+    rec.add('import', 'ms', samples)
+
+
+def bench_threads(rec: Recorder, root: Path, calls: int) -> None:
+    keys = 100
+    for backend in BACKENDS:
+        f = _decorate(root / f'threads_{backend}', backend)
+        for i in range(keys):
+            f(i)
+        for threads in (1, 4, 16):
+            barrier = threading.Barrier(threads)
+
+            def worker(_):
+                barrier.wait()
+                for i in range(calls):
+                    f(i % keys)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(worker, range(threads)))
+            seconds = time.perf_counter() - started
+            rec.add('threads_hits', 'calls/s',
+                    [threads * calls / seconds],
+                    backend=backend, threads=threads)
+
+
+def _process_worker(dir_path: str, backend: str, keys: int,
+                    calls: int) -> float:
+    f = _decorate(Path(dir_path), backend)
+    started = time.perf_counter()
+    for i in range(calls):
+        f(i % keys)
+    return time.perf_counter() - started
+
+
+def bench_processes(rec: Recorder, root: Path, calls: int) -> None:
+    keys = 100
+    for backend in BACKENDS:
+        dir_path = root / f'processes_{backend}'
+        f = _decorate(dir_path, backend)
+        for i in range(keys):
+            f(i)
+        for processes in (1, 4):
+            started = time.perf_counter()
+            with ProcessPoolExecutor(processes) as pool:
+                list(pool.map(_process_worker,
+                              *zip(*[(str(dir_path), backend, keys, calls)]
+                                   * processes)))
+            seconds = time.perf_counter() - started
+            rec.add('processes_hits', 'calls/s',
+                    [processes * calls / seconds],
+                    backend=backend, processes=processes)
+
+
+def _fill(f, start: int, stop: int) -> None:
+    # Writing the records directly is much faster than computing them
+    # one by one, and gives the same files
+    chunk = 10000
+    for begin in range(start, stop, chunk):
+        f.data.set_records([(args_fingerprint((i,), {}), (None, i), None)
+                            for i in range(begin, min(begin + chunk, stop))])
+
+
+def bench_scaling(rec: Recorder, root: Path, calls: int,
+                  max_entries: int) -> None:
+    counts = [n for n in (1000, 10_000, 100_000, 1_000_000, 10_000_000)
+              if n <= max_entries]
+    for backend in BACKENDS:
+        f = _decorate(root / f'scaling_{backend}', backend)
+        filled = 0
+        for count in counts:
+            _fill(f, filled, count)
+            filled = count
+            step = max(count // calls, 1)
+            rec.add('scaled_hit', 'us',
+                    [_timed_us(f, i) for i in range(0, count, step)][:calls],
+                    backend=backend, entries=count)
+            rec.add('scaled_miss', 'us',
+                    [_timed_us(f.get_many, [(-i - 1,)])
+                     for i in range(calls)],
+                    backend=backend, entries=count)
+
+
+BENCHMARKS = ('latency', 'hot', 'decoration', 'threads', 'processes', 'scaling')
+
+
+def run(only: Iterable[str] = BENCHMARKS, quick: bool = False,
+        max_entries: Optional[int] = None) -> Dict:
+    calls = 50 if quick else 1000
+    if max_entries is None:
+        max_entries = 10_000 if quick else 100_000
+    rec = Recorder()
+    with tempfile.TemporaryDirectory() as td:
+        root = Path(td)
+        for name in only:
+            if name == 'latency':
+                bench_latency(rec, root, calls)
+            elif name == 'hot':
+                bench_hot(rec, root, calls)
+            elif name == 'decoration':
+                bench_decoration(rec, root, calls)
+            elif name == 'threads':
+                bench_threads(rec, root, calls)
+            elif name == 'processes':
+                bench_processes(rec, root, calls)
+            elif name == 'scaling':
+                bench_scaling(rec, root, calls, max_entries)
+            else:
+                raise ValueError(f'Unknown benchmark: {name}')
+    return {
+        'meta': {
+            'filememo': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'time': dt.datetime.now(dt.timezone.utc).isoformat(),
+            'quick': quick,
+        },
+        'results': rec.results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS,
+                        default=BENCHMARKS)
+    parser.add_argument('--quick', action='store_true',
+                        help='fewer calls and entries, for a smoke test')
+    parser.add_argument('--max-entries', type=int, default=None,
+                        help='the largest cache for the scaling benchmark, '
+                             'up to 10000000')
+    parser.add_argument('--out', type=Path, default=None,
+                        help='the JSON file to write the results')
+    args = parser.parse_args(argv)
+
+    report = run(args.only, quick=args.quick, max_entries=args.max_entries)
+    text = json.dumps(report, indent=2)
+    if args.out is not None:
+        args.out.write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,3 +3,11 @@
 
 
 from ._deco import memoize, FunctionException
+from ._lock import LockTimeout
+from ._evict import evict
+from ._gc import gc, start_gc
+from ._serial import Serializer
+from ._keys import register_key, fingerprint
+from ._backend import Backend, BackendStats, Record
+from ._stats import CacheStats, CacheEvent
+from ._remote import Remote, DirRemote, HttpRemote
@@ -0,0 +1,6 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+from filememo._cli import main
+
+main()
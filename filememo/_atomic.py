@@ -0,0 +1,73 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import os
+import threading
+from pathlib import Path
+from typing import Union
+
+# Every file of the cache is written to a temporary file, which is then
+# renamed to the target name. The rename is atomic, so the readers see
+# either the old file or the new one, never a partially written file. The
+# temporary name is unique for the process and the thread, so the writers
+# never write to the same temporary file.
+#
+# The durability tells what happens on a power loss or an OS crash:
+#
+# - 'none': the data is not synced. The last written files may be lost or
+#   (on some file systems) empty. Such files are read as misses
+# - 'file': the file is synced before the rename. The renamed file always
+#   has the complete data, but the rename itself may be lost
+# - 'dir': the directory is synced after the rename as well, so the written
+#   file is surely there
+
+DURABILITY = ('none', 'file', 'dir')
+
+
+def check_durability(durability: str) -> None:
+    if durability not in DURABILITY:
+        raise ValueError(f'durability must be one of {DURABILITY}')
+
+
+def temp_path(path: Path, prefix: str = '~') -> Path:
+    return path.parent / (f'{prefix}{path.name}.{os.getpid()}.'
+                          f'{threading.get_ident()}.tmp')
+
+
+def fsync_dir(path: Path) -> None:
+    if os.name == 'nt':
+        # the directories cannot be opened on Windows, and NTFS keeps the
+        # metadata in its journal anyway
+        return
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path: Path, data: Union[bytes, memoryview],
+                 durability: str = 'none', temp_prefix: str = '~') -> None:
+    """Writes the data to the file at `path` so that no one sees it
+    partially written. Creates the parent directory if needed."""
+    temp = temp_path(path, temp_prefix)
+    try:
+        f = open(str(temp), 'wb')
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(str(temp), 'wb')
+    try:
+        with f:
+            f.write(data)
+            if durability != 'none':
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(str(temp), str(path))
+    except BaseException:
+        try:
+            os.remove(str(temp))
+        except OSError:
+            pass
+        raise
+    if durability == 'dir':
+        fsync_dir(path.parent)
@@ -0,0 +1,328 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import datetime as dt
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, \
+    Optional, Sequence, Tuple
+
+from pickledir import PickleDir
+from pickledir._pickledir import Record
+
+from filememo._atomic import write_atomic
+from filememo._bulk import get_records, set_records
+
+
+class BackendStats(NamedTuple):
+    entries: int
+    bytes: int
+
+
+class Backend:
+    """Stores the records of a single decorated function.
+
+    The keys are the digests of the arguments (bytes). The values are
+    `(exception, result)` tuples. A record is returned only if it has the
+    same `version` and is not expired, as `PickleDir` does.
+
+    To use a custom storage, subclass `Backend`, give it a unique `name`
+    and pass the class to `memoize(backend=...)`. Any callable that takes
+    the same arguments as the constructor can be passed as well.
+
+    The `durability` ('none', 'file' or 'dir') is set by the decorator after
+    the backend is created. The backends sync the written data accordingly,
+    or ignore it if they cannot.
+    """
+
+    name: str = None
+    durability: str = 'none'
+
+    def __init__(self, find_dir: Callable[[], Path], version: int):
+        self._find_dir = find_dir
+        self._dirpath: Optional[Path] = None
+        self._dirpath_lock = threading.Lock()
+        self.version = version
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._bytes_lock = threading.Lock()
+
+    @property
+    def dirpath(self) -> Path:
+        """The cache directory of the function. It is found when it is
+        accessed for the first time, since it means several file system
+        calls."""
+        if self._dirpath is None:
+            with self._dirpath_lock:
+                if self._dirpath is None:
+                    self._dirpath = self._find_dir()
+        return self._dirpath
+
+    def count_bytes(self, read: int = 0, written: int = 0) -> None:
+        """Called by the implementations to report the amount of data they
+        read and wrote. It's shown by `cache_stats()`."""
+        with self._bytes_lock:
+            self.bytes_read += read
+            self.bytes_written += written
+
+    def get_record(self, key: bytes) -> Optional[Record]:
+        raise NotImplementedError
+
+    def set(self, key: bytes, value: Any,
+            max_age: Optional[dt.timedelta] = None) -> Record:
+        raise NotImplementedError
+
+    def delete(self, key: bytes) -> None:
+        raise NotImplementedError
+
+    def iterate(self) -> Iterator[Tuple[bytes, Record]]:
+        """Yields the keys and the records that are not expired."""
+        raise NotImplementedError
+
+    def stats(self) -> BackendStats:
+        return BackendStats(entries=sum(1 for _ in self.iterate()), bytes=0)
+
+    def get_records(self, keys: Sequence[bytes]) -> List[Optional[Record]]:
+        """Returns the records for the keys in the same order. Missing keys
+        are returned as None."""
+        return [self.get_record(key) for key in keys]
+
+    def set_records(
+            self, items: Sequence[Tuple[bytes, Any, Optional[dt.timedelta]]]
+    ) -> List[Record]:
+        """Saves many `(key, value, max_age)` items. Returns the records in
+        the same order."""
+        return [self.set(key, value, max_age)
+                for key, value, max_age in items]
+
+    def data_file(self, key: bytes) -> Optional[str]:
+        """The name of the file in `dirpath` that keeps the record. It is
+        used to track the usage of the files for the size limits. None if
+        the backend does not keep records in separate files."""
+        return None
+
+
+class _PickleDir(PickleDir):
+    """PickleDir that takes the directory from the backend."""
+
+    def __init__(self, backend: Backend):
+        super().__init__(dirpath='', version=backend.version)
+        self._backend = backend
+        # there are at most 4096 files, and building a Path takes longer
+        # than reading a small file
+        self._paths: Dict[str, Path] = dict()
+
+    @property
+    def dirpath(self) -> Path:
+        return self._backend.dirpath
+
+    @dirpath.setter
+    def dirpath(self, _):
+        # PickleDir.__init__ sets the path. We just ignore it
+        pass
+
+    # The keys are already the digests of the arguments, so they are
+    # stored as they are, without pickling
+
+    @staticmethod
+    def _key_to_bytes(key: bytes) -> bytes:
+        return key
+
+    @staticmethod
+    def _bytes_to_key(data: bytes) -> bytes:
+        return data
+
+    def _key_bytes_to_file(self, key: bytes) -> Path:
+        name = self._key_bytes_to_hash(key)
+        path = self._paths.get(name)
+        if path is None:
+            path = self.dirpath / name
+            self._paths[name] = path
+        return path
+
+    def _load_file(self, filepath: Path, can_write=False) \
+            -> Dict[bytes, Record]:
+        # The same as PickleDir does, but without checking whether the file
+        # exists and getting its size separately. And the expiration times
+        # are compared to the current time as floats
+        try:
+            with open(str(filepath), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return dict()
+        self._backend.count_bytes(read=len(data))
+        try:
+            _, data_version, items = pickle.loads(data)
+        except Exception:
+            # Truncated by a crash, or written by incompatible code. The
+            # records are treated as missing, and the file will be replaced
+            # by the next write
+            return dict()
+
+        if data_version != self.version:
+            self._remove(filepath)
+            return dict()
+
+        now = time.time()
+        expired = [key for key, record in items.items()
+                   if record.expires is not None
+                   and now >= record.expires.timestamp()]
+        if expired:
+            for key in expired:
+                del items[key]
+            if can_write:
+                if items:
+                    self._save_file(filepath, items)
+                else:
+                    # no more data in this file
+                    self._remove(filepath)
+        return items
+
+    @staticmethod
+    def _remove(filepath: Path) -> None:
+        try:
+            os.remove(str(filepath))
+        except FileNotFoundError:
+            # removed by other process
+            pass
+
+    def _save_file(self, filepath: Path, items: Dict[bytes, Record]):
+        if not items:
+            self._remove(filepath)
+            return
+        # PickleDir writes all the processes and threads to the same
+        # temporary file. We write each to its own one
+        data = pickle.dumps((1, self.version, items), pickle.HIGHEST_PROTOCOL)
+        write_atomic(filepath, data, self._backend.durability)
+        self._backend.count_bytes(written=len(data))
+
+
+class PickleDirBackend(Backend):
+    """The default backend. Keeps the records in up to 4096 files, each
+    file containing the records with the same 12-bit hash of the key."""
+
+    name = 'pickledir'
+
+    def __init__(self, find_dir: Callable[[], Path], version: int):
+        super().__init__(find_dir, version)
+        self.pickledir = _PickleDir(self)
+
+    def get_record(self, key: bytes) -> Optional[Record]:
+        return self.pickledir._get_record(key)
+
+    def set(self, key: bytes, value: Any,
+            max_age: Optional[dt.timedelta] = None) -> Record:
+        return set_records(self.pickledir, [(key, value, max_age)])[0]
+
+    def delete(self, key: bytes) -> None:
+        try:
+            del self.pickledir[key]
+        except FileNotFoundError:
+            pass
+
+    def _files(self) -> List[os.DirEntry]:
+        try:
+            with os.scandir(str(self.dirpath)) as entries:
+                # the names starting with '~' are the files being written
+                return [e for e in entries
+                        if PickleDir._is_data_basename(e.name)
+                        and not e.name.startswith('~')]
+        except FileNotFoundError:
+            return []
+
+    def iterate(self) -> Iterator[Tuple[bytes, Record]]:
+        for entry in self._files():
+            try:
+                items = self.pickledir._load_file(Path(entry.path))
+            except FileNotFoundError:
+                continue
+            yield from items.items()
+
+    def stats(self) -> BackendStats:
+        entries = 0
+        size = 0
+        for entry in self._files():
+            try:
+                size += entry.stat().st_size
+                entries += len(self.pickledir._load_file(Path(entry.path)))
+            except FileNotFoundError:
+                continue
+        return BackendStats(entries=entries, bytes=size)
+
+    def get_records(self, keys: Sequence[bytes]) -> List[Optional[Record]]:
+        return get_records(self.pickledir, keys)
+
+    def set_records(
+            self, items: Sequence[Tuple[bytes, Any, Optional[dt.timedelta]]]
+    ) -> List[Record]:
+        return set_records(self.pickledir, items)
+
+    def data_file(self, key: bytes) -> Optional[str]:
+        return self.pickledir._key_bytes_to_hash(key)
+
+
+class MemoryBackend(Backend):
+    """Keeps the records in the memory of the current process. The values
+    are pickled, so they are copied and checked the same way as by the
+    file backends. Mostly useful for tests."""
+
+    name = 'memory'
+
+    def __init__(self, find_dir: Callable[[], Path], version: int):
+        super().__init__(find_dir, version)
+        self._items: Dict[bytes, Tuple[dt.datetime, Optional[dt.datetime],
+                                       bytes]] = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _now() -> dt.datetime:
+        return dt.datetime.now(dt.timezone.utc)
+
+    def get_record(self, key: bytes) -> Optional[Record]:
+        with self._lock:
+            item = self._items.get(key)
+        if item is None:
+            return None
+        created, expires, data = item
+        if expires is not None and self._now() >= expires:
+            with self._lock:
+                if self._items.get(key) is item:
+                    del self._items[key]
+            return None
+        self.count_bytes(read=len(data))
+        try:
+            return Record(created, expires, pickle.loads(data))
+        except Exception:
+            # the class of the value is not importable anymore
+            return None
+
+    def set(self, key: bytes, value: Any,
+            max_age: Optional[dt.timedelta] = None) -> Record:
+        created = self._now()
+        expires = created + max_age if max_age else None
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self.count_bytes(written=len(data))
+        with self._lock:
+            self._items[key] = created, expires, data
+        return Record(created, expires, value)
+
+    def delete(self, key: bytes) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def iterate(self) -> Iterator[Tuple[bytes, Record]]:
+        with self._lock:
+            keys = list(self._items)
+        for key in keys:
+            record = self.get_record(key)
+            if record is not None:
+                yield key, record
+
+    def stats(self) -> BackendStats:
+        with self._lock:
+            return BackendStats(
+                entries=len(self._items),
+                bytes=sum(len(data) for _, _, data in self._items.values()))
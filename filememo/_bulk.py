@@ -0,0 +1,60 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import datetime as dt
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pickledir import PickleDir
+from pickledir._pickledir import Record
+
+
+# PickleDir stores records in up to 4096 files, each file containing all the
+# records with the same hash of the key. Reading or writing a single record
+# means loading and maybe saving the whole file. When we have many keys, we
+# group them by files, so each file is loaded and saved only once.
+
+
+def _group_by_file(pd: PickleDir, keys: Sequence) \
+        -> Tuple[List[bytes], Dict[Path, List[int]]]:
+    keys_bytes = [pd._key_to_bytes(key) for key in keys]
+    by_file: Dict[Path, List[int]] = defaultdict(list)
+    for index, key_bytes in enumerate(keys_bytes):
+        by_file[pd._key_bytes_to_file(key_bytes)].append(index)
+    return keys_bytes, by_file
+
+
+def get_records(pd: PickleDir, keys: Sequence) -> List[Optional[Record]]:
+    """Returns the records for the keys in the same order. Missing keys
+    are returned as None."""
+    keys_bytes, by_file = _group_by_file(pd, keys)
+    result: List[Optional[Record]] = [None] * len(keys)
+    for path, indexes in by_file.items():
+        try:
+            items = pd._load_file(path, can_write=True)
+        except FileNotFoundError:
+            continue
+        for index in indexes:
+            result[index] = items.get(keys_bytes[index])
+    return result
+
+
+def set_records(pd: PickleDir,
+                items: Sequence[Tuple[Any, Any, Optional[dt.timedelta]]]) \
+        -> List[Record]:
+    """Saves many `(key, value, max_age)` items at once. Returns the
+    records in the same order."""
+    keys_bytes, by_file = _group_by_file(pd, [key for key, _, _ in items])
+    result: List[Optional[Record]] = [None] * len(items)
+    for path, indexes in by_file.items():
+        dict_in_file = pd._load_file(path, can_write=False)
+        for index in indexes:
+            _, value, max_age = items[index]
+            created = pd._now()
+            record = Record(created, created + max_age if max_age else None,
+                            value)
+            dict_in_file[keys_bytes[index]] = record
+            result[index] = record
+        pd._save_file(path, dict_in_file)
+    return result
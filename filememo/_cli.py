@@ -0,0 +1,211 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Command line tools for the filememo caches.
+
+    python -m filememo warm module:function [--args FILE] [--workers N]
+    python -m filememo ls DIR
+    python -m filememo stats DIR [--function TEXT] [--json]
+    python -m filememo purge DIR [--function TEXT]
+                                 (--all | --expired | --max-bytes N)
+"""
+
+import argparse
+import importlib
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, TextIO
+
+from filememo._evict import evict
+from filememo._gc import GcResult, clear, gc
+from filememo._lock import LockTimeout
+from filememo._scan import FunctionInfo, scan
+
+# the progress is printed not more often than this
+_PROGRESS_INTERVAL = 0.5
+
+
+def _import_function(target: str) -> Callable:
+    # "package.module:Class.method" -> the object
+    module_name, sep, qualname = target.partition(':')
+    if not sep or not qualname:
+        raise SystemExit(f'Expected module:function, got {target!r}')
+    obj: Any = importlib.import_module(module_name)
+    for name in qualname.split('.'):
+        obj = getattr(obj, name)
+    if not hasattr(obj, 'warm'):
+        raise SystemExit(f'{target} is not decorated by filememo.memoize')
+    return obj
+
+
+def _read_args(file: TextIO) -> Iterator[tuple]:
+    # each line is a JSON array of the positional arguments
+    for line_number, line in enumerate(file, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        args = json.loads(line)
+        if not isinstance(args, list):
+            raise SystemExit(f'Line {line_number}: expected a JSON array')
+        yield tuple(args)
+
+
+def _warm(args: argparse.Namespace) -> None:
+    function = _import_function(args.function)
+    last_printed = 0.0
+
+    def progress(counts) -> None:
+        nonlocal last_printed
+        now = time.monotonic()
+        if now - last_printed >= _PROGRESS_INTERVAL:
+            last_printed = now
+            print_progress(counts, end='\r')
+
+    def print_progress(counts, end: str) -> None:
+        print(f'{counts.done} done: {counts.cached} cached, '
+              f'{counts.computed} computed, {counts.failed} failed',
+              end=end, file=sys.stderr, flush=True)
+
+    if args.args == '-':
+        counts = function.warm(_read_args(sys.stdin), workers=args.workers,
+                               progress=progress)
+    else:
+        with open(args.args) as file:
+            counts = function.warm(_read_args(file), workers=args.workers,
+                                   progress=progress)
+    print_progress(counts, end='\n')
+
+
+def _size(size: float) -> str:
+    if size < 1024:
+        return f'{size} B'
+    for unit in ('KiB', 'MiB', 'GiB'):
+        size /= 1024
+        if size < 1024 or unit == 'GiB':
+            break
+    return f'{size:.1f} {unit}'
+
+
+def _selected(args: argparse.Namespace, deep: bool) -> List[FunctionInfo]:
+    infos = scan(args.dir, deep=deep, workers=args.workers)
+    if args.function is not None:
+        # matched by the file and the name of the function, or by the name
+        # of its directory
+        infos = [info for info in infos
+                 if args.function in (info.method_id or '')
+                 or args.function == info.path.name]
+    return infos
+
+
+def _ls(args: argparse.Namespace) -> None:
+    print(f'{"DIR":<36} {"BACKEND":<9} {"FILES":>8} {"SIZE":>11}  FUNCTION')
+    for info in _selected(args, deep=False):
+        print(f'{info.path.name:<36} {info.backend:<9} {info.files:>8} '
+              f'{_size(info.bytes):>11}  {info.method_id}')
+
+
+def _stats(args: argparse.Namespace) -> None:
+    infos = _selected(args, deep=True)
+    if args.json:
+        print(json.dumps([dict(info._asdict(), path=str(info.path))
+                          for info in infos], indent=2))
+        return
+    for info in infos:
+        versions = ', '.join(f'{version}: {count}'
+                             for version, count in info.versions.items())
+        ages = ', '.join(f'{name}: {count}'
+                         for name, count in info.ages.items())
+        print(info.method_id)
+        print(f'  dir:      {info.path}')
+        print(f'  backend:  {info.backend}')
+        print(f'  entries:  {info.entries} ({info.expired} expired)')
+        if info.unreadable:
+            print(f'  unreadable files: {info.unreadable}')
+        print(f'  size:     {_size(info.bytes)} in {info.files} files')
+        print(f'  versions: {versions or "-"} (current: {info.version})')
+        print(f'  ages:     {ages}')
+
+
+def _purge(args: argparse.Namespace) -> None:
+    if args.function is None:
+        targets = [Path(args.dir)]
+    else:
+        targets = [info.path for info in _selected(args, deep=False)]
+        if not targets:
+            raise SystemExit(f'No functions matching {args.function!r}')
+
+    for target in targets:
+        try:
+            if args.max_bytes is not None:
+                evicted = evict(target, max_bytes=args.max_bytes)
+                print(f'{target}: {evicted.files_removed} files removed, '
+                      f'{_size(evicted.bytes_removed)} reclaimed, '
+                      f'{_size(evicted.bytes_left)} left')
+                continue
+            if args.all:
+                results = [clear(info.path)
+                           for info in scan(target, deep=False)]
+                result = GcResult(*map(sum, zip(*results))) \
+                    if results else GcResult(0, 0, 0, 0)
+            else:
+                result = gc(target)
+        except LockTimeout:
+            print(f'{target}: skipped, being cleaned by other process')
+            continue
+        print(f'{target}: {result.records_removed} records removed, '
+              f'{_size(result.bytes_reclaimed)} reclaimed')
+
+
+def _add_dir_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('dir', help='the dir_path of the cache')
+    parser.add_argument('--function', default=None,
+                        help='only the functions with this text in the file '
+                             'or the name, or with this directory name')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='the number of threads reading the files')
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m filememo',
+                                     description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    warm = commands.add_parser(
+        'warm', help='compute the results that are not in the cache yet')
+    warm.add_argument('function',
+                      help='the decorated function as module:function')
+    warm.add_argument('--args', default='-',
+                      help='the file with a JSON array of arguments on '
+                           'each line (default: stdin)')
+    warm.add_argument('--workers', type=int, default=1,
+                      help='the number of threads computing the results')
+    warm.set_defaults(run=_warm)
+
+    ls = commands.add_parser('ls', help='list the cached functions')
+    _add_dir_arguments(ls)
+    ls.set_defaults(run=_ls)
+
+    stats = commands.add_parser(
+        'stats', help='count the records of the cached functions')
+    _add_dir_arguments(stats)
+    stats.add_argument('--json', action='store_true',
+                       help='print the results as JSON')
+    stats.set_defaults(run=_stats)
+
+    purge = commands.add_parser('purge', help='remove the cached results')
+    _add_dir_arguments(purge)
+    what = purge.add_mutually_exclusive_group(required=True)
+    what.add_argument('--all', action='store_true',
+                      help='remove all the results')
+    what.add_argument('--expired', action='store_true',
+                      help='remove the expired results and the results of '
+                           'the previous versions')
+    what.add_argument('--max-bytes', type=int, default=None,
+                      help='remove the least recently used results until '
+                           'the size fits the limit')
+    purge.set_defaults(run=_purge)
+
+    args = parser.parse_args(argv)
+    args.run(args)
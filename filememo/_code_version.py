@@ -0,0 +1,121 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import functools
+import importlib
+import inspect
+import types
+from typing import Any, Iterable
+
+from filememo._keys import fingerprint
+
+# With version='auto', the data version is a digest of the code of the
+# function and of its dependencies. The digest includes the bytecode, the
+# constants (with the code of the nested functions), the names used by the
+# code, and the default values of the arguments. It does not include the
+# file name and the line numbers, so the version stays the same when the
+# function is moved, or when other code of the file changes.
+#
+# Only the values of the plain types (numbers, strings, bytes and their
+# containers) are included as they are. Other objects may be pickled or
+# printed differently on each run, so only their type is included.
+
+_PLAIN = (int, float, complex, bool, str, bytes, type(None), type(...))
+
+# the version is stored as an SQLite integer, so it must fit in 63 bits
+_VERSION_BYTES = 7
+
+
+def _plain(obj: Any) -> Any:
+    if isinstance(obj, _PLAIN):
+        return obj
+    if isinstance(obj, (tuple, list)):
+        return tuple(_plain(item) for item in obj)
+    if isinstance(obj, (set, frozenset)):
+        return frozenset(_plain(item) for item in obj)
+    if isinstance(obj, dict):
+        return {_plain(key): _plain(value) for key, value in obj.items()}
+    if isinstance(obj, types.CodeType):
+        return _of_code(obj)
+    return f'{type(obj).__module__}.{type(obj).__qualname__}'
+
+
+def _of_code(code: types.CodeType) -> tuple:
+    return ('code', code.co_code, code.co_argcount,
+            code.co_posonlyargcount, code.co_kwonlyargcount, code.co_flags,
+            code.co_names, code.co_varnames,
+            tuple(_plain(const) for const in code.co_consts))
+
+
+def _of_cell(cell: Any) -> Any:
+    try:
+        contents = cell.cell_contents
+    except ValueError:
+        # not assigned yet, like the name of a nested function that is
+        # decorated and calls itself
+        return '<empty cell>'
+    return _plain(contents)
+
+
+def _of_function(function: types.FunctionType) -> tuple:
+    closure = tuple(_of_cell(cell) for cell in function.__closure__ or ())
+    return ('function', _of_code(function.__code__),
+            _plain(function.__defaults__), _plain(function.__kwdefaults__),
+            closure)
+
+
+def _of_members(namespace: dict, module_name: str) -> tuple:
+    # the functions and the classes defined in the module or the class,
+    # and the plain constants
+    result = []
+    for name, value in sorted(namespace.items()):
+        if name.startswith('__'):
+            continue
+        if isinstance(value, (staticmethod, classmethod)):
+            value = value.__func__
+        if isinstance(value, property):
+            value = tuple(_of(accessor) for accessor in
+                          (value.fget, value.fset, value.fdel))
+        elif isinstance(value, (types.FunctionType, type)):
+            if getattr(value, '__module__', None) != module_name:
+                # imported from other module
+                continue
+            value = _of(value)
+        elif isinstance(value, _PLAIN + (tuple, list, set, frozenset,
+                                         dict)):
+            value = _plain(value)
+        else:
+            continue
+        result.append((name, value))
+    return tuple(result)
+
+
+def _of(obj: Any) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, str):
+        obj = importlib.import_module(obj)
+    if isinstance(obj, types.ModuleType):
+        return 'module', obj.__name__, _of_members(vars(obj), obj.__name__)
+    if isinstance(obj, type):
+        return ('class', obj.__qualname__,
+                _of_members(vars(obj), obj.__module__))
+    if isinstance(obj, functools.partial):
+        return 'partial', _of(obj.func), _plain(obj.args), \
+               _plain(obj.keywords)
+    obj = inspect.unwrap(obj)
+    if isinstance(obj, types.MethodType):
+        obj = obj.__func__
+    if isinstance(obj, types.FunctionType):
+        return _of_function(obj)
+    # builtins and other callables without the Python code
+    return 'object', _plain(obj), getattr(obj, '__qualname__', None)
+
+
+def code_version(function: Any, depends_on: Iterable[Any] = ()) -> int:
+    """Returns the data version that changes when the code of the function
+    or of the dependencies changes. The dependencies are functions, classes,
+    modules or the names of modules."""
+    digest = fingerprint([_of(function)] + [_of(dependency)
+                                            for dependency in depends_on])
+    return int.from_bytes(digest[:_VERSION_BYTES], 'big')
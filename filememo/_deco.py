@@ -2,16 +2,41 @@
 # SPDX-License-Identifier: MIT
 
 
+import asyncio
 import datetime as dt
 import functools
 import hashlib
+import inspect
+import math
 import tempfile
+import threading
+import time
+from collections import Counter
 from pathlib import Path
-from typing import Callable, Union, Optional
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Callable, Union, Optional, Tuple, Any, Dict, List, \
+    NamedTuple, Iterable, Iterator, Set
 
-from pickledir import PickleDir
+from pickledir._pickledir import Record
 
-from filememo._dir_for_func import find_dir_for_method
+from filememo._atomic import check_durability
+from filememo._backend import Backend, PickleDirBackend, MemoryBackend
+from filememo._code_version import code_version
+from filememo._dir_for_func import find_dir_for_method_id, _file_and_method
+from filememo._evict import Budget
+from filememo._gc import mark_version
+from filememo._inflight import SingleFlight, AsyncSingleFlight
+from filememo._keys import ArgsKeys, fingerprint
+from filememo._lock import FileLock
+from filememo._memory import MemoryCache
+from filememo._remote import Remote, check_remote, decode_record, \
+    encode_record, remote_name
+from filememo._serial import Serializer, Encoded, get_serializer, decode
+from filememo._sidecar import Sidecar, SIDECARS_DIRNAME, is_buffer_like, \
+    write_sidecar, open_sidecar, remove_replaced
+from filememo._sqlite import SqliteBackend
+from filememo._stats import StatsCounter, CacheStats, CacheEvent
 
 
 def _md5(s: str):
@@ -23,10 +48,6 @@ class FunctionException(BaseException):
         self.inner = inner
 
 
-def _utc() -> dt.datetime:
-    return dt.datetime.utcnow().replace(tzinfo=dt.timezone.utc)
-
-
 def _max_to_none(delta: dt.timedelta) -> Optional[dt.timedelta]:
     if delta == dt.timedelta.max:
         return None
@@ -34,27 +55,149 @@ def _max_to_none(delta: dt.timedelta) -> Optional[dt.timedelta]:
         return delta
 
 
-def _is_outdated_exception(created: dt.datetime,
-                           max_age: Optional[dt.timedelta]) -> bool:
+# The ages are compared as the float seconds since the epoch. It's several
+# times faster than creating an aware datetime on each call and subtracting
+# the timedeltas
+
+def _seconds(max_age: Optional[dt.timedelta]) -> float:
     if max_age == dt.timedelta.max:
-        return False
+        return math.inf
     if max_age is None:  # means zero
-        return True
-    return (_utc() - created) > max_age
+        return -math.inf
+    return max_age.total_seconds()
 
 
-def _is_outdated_result(created: dt.datetime, max_age: dt.timedelta) -> bool:
-    assert max_age is not None
-    if max_age == dt.timedelta.max:
+def _is_outdated(created: dt.datetime, max_age_seconds: float) -> bool:
+    if max_age_seconds == math.inf:
         return False
-    return (_utc() - created) > max_age
+    return time.time() - created.timestamp() > max_age_seconds
+
+
+def _is_expired_record(record: Record) -> bool:
+    # PickleDir skips expired records when loading them from files. Records
+    # kept in memory must be checked the same way
+    return (record.expires is not None
+            and time.time() >= record.expires.timestamp())
+
+
+_backends: Dict[str, Callable[..., Backend]] = {
+    b.name: b for b in [PickleDirBackend, SqliteBackend, MemoryBackend]}
+
+
+def _backend_factory(backend: Union[str, Callable[..., Backend]]) \
+        -> Callable[..., Backend]:
+    if callable(backend):
+        return backend
+    try:
+        return _backends[backend]
+    except KeyError:
+        raise ValueError(f'Unknown backend: {backend!r}. '
+                         f'Known are {sorted(_backends)}')
+
+
+def _with_on_call(on_event: Optional[Callable[[CacheEvent], None]],
+                  on_call: Callable) -> Callable[[CacheEvent], None]:
+    # `_on_call(*args, **kwargs)` is the older private form of the 'call'
+    # event
+    def handler(event: CacheEvent) -> None:
+        if event.kind == 'call':
+            on_call(*event.args, **event.kwargs)
+        if on_event is not None:
+            on_event(event)
+
+    return handler
+
+
+def _normalize_args(signature: inspect.Signature, args: Tuple,
+                    kwargs: Dict[str, Any]) \
+        -> Optional[Tuple[Tuple, Dict[str, Any]]]:
+    """Returns the arguments as they would be bound to the parameters: the
+    defaults filled in, the positional parameters passed as positional
+    arguments, and the keyword arguments sorted. Returns None if the
+    arguments do not match the signature."""
+    try:
+        bound = signature.bind(*args, **kwargs)
+    except TypeError:
+        # the function will raise this error itself
+        return None
+    bound.apply_defaults()
+    kwargs = bound.kwargs
+    if len(kwargs) > 1:
+        kwargs = dict(sorted(kwargs.items()))
+    return bound.args, kwargs
+
+
+def _data_to_value(data: Tuple) -> Any:
+    exception, result = data
+    return FunctionException(exception) if exception is not None else result
+
+
+class BatchResult(NamedTuple):
+    hits: Dict[int, Any]
+    """The results found in the cache (or computed), by the index of
+    the arguments."""
+    misses: List[int]
+    """The indexes of the arguments without results in the cache."""
+
+
+class WarmProgress(NamedTuple):
+    cached: int = 0
+    """The arguments that already had results in the cache."""
+    computed: int = 0
+    failed: int = 0
+    """The computations that raised an exception."""
+
+    @property
+    def done(self) -> int:
+        return self.cached + self.computed + self.failed
+
+
+def _module_name(function: Callable) -> Optional[str]:
+    module = getattr(function, '__module__', None)
+    if module == '__main__':
+        # all the scripts run as __main__, so they are told apart by the
+        # name of the file
+        try:
+            module += '.' + Path(inspect.getfile(function)).stem
+        except TypeError:
+            pass
+    return module
+
+
+def _download_or_compute(wrapper: Callable, args: Tuple) -> Tuple:
+    # Runs in the executor of `get_many`. The wrapper is pickled by its name,
+    # so in a worker process it is the same function with the same cache
+    return wrapper._download_or_compute(args)
+
+
+# warm() looks up the cache for this number of arguments at once
+_WARM_CHUNK = 1000
 
 
 def memoize(function: Callable = None,
             dir_path: Union[Path, str] = None,
             max_age: dt.timedelta = dt.timedelta.max,
             exceptions_max_age: Optional[dt.timedelta] = dt.timedelta.max,
-            version: int = None,
+            version: Union[int, str] = None,
+            memory_items: Optional[int] = None,
+            memory_bytes: Optional[int] = None,
+            lock: bool = False,
+            lock_timeout: Optional[dt.timedelta] = None,
+            lock_stale_age: dt.timedelta = dt.timedelta(seconds=30),
+            max_bytes: Optional[int] = None,
+            max_entries: Optional[int] = None,
+            eviction: str = 'lru',
+            serializer: Union[str, Serializer] = 'pickle',
+            mmap: bool = False,
+            key: Callable = None,
+            normalize_args: bool = False,
+            backend: Union[str, Callable[..., Backend]] = 'pickledir',
+            on_event: Callable[[CacheEvent], None] = None,
+            stale_while_revalidate: Optional[dt.timedelta] = None,
+            durability: str = 'none',
+            ttl: Callable[[Any], Optional[dt.timedelta]] = None,
+            remote: Optional[Remote] = None,
+            depends_on: Iterable[Any] = (),
             _on_call: Callable = None) -> Callable:
     # If called without method, we've been called with optional arguments.
     # We return a decorator with the optional arguments filled in.
@@ -63,70 +206,779 @@ def memoize(function: Callable = None,
         return functools.partial(memoize, dir_path=dir_path, max_age=max_age,
                                  version=version,
                                  exceptions_max_age=exceptions_max_age,
+                                 memory_items=memory_items,
+                                 memory_bytes=memory_bytes,
+                                 lock=lock,
+                                 lock_timeout=lock_timeout,
+                                 lock_stale_age=lock_stale_age,
+                                 max_bytes=max_bytes,
+                                 max_entries=max_entries,
+                                 eviction=eviction,
+                                 serializer=serializer,
+                                 mmap=mmap,
+                                 key=key,
+                                 normalize_args=normalize_args,
+                                 backend=backend,
+                                 on_event=on_event,
+                                 stale_while_revalidate=stale_while_revalidate,
+                                 durability=durability,
+                                 ttl=ttl,
+                                 remote=remote,
+                                 depends_on=depends_on,
                                  _on_call=_on_call)
 
     if max_age is None:
         raise ValueError('max_age must not be None')
+    if depends_on and version != 'auto':
+        raise ValueError("depends_on requires version='auto'")
+    if stale_while_revalidate is not None \
+            and stale_while_revalidate <= dt.timedelta(0):
+        raise ValueError('stale_while_revalidate must be positive')
+    if max_age == dt.timedelta.max:
+        # the results never get outdated
+        stale_while_revalidate = None
+    max_age_seconds = _seconds(max_age)
+    swr_seconds = (stale_while_revalidate.total_seconds()
+                   if stale_while_revalidate is not None else 0.0)
+    exceptions_max_age_seconds = _seconds(exceptions_max_age)
+    check_durability(durability)
+    create_backend = _backend_factory(backend)
+    # the optional storage shared with other hosts
+    check_remote(remote)
 
-    ##############################################################
-    # THE FUNCTION TO RUN ON EVERY CALL
+    # the counters returned by `cache_stats()`, and the events for the
+    # optional callback
+    if _on_call is not None:
+        on_event = _with_on_call(on_event, _on_call)
+    stats = StatsCounter(on_event)
 
-    @functools.wraps(function)
-    def f(*args, **kwargs):
-        key = (args, kwargs)
+    # the optional RAM tier in front of the disk cache
+    memory: Optional[MemoryCache] = None
+    if memory_items is not None or memory_bytes is not None:
+        memory = MemoryCache(max_items=memory_items, max_bytes=memory_bytes)
+
+    # the results are pickled by the backend, unless other format is chosen
+    serializer_obj = get_serializer(serializer)
+
+    # the optional limits for the size of the cache directory
+    budget: Optional[Budget] = None
+    if max_bytes is not None or max_entries is not None:
+        budget = Budget(lambda: f.data.dirpath, max_bytes=max_bytes,
+                        max_entries=max_entries, eviction=eviction)
+
+    # The cache key is a digest of the arguments, or of the value returned
+    # by the `key` function
+    if key is None:
+        args_key = ArgsKeys()
+    else:
+        key_function = key
 
-        # TRYING TO RETURN FROM CACHE
+        def args_key(args: Tuple, kwargs: Dict[str, Any]) -> bytes:
+            return fingerprint(key_function(*args, **kwargs))
 
-        # we will use max_age on both reading and writing
-        record = f.data._get_record(key)
+    if normalize_args:
+        # f(1, b=2), f(a=1, b=2) and f(b=2, a=1) are converted to the same
+        # arguments before computing the key
+        signature = inspect.signature(function)
+
+        def make_key(args: Tuple, kwargs: Dict[str, Any]) -> bytes:
+            normal = _normalize_args(signature, args, kwargs)
+            if normal is not None:
+                args, kwargs = normal
+            return args_key(args, kwargs)
+    else:
+        make_key = args_key
+
+    ##############################################################
+    # READING, COMPUTING AND STORING THE VALUES
+
+    def get_memory_record(key) -> Optional[Record]:
+        if memory is None:
+            return None
+
+        # the key is a digest of the arguments, so it is hashable even
+        # if the arguments are not
+        record = memory.get(key)
         if record is not None:
+            if not _is_expired_record(record):
+                return record
+            memory.discard(key)
+        return None
 
-            old_exception, old_result = record.data
+    def fresh_until(record: Record) -> float:
+        # the time when the record will be outdated or expired
+        exception = record.data[0]
+        until = record.created.timestamp() + (
+            exceptions_max_age_seconds if exception is not None
+            else max_age_seconds)
+        if record.expires is not None:
+            expires = record.expires.timestamp()
+            if exception is None and stale_while_revalidate is not None:
+                # the result is kept for the window after getting outdated
+                expires -= swr_seconds
+            until = min(until, expires)
+        return until
 
-            if old_exception is not None:
-                if not _is_outdated_exception(record.created,
-                                              exceptions_max_age):
-                    raise FunctionException(old_exception)
-            else:
-                assert old_exception is None
-                # we don't need to delete anything on reading
-                if not _is_outdated_result(record.created, max_age):
-                    return old_result
+    def remember(key, record: Record) -> None:
+        if memory is not None:
+            memory.put(key, record, fresh_until(record))
+
+    def encode(key, value: Tuple) -> Tuple:
+        exception, result = value
+        if exception is not None:
+            return value
+        if mmap and is_buffer_like(result):
+            sidecar = write_sidecar(f.data.dirpath, key, result, durability)
+            if budget is not None:
+                budget.on_write(f'{SIDECARS_DIRNAME}/{sidecar.name}', 0)
+            return exception, sidecar
+        if serializer_obj is not None:
+            return exception, serializer_obj.encode(result)
+        return value
+
+    def encoded_stored(key, encoded: Tuple) -> None:
+        # called when the encoded value was written over the previous one
+        if isinstance(encoded[1], Sidecar):
+            remove_replaced(f.data.dirpath, key, encoded[1])
+
+    def loaded_from_disk(key, record: Optional[Record]) -> Optional[Record]:
+        # decodes the record read from the disk, and keeps track of it
+        if record is None:
+            return None
+
+        exception, result = record.data
+        if isinstance(result, Encoded):
+            try:
+                record = record._replace(data=(exception, decode(result)))
+            except Exception:
+                # the format is unknown (maybe the library is not installed
+                # in this environment), or the data is corrupted
+                return None
+        elif isinstance(result, Sidecar):
+            try:
+                record = record._replace(
+                    data=(exception, open_sidecar(f.data.dirpath, result)))
+            except (OSError, ImportError, ValueError):
+                # the file was removed or damaged
+                return None
+            if budget is not None:
+                budget.on_hit(f'{SIDECARS_DIRNAME}/{result.name}')
+
+        remember(key, record)
+        if budget is not None:
+            budget.on_hit(f.data.data_file(key))
+        return record
+
+    def get_disk_record(key) -> Optional[Record]:
+        started = time.perf_counter()
+        record = loaded_from_disk(key, f.data.get_record(key))
+        stats.read(time.perf_counter() - started)
+        return record
+
+    def set_record(key, value, max_age_or_none: Optional[dt.timedelta]):
+        started = time.perf_counter()
+        encoded = encode(key, value)
+        record = f.data.set(key, max_age=max_age_or_none, value=encoded)
+        stats.write(time.perf_counter() - started)
+        encoded_stored(key, encoded)
+        if budget is not None:
+            budget.on_write(f.data.data_file(key))
+        record = record._replace(data=value)
+        remember(key, record)
+        return record
+
+    def cached_data(record: Optional[Record]) -> Optional[Tuple]:
+        # returns the (exception, result) pair from the record, or None if
+        # there is no record, or it is outdated
+        if record is None:
+            return None
+
+        # The record is outdated by the current max_age, or by the lifetime
+        # it was stored with, whichever comes first. We don't need to delete
+        # anything on reading
+        if time.time() <= fresh_until(record):
+            return record.data
+
+        # we did not return result and did not raise exception.
+        # We will restart the function
+        return None
 
-            # we did not return result and did not raise exception.
-            # We will restart the function
+    def stale_data(record: Optional[Record]) -> Optional[Tuple]:
+        # returns the outdated result, if it is still within the
+        # `stale_while_revalidate` window
+        if stale_while_revalidate is None or record is None:
+            return None
+        exception, _ = record.data
+        if exception is not None or _is_outdated(
+                record.created, max_age_seconds + swr_seconds) \
+                or _is_expired_record(record):
+            return None
+        return record.data
 
-        # COMPUTING NEW RESULT AND SAVING TO CACHE
+    def read(key) -> Optional[Tuple]:
+        record = get_memory_record(key)
+        if record is None:
+            record = get_disk_record(key)
+        return cached_data(record)
+
+    def lookup(key) -> Tuple[Optional[Tuple], bool]:
+        # The first lookup of a call. Unlike the repeated lookups before
+        # computing the value, it is counted, and it may return the stale
+        # result. Returns the data and whether it is stale
+        record = get_memory_record(key)
+        from_memory = record is not None
+        if record is None:
+            record = get_disk_record(key)
+        data = cached_data(record)
+        stale = False
+        if data is None:
+            data = stale_data(record)
+            stale = data is not None
+        stats.lookup(data, found=record is not None, memory=from_memory,
+                     stale=stale)
+        return data, stale
+
+    def compute(args, kwargs) -> Tuple:
+        stats.call(args, kwargs)
+        started = time.perf_counter()
+        try:
+            data = None, function(*args, **kwargs)
+        except KeyboardInterrupt:
+            raise
+        except SystemExit:
+            raise
+        except BaseException as exc:
+            data = exc, None
+        stats.computed(time.perf_counter() - started,
+                       exception=data[0] is not None)
+        return data
+
+    async def compute_async(args, kwargs) -> Tuple:
+        stats.call(args, kwargs)
+        started = time.perf_counter()
         try:
-            if _on_call is not None:
-                _on_call(*args, **kwargs)
-            new_result = function(*args, **kwargs)
-            new_exception = None
+            data = None, await function(*args, **kwargs)
         except KeyboardInterrupt:
             raise
         except SystemExit:
             raise
+        except asyncio.CancelledError:
+            raise
         except BaseException as exc:
-            new_exception = exc
-            new_result = None
+            data = exc, None
+        stats.computed(time.perf_counter() - started,
+                       exception=data[0] is not None)
+        return data
 
-        if new_exception is not None and exceptions_max_age is None:
-            raise FunctionException(new_exception)
+    def result_max_age(result) -> dt.timedelta:
+        # the lifetime of the result returned by the `ttl` function. It
+        # cannot be longer than max_age, since we use max_age on reading too
+        if ttl is None:
+            return max_age
+        lifetime = ttl(result)
+        if lifetime is None:
+            return max_age
+        return min(lifetime, max_age)
 
-        assert new_exception is None or exceptions_max_age is not None
+    def max_age_for(data: Tuple) -> Optional[dt.timedelta]:
+        # Returns the lifetime of the new record (dt.timedelta.max means
+        # forever), or None if the record should not be stored at all
+        new_exception, new_result = data
         assert new_exception is None or new_result is None
+        if new_exception is not None:
+            return exceptions_max_age
+        lifetime = result_max_age(new_result)
+        if lifetime <= dt.timedelta(0):
+            return None
+        if stale_while_revalidate is not None:
+            # the stale results are kept until the end of the window
+            return lifetime + stale_while_revalidate
+        return lifetime
 
-        # we will use max_age on both reading and writing
-        f.data.set(key,
-                   max_age=_max_to_none(exceptions_max_age
-                                        if new_exception is not None
-                                        else max_age),
-                   value=(new_exception, new_result))
+    def store(key, data: Tuple) -> None:
+        lifetime = max_age_for(data)
+        if lifetime is not None:
+            upload(key, set_record(key, value=data,
+                                   max_age_or_none=_max_to_none(lifetime)))
 
-        if new_exception is not None:
-            raise FunctionException(new_exception)
+    ##############################################################
+    # SHARING THE RESULTS WITH OTHER HOSTS
+
+    def upload(key, record: Record) -> None:
+        # the new result is sent to the remote tier in background. The
+        # exceptions are not shared: they are often specific to the host
+        exception, result = record.data
+        if remote is None or exception is not None:
+            return
+        if serializer_obj is not None:
+            result = serializer_obj.encode(result)
+        remote.put_async(remote_name(remote, remote_id, data_version, key),
+                         encode_record(record._replace(data=(None, result)),
+                                       remote.secret))
+
+    def download(key) -> Optional[Tuple]:
+        # Looks up the remote tier after a local miss. The found result is
+        # saved to the local cache for the rest of its lifetime
+        if remote is None:
+            return None
+        try:
+            obj = remote.get(remote_name(remote, remote_id, data_version,
+                                         key))
+        except Exception:
+            # the remote tier is unreachable: we compute the result locally
+            return None
+        record = decode_record(obj, remote.secret) \
+            if obj is not None else None
+        if record is None:
+            return None
+        result = record.data[1]
+        if isinstance(result, Encoded):
+            try:
+                record = record._replace(data=(None, decode(result)))
+            except Exception:
+                return None
+        now = time.time()
+        until = fresh_until(record)
+        if now > until:
+            return None
+
+        # the local record also keeps the stale_while_revalidate window
+        until += swr_seconds
+        set_record(key, value=record.data,
+                   max_age_or_none=(
+                       None if until == math.inf
+                       else dt.timedelta(seconds=max(until - now, 0.001))))
+        stats.remote_hit()
+        return record.data
+
+    def download_or_compute(key, args, kwargs) -> Tuple:
+        data = download(key)
+        if data is None:
+            data = compute(args, kwargs)
+            store(key, data)
+        return data
+
+    def lock_for(key) -> FileLock:
+        # one lock file for each key. The name of the file is the key
+        # digest, and it's not a name of a file managed by PickleDir
+        name = key.hex() + '.lock'
+        return FileLock(f.data.dirpath / 'locks' / name,
+                        timeout=(lock_timeout.total_seconds()
+                                 if lock_timeout is not None else None),
+                        stale_after=lock_stale_age.total_seconds())
+
+    def compute_once(key, args, kwargs) -> Tuple:
+        # The value could be computed by other thread after we checked the
+        # cache, but before we started this call
+        data = read(key)
+        if data is not None:
+            return data
+
+        if not lock:
+            return download_or_compute(key, args, kwargs)
+
+        # Other processes may be computing the same value right now.
+        # We wait for them, and then check the cache again
+        with lock_for(key):
+            data = read(key)
+            if data is None:
+                data = download_or_compute(key, args, kwargs)
+            return data
+
+    async def compute_once_async(key, args, kwargs) -> Tuple:
+        # the same as compute_once, but all the file operations are run
+        # in the executor
+        loop = asyncio.get_running_loop()
+
+        data, stale = await loop.run_in_executor(None, lookup, key)
+        if stale:
+            revalidate_async(key, args, kwargs)
+        if data is not None:
+            return data
+
+        if not lock:
+            return await download_or_compute_async(key, args, kwargs)
+
+        file_lock = lock_for(key)
+        await file_lock.acquire_async()
+        try:
+            data = await loop.run_in_executor(None, read, key)
+            if data is None:
+                data = await download_or_compute_async(key, args, kwargs)
+            return data
+        finally:
+            file_lock.release()
+
+    async def download_or_compute_async(key, args, kwargs) -> Tuple:
+        loop = asyncio.get_running_loop()
+        if remote is not None:
+            data = await loop.run_in_executor(None, download, key)
+            if data is not None:
+                return data
+        data = await compute_async(args, kwargs)
+        await loop.run_in_executor(None, store, key, data)
+        return data
+
+    ##############################################################
+    # REFRESHING THE STALE RESULTS IN BACKGROUND
+
+    # the keys being refreshed right now
+    refreshing: Set = set()
+    refreshing_lock = threading.Lock()
+    refresh_tasks: Set[asyncio.Task] = set()
+
+    def start_refresh(key) -> bool:
+        with refreshing_lock:
+            if key in refreshing:
+                return False
+            refreshing.add(key)
+            return True
+
+    def refresh(key, args, kwargs) -> None:
+        # The result is computed and stored like in compute_once. But if
+        # the function raises, the exception is not stored: the callers
+        # get the stale result until the end of the window
+        def refresh_unlocked():
+            # other host may have refreshed the result already
+            if read(key) is None and download(key) is None:
+                data = compute(args, kwargs)
+                if data[0] is None:
+                    store(key, data)
+
+        try:
+            if lock:
+                with lock_for(key):
+                    refresh_unlocked()
+            else:
+                refresh_unlocked()
+        finally:
+            with refreshing_lock:
+                refreshing.discard(key)
+
+    def revalidate(key, args, kwargs) -> None:
+        if start_refresh(key):
+            threading.Thread(target=refresh, args=(key, args, kwargs),
+                             name='filememo-revalidate', daemon=True).start()
+
+    async def refresh_async(key, args, kwargs) -> None:
+        loop = asyncio.get_running_loop()
+        file_lock = lock_for(key) if lock else None
+        try:
+            if file_lock is not None:
+                await file_lock.acquire_async()
+            try:
+                if await loop.run_in_executor(None, read, key) is None \
+                        and await loop.run_in_executor(None, download,
+                                                       key) is None:
+                    data = await compute_async(args, kwargs)
+                    if data[0] is None:
+                        await loop.run_in_executor(None, store, key, data)
+            finally:
+                if file_lock is not None:
+                    file_lock.release()
+        finally:
+            with refreshing_lock:
+                refreshing.discard(key)
+
+    def revalidate_async(key, args, kwargs) -> None:
+        if start_refresh(key):
+            task = asyncio.get_running_loop().create_task(
+                refresh_async(key, args, kwargs))
+            # the loop keeps only weak references to the tasks
+            refresh_tasks.add(task)
+            task.add_done_callback(refresh_tasks.discard)
+
+    def unpack(data: Tuple):
+        exception, result = data
+        if exception is not None:
+            raise FunctionException(exception)
         else:
-            return new_result
+            return result
+
+    ##############################################################
+    # BATCH OPERATIONS
+
+    def read_many(keys: List, count_misses: bool = True,
+                  count_hits: bool = True) -> List[Optional[Tuple]]:
+        records = [get_memory_record(key) for key in keys]
+        not_in_memory = [i for i, r in enumerate(records) if r is None]
+        if not_in_memory:
+            started = time.perf_counter()
+            from_disk = f.data.get_records([keys[i] for i in not_in_memory])
+            for index, record in zip(not_in_memory, from_disk):
+                records[index] = loaded_from_disk(keys[index], record)
+            stats.read(time.perf_counter() - started)
+
+        in_memory = set(range(len(keys))).difference(not_in_memory)
+        result = []
+        for index, record in enumerate(records):
+            data = cached_data(record)
+            if (count_hits if data is not None else count_misses):
+                stats.lookup(data, found=record is not None,
+                             memory=index in in_memory)
+            result.append(data)
+        return result
+
+    def get_many(args_list: Iterable[tuple],
+                 executor: Optional[Executor] = None) -> BatchResult:
+        """Looks up the results for many argument tuples at once. Each file
+        of the cache is read only once.
+
+        Returns the results found in the cache, and the indexes of the
+        argument tuples that were not found. If `executor` is specified,
+        the missing results are computed by the executor and saved to
+        the cache at once.
+
+        The cached exceptions are returned as `FunctionException` objects
+        instead of being raised.
+
+        With the `ProcessPoolExecutor`, the function must be importable from
+        its module, like for `map`.
+        """
+        args_list = [tuple(args) for args in args_list]
+        keys = [make_key(args, dict()) for args in args_list]
+
+        hits: Dict[int, Any] = dict()
+        misses: List[int] = []
+        for index, data in enumerate(read_many(keys)):
+            if data is None:
+                misses.append(index)
+            else:
+                hits[index] = _data_to_value(data)
+
+        if executor is None or not misses:
+            return BatchResult(hits, misses)
+
+        if asyncio.iscoroutinefunction(function):
+            raise TypeError('Cannot compute coroutines in executor')
+
+        # The work is submitted as a module-level function, so that it
+        # can be pickled for the ProcessPoolExecutor
+        futures = [executor.submit(_download_or_compute, f, args_list[index])
+                   for index in misses]
+        computed = [(index, future.result())
+                    for index, future in zip(misses, futures)]
+
+        to_store = []
+        for index, (data, downloaded) in computed:
+            lifetime = max_age_for(data) if not downloaded else None
+            if lifetime is not None:
+                to_store.append((keys[index], data, _max_to_none(lifetime)))
+        started = time.perf_counter()
+        encoded = [encode(key, data) for key, data, _ in to_store]
+        stored = f.data.set_records(
+            [(key, value, max_age) for (key, _, max_age), value
+             in zip(to_store, encoded)])
+        stats.write(time.perf_counter() - started)
+        for (key, _, _), value in zip(to_store, encoded):
+            encoded_stored(key, value)
+        for (key, data, _), record in zip(to_store, stored):
+            record = record._replace(data=data)
+            remember(key, record)
+            upload(key, record)
+        if budget is not None:
+            for name, entries in Counter(f.data.data_file(key)
+                                         for key, _, _ in to_store).items():
+                budget.on_write(name, entries)
+
+        for index, (data, _) in computed:
+            hits[index] = _data_to_value(data)
+        return BatchResult(hits, [])
+
+    def download_or_compute_one(args: Tuple) -> Tuple[Tuple, bool]:
+        # computes a missing result of get_many. The results found in the
+        # remote tier are already stored
+        data = download(make_key(args, dict()))
+        if data is not None:
+            return data, True
+        return compute(args, dict()), False
+
+    def map_(*iterables, executor: Optional[Executor] = None,
+             ordered: bool = True) -> Iterator:
+        """Like `Executor.map`, returns the results of the function for
+        the arguments taken from `iterables`.
+
+        The cache is checked for all the arguments at once. Only the results
+        that are not in the cache are computed by the `executor`. Without
+        an executor, they are computed in the current thread.
+
+        If `ordered` is False, the results are returned as soon as they are
+        ready, not in the order of the arguments.
+
+        The `ProcessPoolExecutor` runs the decorated function by its name,
+        and the worker process finds the cache by the same `dir_path` and
+        `version`. So the function must be importable from its module.
+        """
+        if asyncio.iscoroutinefunction(function):
+            raise TypeError('Cannot map coroutine functions')
+
+        args_list = [tuple(args) for args in zip(*iterables)]
+        # the misses are counted when they are computed by the wrapper
+        cached = read_many([make_key(args, dict()) for args in args_list],
+                           count_misses=False)
+
+        if executor is None:
+            for args, data in zip(args_list, cached):
+                yield unpack(data) if data is not None else f(*args)
+            return
+
+        # The misses are computed by calling the wrapper in the executor.
+        # So the computation is deduplicated and stored exactly as for
+        # a direct call. The wrapper, unlike the original function, can be
+        # pickled by its name
+        futures = {index: executor.submit(f, *args)
+                   for index, (args, data) in enumerate(zip(args_list, cached))
+                   if data is None}
+        try:
+            if ordered:
+                for index, data in enumerate(cached):
+                    if data is not None:
+                        yield unpack(data)
+                    else:
+                        yield futures.pop(index).result()
+            else:
+                for data in cached:
+                    if data is not None:
+                        yield unpack(data)
+                for future in as_completed(futures.values()):
+                    yield future.result()
+        finally:
+            for future in futures.values():
+                future.cancel()
+
+    def warm(args_iterable: Iterable[tuple], workers: int = 1,
+             progress: Optional[Callable[[WarmProgress], None]] = None) \
+            -> WarmProgress:
+        """Computes and saves the results for the argument tuples that are
+        not in the cache yet. The `workers` threads compute them in
+        parallel. Lower it for the functions that are rate-limited.
+
+        The results are saved as soon as they are computed. So if warming
+        is interrupted, running it again skips the results that are already
+        in the cache.
+
+        The `progress` is called with the counts after each argument tuple.
+        The lookups are not counted by `cache_stats`.
+        """
+        if asyncio.iscoroutinefunction(function):
+            raise TypeError('Cannot warm coroutine functions')
+        if workers < 1:
+            raise ValueError('workers must be positive')
+
+        counts = WarmProgress()
+
+        def done(**increment) -> None:
+            nonlocal counts
+            counts = counts._replace(**{name: getattr(counts, name) + value
+                                        for name, value in increment.items()})
+            if progress is not None:
+                progress(counts)
+
+        def compute_missing(key, args) -> Tuple:
+            # deduplicated with the calls of the function in other threads
+            return in_flight.run(key, lambda: compute_once(key, args, dict()))
+
+        args_iterator = iter(args_iterable)
+        with ThreadPoolExecutor(workers) as executor:
+            while True:
+                args_list = [tuple(args) for args in
+                             islice(args_iterator, _WARM_CHUNK)]
+                if not args_list:
+                    break
+                keys = [make_key(args, dict()) for args in args_list]
+                futures = []
+                for key, args, data in zip(
+                        keys, args_list, read_many(keys, count_misses=False,
+                                                   count_hits=False)):
+                    if data is not None:
+                        done(cached=1)
+                    else:
+                        futures.append(
+                            executor.submit(compute_missing, key, args))
+                try:
+                    for future in as_completed(futures):
+                        if future.result()[0] is not None:
+                            done(failed=1)
+                        else:
+                            done(computed=1)
+                finally:
+                    # when interrupted, the computations that did not start
+                    # are cancelled
+                    for future in futures:
+                        future.cancel()
+        return counts
+
+    def cache_stats() -> CacheStats:
+        """Returns the counters of the cache lookups, and the time spent
+        computing, reading and writing the results."""
+        return stats.snapshot(bytes_read=f.data.bytes_read,
+                              bytes_written=f.data.bytes_written)
+
+    ##############################################################
+    # THE FUNCTION TO RUN ON EVERY CALL
+
+    if asyncio.iscoroutinefunction(function):
+        in_flight_async = AsyncSingleFlight()
+
+        @functools.wraps(function)
+        async def f(*args, **kwargs):
+            key = make_key(args, kwargs)
+
+            # TRYING TO RETURN FROM CACHE
+
+            # reading from memory does not block, so we do it without
+            # the executor
+            data = None
+            if memory is not None:
+                record = memory.get_fresh(key, time.time())
+                if record is not None:
+                    data = record.data
+                    stats.memory_hit(data)
+
+            # READING FROM DISK OR COMPUTING NEW RESULT AND SAVING TO CACHE
+            if data is None:
+                # Other tasks may be awaiting the same value right now. In
+                # this case we just wait for their result
+                data = await in_flight_async.run(
+                    key, lambda: compute_once_async(key, args, kwargs))
+
+            return unpack(data)
+    else:
+        in_flight = SingleFlight()
+
+        @functools.wraps(function)
+        def f(*args, **kwargs):
+            key = make_key(args, kwargs)
+
+            # TRYING TO RETURN FROM CACHE
+
+            if memory is not None:
+                # The fast path: the fresh result from memory. The fresh
+                # time was computed when the record was remembered, so it's
+                # a single comparison
+                record = memory.get_fresh(key, time.time())
+                if record is not None:
+                    data = record.data
+                    stats.memory_hit(data)
+                    if data[0] is not None:
+                        raise FunctionException(data[0])
+                    return data[1]
+
+            # we will use max_age on both reading and writing
+            data, stale = lookup(key)
+            if stale:
+                # the stale result is returned right now, and the new one
+                # is computed in background
+                revalidate(key, args, kwargs)
+
+            # COMPUTING NEW RESULT AND SAVING TO CACHE
+            if data is None:
+                # Other threads may be computing the same value right now. In
+                # this case we just wait for their result
+                data = in_flight.run(key,
+                                     lambda: compute_once(key, args, kwargs))
+
+            return unpack(data)
 
     ##############################################################
     # CONTINUING INITIALIZING THE DECORATOR
@@ -143,9 +995,40 @@ def memoize(function: Callable = None,
     else:
         func_parent_dir = Path(tempfile.gettempdir()) / 'filememo'
 
-    func_cache_dir = find_dir_for_method(func_parent_dir, function)
+    method_id = _file_and_method(function)
+    if version == 'auto':
+        # the results are outdated when the code changes. The directory
+        # of the function is the same, so only its records are replaced
+        data_version = code_version(function, depends_on)
+    else:
+        data_version = version if version is not None else 1
+    # Unlike the method_id, it doesn't depend on where the source file is,
+    # so the function is the same on all the hosts sharing the remote tier
+    remote_id = (f'{_module_name(function)}:'
+                 f'{getattr(function, "__qualname__", method_id)}')
+
+    def find_dir() -> Path:
+        path = find_dir_for_method_id(func_parent_dir, method_id)
+        # the garbage collector removes the records of other versions
+        mark_version(path, data_version)
+        return path
 
-    f.data = PickleDir(dirpath=func_cache_dir,
-                       version=version if version is not None else 1)
+    # Finding the directory means several file system calls. It's done
+    # on the first access to `dirpath`, not during the decoration
+    f.data = create_backend(find_dir=find_dir, version=data_version)
+    f.data.durability = durability
+    if budget is not None and not isinstance(f.data, PickleDirBackend):
+        # the limits are kept by removing the files of PickleDir
+        raise ValueError('max_bytes and max_entries are only supported '
+                         'by the pickledir backend')
+    f.memory = memory
+    f.remote = remote
+    f.get_many = get_many
+    f._download_or_compute = download_or_compute_one
+    f.map = map_
+    f.warm = warm
+    f.cache_stats = cache_stats
+    f.dir_path = func_parent_dir
+    f.version = data_version if version == 'auto' else version
 
     return f
@@ -2,7 +2,9 @@
 # SPDX-License-Identifier: MIT
 
 import hashlib
+import inspect
 import os
+import threading
 from pathlib import Path
 from typing import Optional, Callable
 
@@ -12,8 +14,6 @@ def _md5(s: str) -> str:
 
 
 def _caller_not_filememo() -> str:
-    import inspect
-
     # finding the first file in the stack that is not-current (not _deco.py).
     # Presumably this is the file where the decorator is used
 
@@ -36,8 +36,25 @@ def _file_and_method(method: Callable) -> str:
     # it helps the decorator to understand what function he is decorating:
     # in what file it is and what it is called
 
-    # finding the first file in the stack that is not-current (not _deco.py).
-    # Presumably this is the file where the decorator is used
+    # A function decorated by other decorator may be a wrapper defined in
+    # the module of that decorator. Its code tells nothing about where
+    # the function is, so we use the original function
+    method = inspect.unwrap(method)
+    code = getattr(method, '__code__', None)
+    qualname = getattr(method, '__qualname__', None)
+    if code is not None and qualname is not None \
+            and code.co_name == qualname.rsplit('.', 1)[-1]:
+        # For functions and methods everything we need is known without
+        # inspecting the stack. This is much faster, since inspect.stack()
+        # reads the source files of all the frames.
+        #
+        # "/path/to/loading.py/_getCachedHistory"
+        # "/path/to/loading.py/func1.<locals>.func2"
+        return f'{os.path.abspath(code.co_filename)}{os.path.sep}{qualname}'
+
+    # For other callables (and the wrappers that copied the name, but not
+    # the __wrapped__) we use the file where the decorator is used.
+    # Finding the first file in the stack that is not-current (not _deco.py)
 
     filename = _caller_not_filememo()
 
@@ -51,8 +68,6 @@ def _file_and_method(method: Callable) -> str:
     else:
         function_name = string.split()[1]
 
-    # "/path/to/loading.py/_getCachedHistory"
-    # "/path/to/loading.py/func1.<locals>.func2"
     return f'{filename}{os.path.sep}{function_name}'
 
 
@@ -77,29 +92,37 @@ class PathCandidate:
 
     @method_id.setter
     def method_id(self, val: str) -> None:
-        def write():
-            self.func_id_path.write_text(val)
-
-        try:
-            write()
-        except FileNotFoundError:
-            self.func_id_path.parent.mkdir(parents=True)
-            write()
+        # Several processes and threads may be creating the same directory
+        # at once. So the file is written under a unique temporary name and
+        # then renamed. This way the others never read a partially written
+        # file
+        self.path.mkdir(parents=True, exist_ok=True)
+        temp = self.path / (f'{self.func_id_basename}.{os.getpid()}.'
+                            f'{threading.get_ident()}.tmp')
+        temp.write_text(val)
+        os.replace(str(temp), str(self.func_id_path))
 
 
 def find_dir_for_method(parent: Path, method: Callable,
                         hash_func: Callable = _md5) -> Path:
-    method_str = _file_and_method(method)
+    return find_dir_for_method_id(parent, _file_and_method(method),
+                                  hash_func=hash_func)
+
+
+def find_dir_for_method_id(parent: Path, method_str: str,
+                           hash_func: Callable = _md5) -> Path:
     method_hash = hash_func(method_str)
     for i in range(1000):
         path_candidate = PathCandidate(parent / f'{method_hash}_{i}')
 
-        if not path_candidate.path.exists():
+        existing_id = path_candidate.method_id
+        if existing_id is None:
+            # the directory does not exist, or it was just created by other
+            # process, that did not write the id yet
             path_candidate.method_id = method_str
-            assert path_candidate.method_id == method_str
-            return path_candidate.path
+            existing_id = path_candidate.method_id
 
-        if path_candidate.method_id == method_str:
+        if existing_id == method_str:
             return path_candidate.path
 
         # try next candidate
@@ -0,0 +1,341 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import os
+import pickle
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from pickledir import PickleDir
+
+from filememo._atomic import write_atomic
+from filememo._dir_for_func import PathCandidate
+from filememo._lock import FileLock, LockTimeout
+from filememo._sidecar import SIDECARS_DIRNAME
+
+# PickleDir keeps the records in files, each file containing the records
+# with the same 12-bit hash of the key. A file is the unit of eviction: when
+# we remove a file, we remove all the records in it. While a function has
+# less than several thousands of results, it's usually one record per file.
+
+# The time of the last use of a file is its modification time. On cache
+# hits, we update it, but not more often than once per this interval
+_TOUCH_INTERVAL = 60.0
+
+# Other processes may write to the same directory, so we cannot just count
+# our own writes. The directory is rescanned at least every N writes
+_SWEEP_EVERY_WRITES = 100
+
+# When the limit is exceeded, the sweep removes the files until the size is
+# this percent below the limit. Otherwise each next write would exceed the
+# limit again and cause another scan of the directory
+_MARGIN_PERCENT = 10
+
+# The hit counters are kept in memory and merged into the usage file on
+# sweeps, or when there are this many unsaved hits
+_FLUSH_EVERY_HITS = 1000
+
+_USAGE_BASENAME = 'usage.pickle'
+
+EVICTION_POLICIES = ('lru', 'lfu')
+
+
+class EvictionResult(NamedTuple):
+    files_removed: int
+    bytes_removed: int
+    bytes_left: int
+    entries_left: Optional[int]
+
+
+class _DataFile(NamedTuple):
+    func_dir: Path
+    name: str
+    size: int
+    mtime: float
+
+
+def function_dirs(root: Path) -> List[Path]:
+    """Returns the directories of the functions in `root`. The `root` may
+    be the directory of a single function, or a `dir_path` shared by many
+    functions."""
+    if (root / PathCandidate.func_id_basename).exists():
+        return [root]
+    try:
+        with os.scandir(str(root)) as entries:
+            return [Path(e.path) for e in entries
+                    if e.is_dir() and os.path.exists(
+                    os.path.join(e.path, PathCandidate.func_id_basename))]
+    except FileNotFoundError:
+        return []
+
+
+def _scan_files(directory: Path, prefix: str, is_data: Callable[[str], bool],
+                func_dir: Path) -> List[_DataFile]:
+    result = []
+    try:
+        with os.scandir(str(directory)) as entries:
+            for entry in entries:
+                if not is_data(entry.name):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                result.append(_DataFile(func_dir, prefix + entry.name,
+                                        st.st_size, st.st_mtime))
+    except FileNotFoundError:
+        pass
+    return result
+
+
+def _data_files(func_dir: Path) -> List[_DataFile]:
+    # the PickleDir files, and the large results stored separately
+    records = _scan_files(func_dir, '',
+                          lambda name: (PickleDir._is_data_basename(name)
+                                        and not name.startswith('~')),
+                          func_dir)
+    sidecars = _scan_files(func_dir / SIDECARS_DIRNAME,
+                           SIDECARS_DIRNAME + '/',
+                           lambda name: name.endswith('.bin'),
+                           func_dir)
+    return records + sidecars
+
+
+def _is_sidecar(file: _DataFile) -> bool:
+    return file.name.startswith(SIDECARS_DIRNAME + '/')
+
+
+# The number of records in a file can only be found by loading it. So the
+# counts are remembered by the path, with the time and the size of the file
+# they were counted for. The removed files are forgotten
+_entries_counts: Dict[str, Tuple[float, int, int]] = dict()
+_entries_counts_lock = threading.Lock()
+
+
+def _count_entries(file: _DataFile) -> int:
+    if _is_sidecar(file):
+        return 0
+    path = str(file.func_dir / file.name)
+    with _entries_counts_lock:
+        known = _entries_counts.get(path)
+    if known is not None and known[:2] == (file.mtime, file.size):
+        return known[2]
+    try:
+        with open(path, 'rb') as f:
+            _, _, items = pickle.load(f)
+        count = len(items)
+    except Exception:
+        # removed, or damaged in any way. The damaged file is just read
+        # as empty, as the backend does
+        count = 0
+    with _entries_counts_lock:
+        _entries_counts[path] = (file.mtime, file.size, count)
+    return count
+
+
+def _forget_entries(file: _DataFile) -> None:
+    with _entries_counts_lock:
+        _entries_counts.pop(str(file.func_dir / file.name), None)
+
+
+def _load_usage(func_dir: Path) -> Counter:
+    try:
+        with (func_dir / _USAGE_BASENAME).open('rb') as f:
+            usage = pickle.load(f)
+    except Exception:
+        return Counter()
+    return usage if isinstance(usage, Counter) else Counter()
+
+
+def _save_usage(func_dir: Path, usage: Counter) -> None:
+    write_atomic(func_dir / _USAGE_BASENAME,
+                 pickle.dumps(usage, pickle.HIGHEST_PROTOCOL))
+
+
+def _sweep_lock(root: Path) -> FileLock:
+    return FileLock(root / 'locks' / 'evict.lock', timeout=0)
+
+
+def evict(dir_path: Union[str, Path],
+          max_bytes: Optional[int] = None,
+          max_entries: Optional[int] = None,
+          eviction: str = 'lru') -> EvictionResult:
+    """Removes the least recently (or the least frequently) used results
+    from the cache directory, until its size fits the limits.
+
+    The `dir_path` may be the same directory that was passed to `memoize`,
+    so the limits apply to all the functions sharing it.
+
+    Raises `LockTimeout` if one of the functions is being swept by other
+    process right now.
+    """
+    if eviction not in EVICTION_POLICIES:
+        raise ValueError(f'eviction must be one of {EVICTION_POLICIES}')
+    func_dirs = function_dirs(Path(dir_path))
+    with ExitStack() as locks:
+        # the same locks that the decorated functions take for their sweeps
+        for func_dir in func_dirs:
+            locks.enter_context(_sweep_lock(func_dir))
+        return _evict_unlocked(func_dirs, max_bytes, max_entries, eviction)
+
+
+def _evict_unlocked(func_dirs: List[Path], max_bytes: Optional[int],
+                    max_entries: Optional[int], eviction: str,
+                    unsaved_hits: Optional[Dict[Path, Counter]] = None) \
+        -> EvictionResult:
+    files: List[_DataFile] = []
+    usage: Dict[Path, Counter] = dict()
+    for func_dir in func_dirs:
+        files.extend(_data_files(func_dir))
+        if eviction == 'lfu':
+            usage[func_dir] = _load_usage(func_dir)
+            if unsaved_hits and func_dir in unsaved_hits:
+                usage[func_dir].update(unsaved_hits[func_dir])
+
+    def hits(file: _DataFile) -> int:
+        return usage[file.func_dir][file.name]
+
+    if eviction == 'lfu':
+        files.sort(key=lambda file: (hits(file), file.mtime))
+    else:
+        files.sort(key=lambda file: file.mtime)
+
+    total_bytes = sum(file.size for file in files)
+    counts = [_count_entries(file) for file in files] \
+        if max_entries is not None else None
+    total_entries = sum(counts) if counts is not None else None
+
+    removed = 0
+    removed_bytes = 0
+    for index, file in enumerate(files):
+        bytes_ok = max_bytes is None or total_bytes <= max_bytes
+        if bytes_ok and (max_entries is None or total_entries <= max_entries):
+            break
+        if bytes_ok and _is_sidecar(file):
+            # removing it would not reduce the number of entries
+            continue
+        try:
+            os.remove(str(file.func_dir / file.name))
+        except FileNotFoundError:
+            pass
+        _forget_entries(file)
+        removed += 1
+        removed_bytes += file.size
+        total_bytes -= file.size
+        if counts is not None:
+            total_entries -= counts[index]
+        if eviction == 'lfu':
+            del usage[file.func_dir][file.name]
+
+    for func_dir, counter in usage.items():
+        _save_usage(func_dir, counter)
+
+    return EvictionResult(files_removed=removed, bytes_removed=removed_bytes,
+                          bytes_left=total_bytes, entries_left=total_entries)
+
+
+def _low_water(limit: Optional[int]) -> Optional[int]:
+    # the small limits are kept exactly, since scanning a few files is cheap
+    if limit is None:
+        return None
+    return limit - limit * _MARGIN_PERCENT // 100
+
+
+class Budget:
+    """Keeps the directory of a single function within the limits.
+
+    The usage of the files is tracked on every hit and write, but the
+    directory is scanned only from time to time: after a number of writes,
+    or when our estimate of the size exceeds the limits. The scan then
+    removes the files until the size is below the limits by a margin.
+    """
+
+    def __init__(self, get_dir: Callable[[], Path],
+                 max_bytes: Optional[int], max_entries: Optional[int],
+                 eviction: str):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f'eviction must be one of {EVICTION_POLICIES}')
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError('max_bytes must be positive')
+        if max_entries is not None and max_entries < 1:
+            raise ValueError('max_entries must be positive')
+        self.get_dir = get_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.eviction = eviction
+
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = dict()
+        self._hits: Counter = Counter()
+        self._writes = 0
+        self._bytes: Optional[int] = None
+        self._entries: Optional[int] = None
+
+    def on_hit(self, name: str) -> None:
+        """Called when the file with the relative `name` was read."""
+        if self.eviction == 'lfu':
+            with self._lock:
+                self._hits[name] += 1
+                flush = sum(self._hits.values()) >= _FLUSH_EVERY_HITS
+            if flush:
+                self.sweep()
+        else:
+            now = time.monotonic()
+            with self._lock:
+                last = self._touched.get(name)
+                if last is not None and now - last < _TOUCH_INTERVAL:
+                    return
+                self._touched[name] = now
+            try:
+                os.utime(str(self.get_dir() / name))
+            except FileNotFoundError:
+                pass
+
+    def on_write(self, name: str, entries: int = 1) -> None:
+        """Called when the file with the relative `name` was written."""
+        try:
+            size = os.stat(str(self.get_dir() / name)).st_size
+        except FileNotFoundError:
+            size = 0
+        with self._lock:
+            self._writes += 1
+            if self._bytes is not None:
+                self._bytes += size
+            if self._entries is not None:
+                self._entries += entries
+            need_sweep = (
+                    self._bytes is None
+                    or self._writes >= _SWEEP_EVERY_WRITES
+                    or (self.max_bytes is not None
+                        and self._bytes > self.max_bytes)
+                    or (self.max_entries is not None
+                        and self._entries > self.max_entries))
+        if need_sweep:
+            self.sweep()
+
+    def sweep(self) -> Optional[EvictionResult]:
+        func_dir = self.get_dir()
+        with self._lock:
+            hits, self._hits = self._hits, Counter()
+        try:
+            with _sweep_lock(func_dir):
+                result = _evict_unlocked([func_dir],
+                                         _low_water(self.max_bytes),
+                                         _low_water(self.max_entries),
+                                         self.eviction,
+                                         unsaved_hits={func_dir: hits})
+        except LockTimeout:
+            # other process is sweeping the directory right now
+            with self._lock:
+                self._hits.update(hits)
+            return None
+        with self._lock:
+            self._writes = 0
+            self._bytes = result.bytes_left
+            self._entries = result.entries_left \
+                if result.entries_left is not None else 0
+        return result
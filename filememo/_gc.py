@@ -0,0 +1,399 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import datetime as dt
+import os
+import pickle
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, NamedTuple, Optional, Set, Tuple, \
+    Union
+
+from pickledir import PickleDir
+from pickledir._pickledir import Record
+
+from filememo._atomic import write_atomic
+from filememo._evict import function_dirs, _sweep_lock, _USAGE_BASENAME
+from filememo._lock import LockTimeout
+from filememo._sidecar import Sidecar, SIDECARS_DIRNAME
+from filememo._sqlite import DB_BASENAME, collect_garbage, clear_database
+
+# An expired record is removed when its bucket file is read again. But the
+# files that are never read again, and the files of the old versions of the
+# function, stay on disk. The garbage collector scans the directories and
+# removes them.
+#
+# The decorator does not know the versions of other functions in the same
+# `dir_path`. So each function directory keeps the current version in a
+# marker file, written when the directory is found.
+#
+# Other processes may be reading and writing the same files. The records are
+# rewritten the way PickleDir does it: to a temporary file, then renamed.
+# And if a file was modified after we loaded it, we leave it alone until the
+# next collection.
+
+VERSION_BASENAME = 'version.txt'
+
+# The files that were just written may not be referenced yet. A sidecar is
+# written before the record that points to it, and a temporary file is
+# renamed after it is written. So these files are removed only if they are
+# older than this
+DEFAULT_GRACE = dt.timedelta(hours=1)
+
+
+class GcResult(NamedTuple):
+    functions: int
+    """The function directories that were collected."""
+    records_removed: int
+    files_removed: int
+    bytes_reclaimed: int
+
+
+def read_version(func_dir: Path) -> Optional[int]:
+    try:
+        return int((func_dir / VERSION_BASENAME).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def mark_version(func_dir: Path, version: int) -> None:
+    """Saves the current version of the function to its directory, unless
+    it is already there."""
+    if read_version(func_dir) == version:
+        return
+    temp = func_dir / (f'{VERSION_BASENAME}.{os.getpid()}.'
+                       f'{threading.get_ident()}.tmp')
+    temp.write_text(str(version))
+    os.replace(str(temp), str(func_dir / VERSION_BASENAME))
+
+
+class _Stub:
+    """Stands for an object of a class that cannot be imported here."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __setstate__(self, state):
+        pass
+
+    def __setitem__(self, key, value):
+        pass
+
+    def append(self, item):
+        pass
+
+    def extend(self, items):
+        pass
+
+
+class _MetadataUnpickler(pickle.Unpickler):
+    # The collector and the command line tools run in other processes,
+    # where the classes of the results may be unknown. But they only need
+    # the times, the versions and the sidecars of the records, so the
+    # unknown objects are replaced by stubs
+    def __init__(self, file: BinaryIO):
+        super().__init__(file)
+        self.stubbed = False
+
+    def find_class(self, module: str, name: str) -> Any:
+        try:
+            return super().find_class(module, name)
+        except Exception:
+            self.stubbed = True
+            return _Stub
+
+
+class Bucket(NamedTuple):
+    format_version: Any
+    data_version: Any
+    items: Dict[bytes, Record]
+    exact: bool
+    """False if some results were replaced by stubs, so the items cannot be
+    saved back."""
+
+
+def load_bucket(path: Path) -> Bucket:
+    """Loads the records from the PickleDir file without importing the
+    classes of the results. Raises FileNotFoundError if the file was
+    removed, and other exceptions if it is damaged."""
+    with path.open('rb') as f:
+        unpickler = _MetadataUnpickler(f)
+        format_version, data_version, items = unpickler.load()
+    if not isinstance(items, dict):
+        raise ValueError(f'Unexpected content of {path}')
+    return Bucket(format_version, data_version, items,
+                  exact=not unpickler.stubbed)
+
+
+def _stat(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(str(path))
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class _Collector:
+    """Collects the garbage in a single function directory."""
+
+    def __init__(self, func_dir: Path, grace: dt.timedelta):
+        self.func_dir = func_dir
+        self.version = read_version(func_dir)
+        self.grace_seconds = grace.total_seconds()
+        self.now = dt.datetime.now(dt.timezone.utc)
+        self.records_removed = 0
+        self.files_removed = 0
+        self.bytes_reclaimed = 0
+        # the sidecars referenced by the remaining records
+        self.referenced: Set[str] = set()
+        # False if some records were not read, so we do not know all the
+        # referenced sidecars
+        self.complete = True
+
+    def is_old(self, path: Path) -> bool:
+        try:
+            mtime = os.stat(str(path)).st_mtime
+        except FileNotFoundError:
+            return False
+        return time.time() - mtime > self.grace_seconds
+
+    def remove(self, path: Path, size: int) -> None:
+        try:
+            os.remove(str(path))
+        except FileNotFoundError:
+            return
+        self.files_removed += 1
+        self.bytes_reclaimed += size
+
+    def collect(self) -> None:
+        try:
+            with os.scandir(str(self.func_dir)) as entries:
+                names = [e.name for e in entries
+                         if PickleDir._is_data_basename(e.name)]
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = self.func_dir / name
+            if name.startswith('~'):
+                # left by a writer that was killed
+                stat = _stat(path)
+                if stat is not None and self.is_old(path):
+                    self.remove(path, stat[1])
+            else:
+                self.collect_file(path)
+        self.collect_sidecars()
+        self.collect_database()
+
+    def collect_file(self, path: Path) -> None:
+        before = _stat(path)
+        if before is None:
+            return
+        try:
+            bucket = load_bucket(path)
+        except FileNotFoundError:
+            return
+        except Exception:
+            # being written right now, or corrupted
+            self.complete = False
+            return
+        data_version, items = bucket.data_version, bucket.items
+
+        wrong_version = (self.version is not None
+                         and data_version != self.version)
+        if wrong_version:
+            kept: Dict[bytes, Record] = dict()
+        else:
+            kept = {key: record for key, record in items.items()
+                    if record.expires is None or record.expires > self.now}
+            for record in kept.values():
+                result = record.data[1]
+                if isinstance(result, Sidecar):
+                    self.referenced.add(result.name)
+
+        if not wrong_version and len(kept) == len(items):
+            return
+        if _stat(path) != before:
+            # other process modified the file after we loaded it
+            self.complete = False
+            return
+
+        if not kept:
+            self.records_removed += len(items)
+            self.remove(path, before[1])
+            return
+        if not bucket.exact:
+            # Some results are of the classes unknown here, and the stubs
+            # cannot be saved instead of them. The expired records are
+            # removed when the function reads the file
+            return
+        self.records_removed += len(items) - len(kept)
+        # the collector does not know the durability of the function, so
+        # it does not risk the data it keeps
+        write_atomic(path, pickle.dumps(
+            (bucket.format_version, data_version, kept),
+            pickle.HIGHEST_PROTOCOL), 'file')
+        after = _stat(path)
+        self.bytes_reclaimed += before[1] - (after[1] if after else 0)
+
+    def collect_sidecars(self) -> None:
+        sidecars_dir = self.func_dir / SIDECARS_DIRNAME
+        if not self.complete or not sidecars_dir.exists():
+            return
+        try:
+            with os.scandir(str(sidecars_dir)) as entries:
+                files = [(Path(e.path), e.name) for e in entries]
+        except FileNotFoundError:
+            return
+        for path, name in files:
+            if name in self.referenced or not self.is_old(path):
+                continue
+            # an unreferenced sidecar, or a temporary file
+            stat = _stat(path)
+            if stat is not None:
+                self.remove(path, stat[1])
+
+    def collect_database(self, remove_all: bool = False) -> None:
+        db_path = self.func_dir / DB_BASENAME
+        if not db_path.exists():
+            return
+
+        def size() -> int:
+            return sum(stat[1] for stat in (
+                _stat(db_path.parent / (db_path.name + suffix))
+                for suffix in ('', '-wal')) if stat is not None)
+
+        before = size()
+        if remove_all:
+            self.records_removed += clear_database(db_path)
+        else:
+            self.records_removed += collect_garbage(db_path, self.version)
+        self.bytes_reclaimed += max(before - size(), 0)
+
+    def clear(self) -> None:
+        # Removes all the records, the sidecars and the usage counters. The
+        # temporary files are left to `collect`: they may be renamed by the
+        # writers right now
+        try:
+            with os.scandir(str(self.func_dir)) as entries:
+                paths = [Path(e.path) for e in entries
+                         if PickleDir._is_data_basename(e.name)
+                         and not e.name.startswith('~')]
+        except FileNotFoundError:
+            return
+        for path in paths:
+            stat = _stat(path)
+            if stat is None:
+                continue
+            try:
+                self.records_removed += len(load_bucket(path).items)
+            except Exception:
+                pass
+            self.remove(path, stat[1])
+        sidecars_dir = self.func_dir / SIDECARS_DIRNAME
+        if sidecars_dir.exists():
+            paths = [path for path in sidecars_dir.iterdir()
+                     if not path.name.endswith('.tmp')]
+        else:
+            paths = []
+        for path in paths + [self.func_dir / _USAGE_BASENAME]:
+            stat = _stat(path)
+            if stat is not None:
+                self.remove(path, stat[1])
+        self.collect_database(remove_all=True)
+
+
+def clear(func_dir: Path) -> GcResult:
+    """Removes all the results of a single function. The directory itself
+    is kept, since other processes may be using it right now.
+
+    Raises `LockTimeout` if the directory is being collected or evicted
+    by other process."""
+    with _sweep_lock(func_dir):
+        collector = _Collector(func_dir, grace=dt.timedelta(0))
+        collector.clear()
+    return GcResult(functions=1,
+                    records_removed=collector.records_removed,
+                    files_removed=collector.files_removed,
+                    bytes_reclaimed=collector.bytes_reclaimed)
+
+
+def gc(dir_path: Union[str, Path],
+       grace: dt.timedelta = DEFAULT_GRACE) -> GcResult:
+    """Removes the expired results, and the results of the previous
+    versions, from the cache directory. Returns the amount of removed data.
+
+    The `dir_path` may be the directory passed to `memoize`, shared by many
+    functions, or the directory of a single function.
+
+    It's safe to run while other threads and processes use the cache. The
+    files written less than `grace` ago are never removed as unreferenced.
+    """
+    functions = 0
+    records_removed = files_removed = bytes_reclaimed = 0
+    for func_dir in function_dirs(Path(dir_path)):
+        try:
+            # the same lock keeps the eviction from running at the same time
+            with _sweep_lock(func_dir):
+                collector = _Collector(func_dir, grace)
+                collector.collect()
+        except LockTimeout:
+            # other process is collecting or evicting right now
+            continue
+        functions += 1
+        records_removed += collector.records_removed
+        files_removed += collector.files_removed
+        bytes_reclaimed += collector.bytes_reclaimed
+    return GcResult(functions=functions, records_removed=records_removed,
+                    files_removed=files_removed,
+                    bytes_reclaimed=bytes_reclaimed)
+
+
+def _lower_priority() -> None:
+    # On Linux the priority can be set for a single thread. On other
+    # systems it would affect the whole process, so we do not change it
+    if sys.platform.startswith('linux'):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+
+
+class GcThread(threading.Thread):
+    """Runs `gc` in background every `interval`. The thread is a daemon,
+    so it does not keep the program running."""
+
+    def __init__(self, dir_path: Union[str, Path], interval: dt.timedelta,
+                 grace: dt.timedelta = DEFAULT_GRACE):
+        super().__init__(name='filememo-gc', daemon=True)
+        self.dir_path = Path(dir_path)
+        self.interval = interval
+        self.grace = grace
+        self.last_result: Optional[GcResult] = None
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        _lower_priority()
+        while not self._stopped.is_set():
+            try:
+                self.last_result = gc(self.dir_path, self.grace)
+            except OSError:
+                # the directory is not accessible right now. Trying again
+                # in the next interval
+                pass
+            self._stopped.wait(self.interval.total_seconds())
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+def start_gc(dir_path: Union[str, Path],
+             interval: dt.timedelta = dt.timedelta(hours=1),
+             grace: dt.timedelta = DEFAULT_GRACE) -> GcThread:
+    """Starts a low-priority background thread that runs `gc` for the
+    `dir_path` every `interval`. Call `stop()` on the returned thread to
+    stop it."""
+    thread = GcThread(dir_path, interval, grace)
+    thread.start()
+    return thread
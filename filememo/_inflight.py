@@ -0,0 +1,119 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """Deduplicates concurrent computations of the same key within the
+    process.
+
+    The first thread that calls `run` for a key runs the function. Other
+    threads calling `run` for the same key while the function is running
+    just wait for it and get the same result (or the same exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Tuple[Future, int]] = dict()
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def run(self, key: Hashable, function: Callable[[], T]) -> T:
+        me = threading.get_ident()
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                future = Future()
+                self._calls[key] = (future, me)
+            else:
+                future, leader = call
+
+        if call is not None:
+            if leader == me:
+                # a recursive call from the function being computed. Waiting
+                # for ourselves would be a deadlock
+                return function()
+            return future.result()
+
+        try:
+            result = function()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class _LeaderCancelled(Exception):
+    # set to the shared future when the task awaiting the coroutine was
+    # cancelled. The other tasks then await the coroutine themselves
+    pass
+
+
+class AsyncSingleFlight:
+    """Deduplicates concurrent awaits of the same key within an event loop.
+
+    This is the `asyncio` counterpart of `SingleFlight`: the first task
+    awaits the coroutine, the other tasks await its result. If the first
+    task is cancelled, the others are not: one of them awaits the coroutine
+    instead.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Tuple[asyncio.Future, asyncio.Task]] = \
+            dict()
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: Hashable,
+                  function: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        me = asyncio.current_task()
+
+        # the same wrapper may be used by different event loops (in different
+        # threads), and each of them must have its own futures
+        loop_key = (loop, key)
+
+        call = self._calls.get(loop_key)
+        while call is not None:
+            future, leader = call
+            if leader is me:
+                # a recursive call from the coroutine being awaited
+                return await function()
+            try:
+                # the waiters must not cancel the future shared with others
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                call = self._calls.get(loop_key)
+
+        future = loop.create_future()
+        self._calls[loop_key] = (future, me)
+        try:
+            result = await function()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # we don't want "exception was never retrieved" warnings when
+            # nobody was waiting for the result
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[loop_key]
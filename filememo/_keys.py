@@ -0,0 +1,254 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import dataclasses
+import hashlib
+import io
+import pickle
+import struct
+import threading
+from typing import Any, Callable, Dict, Tuple, Type
+
+# The cache key is a short digest of the function arguments. Computing it
+# is a single pass of BLAKE2b over a canonical encoding of the arguments:
+#
+# - each value is prefixed by a tag of its type, so 1, 1.0, True and '1'
+#   give different keys
+# - the items of dicts and sets are hashed in a sorted order, so equal
+#   dicts give the same key regardless of the order of insertion
+# - bytes and arrays are fed to the hash as they are, without copying
+# - sequences of numbers and strings are pickled at once, which is
+#   much faster than walking them in Python. The pickler runs in the "fast"
+#   mode without memo, so the result does not depend on whether equal
+#   strings are the same object
+#
+# The objects of other types are pickled, unless a key function is
+# registered for the type.
+
+DIGEST_SIZE = 16
+
+_key_functions: Dict[Type, Callable[[Any], Any]] = dict()
+_key_functions_lock = threading.Lock()
+
+# the types that are pickled to the same bytes when the values are equal
+_FLAT = frozenset([int, float, bool, type(None), str])
+
+# the types that can be sorted to make the order of dict items canonical
+_SORTABLE = frozenset([int, float, str, bytes])
+
+# Python 3.11+ refuses to convert the longer ints to decimal strings (the
+# lowest limit it may be configured to is 640 digits), so they are hashed as
+# bytes
+_MAX_DECIMAL_INT_BITS = 2048
+
+_local = threading.local()
+
+
+def _fast_pickle(obj: Any) -> bytes:
+    # The pickler and its buffer are reused by the thread, since creating
+    # them takes longer than pickling a few arguments
+    try:
+        buffer, pickler = _local.pickler
+    except AttributeError:
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer, 5)
+        pickler.fast = True
+        _local.pickler = buffer, pickler
+    buffer.seek(0)
+    buffer.truncate()
+    pickler.dump(obj)
+    return buffer.getvalue()
+
+
+def register_key(cls: Type, key_function: Callable[[Any], Any]) -> None:
+    """Registers the function that converts the arguments of the type
+    `cls` (and its subclasses) to the values used in the cache key.
+
+    For example, `register_key(Path, str)` makes the `Path` arguments
+    hashed by their string representation.
+    """
+    with _key_functions_lock:
+        _key_functions[cls] = key_function
+
+
+def _find_key_function(cls: Type) -> Callable[[Any], Any]:
+    for base in cls.__mro__:
+        func = _key_functions.get(base)
+        if func is not None:
+            return func
+    return None
+
+
+def _sized(h, tag: bytes, data) -> None:
+    h.update(tag)
+    h.update(struct.pack('<Q', len(data)))
+    h.update(data)
+
+
+def _digest_of(obj: Any) -> bytes:
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    _feed(h, obj)
+    return h.digest()
+
+
+def _feed_unordered(h, tag: bytes, digests: list) -> None:
+    digests.sort()
+    h.update(tag)
+    h.update(struct.pack('<Q', len(digests)))
+    for digest in digests:
+        h.update(digest)
+
+
+def _feed(h, obj: Any) -> None:
+    cls = type(obj)
+
+    if cls is str:
+        _sized(h, b's', obj.encode('utf-8', 'surrogatepass'))
+    elif cls is int:
+        if obj.bit_length() <= _MAX_DECIMAL_INT_BITS:
+            _sized(h, b'i', str(obj).encode())
+        else:
+            _sized(h, b'I', obj.to_bytes(obj.bit_length() // 8 + 1, 'little',
+                                         signed=True))
+    elif obj is None:
+        h.update(b'N')
+    elif cls is bool:
+        h.update(b'T' if obj else b'F')
+    elif cls is float:
+        h.update(b'f')
+        h.update(struct.pack('<d', obj))
+    elif cls is bytes or cls is bytearray:
+        _sized(h, b'b', obj)
+    elif cls is tuple or cls is list:
+        tag = b't' if cls is tuple else b'l'
+        if set(map(type, obj)) <= _FLAT:
+            _sized(h, tag + b'#', _fast_pickle(obj))
+        else:
+            h.update(tag)
+            h.update(struct.pack('<Q', len(obj)))
+            for item in obj:
+                _feed(h, item)
+    elif cls is dict:
+        key_types = set(map(type, obj))
+        if len(key_types) == 1 and key_types <= _SORTABLE:
+            # the most common case: all keys are strings, or all are numbers
+            keys = sorted(obj)
+            h.update(b'd#')
+            _feed(h, keys)
+            _feed(h, [obj[k] for k in keys])
+        else:
+            _feed_unordered(h, b'd',
+                            [_digest_of(item) for item in obj.items()])
+    elif cls is set or cls is frozenset:
+        _feed_unordered(h, b'S', [_digest_of(item) for item in obj])
+    else:
+        _feed_other(h, obj, cls)
+
+
+def _feed_other(h, obj: Any, cls: Type) -> None:
+    key_function = _find_key_function(cls)
+    if key_function is not None:
+        _sized(h, b'r', _class_name(cls))
+        _feed(h, key_function(obj))
+        return
+
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        _sized(h, b'D', _class_name(cls))
+        for field in dataclasses.fields(obj):
+            _feed(h, field.name)
+            _feed(h, getattr(obj, field.name))
+        return
+
+    if cls.__module__ == 'numpy' and cls.__name__ == 'ndarray' \
+            and not obj.dtype.hasobject:
+        import numpy
+        _sized(h, b'a', obj.dtype.str.encode())
+        _feed(h, obj.shape)
+        h.update(memoryview(numpy.ascontiguousarray(obj)).cast('B'))
+        return
+
+    if cls is memoryview:
+        _sized(h, b'b', obj.cast('B'))
+        return
+
+    _sized(h, b'p', pickle.dumps(obj, 5))
+
+
+def _class_name(cls: Type) -> bytes:
+    return f'{cls.__module__}.{cls.__qualname__}'.encode()
+
+
+def fingerprint(obj: Any) -> bytes:
+    """Returns the digest of the object. Equal objects of the supported
+    types give equal digests."""
+    return _digest_of(obj)
+
+
+def args_fingerprint(args: Tuple, kwargs: Dict[str, Any]) -> bytes:
+    """Returns the cache key for the function arguments.
+
+    The order of the keyword arguments is significant, like it was when
+    the arguments were pickled: f(a=1, b=2) and f(b=2, a=1) are cached
+    separately.
+    """
+    if not kwargs:
+        # the most common case, made as fast as possible
+        strings = 0
+        for arg in args:
+            cls = type(arg)
+            if cls is str:
+                strings += 1
+            elif cls not in _FLAT:
+                break
+        else:
+            # Of these types, the pickle memoizes only the strings. A single
+            # string is always pickled the same way, and the regular pickler
+            # is faster than our reused one
+            data = pickle.dumps(args, 5) if strings < 2 \
+                else _fast_pickle(args)
+            return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    h.update(b'A')
+    _feed(h, args)
+    h.update(b'K')
+    h.update(struct.pack('<Q', len(kwargs)))
+    for name, value in kwargs.items():
+        _feed(h, name)
+        _feed(h, value)
+    return h.digest()
+
+
+# The digests of the calls with only int and str arguments are remembered.
+# The tuples of these two types are equal only if they give the same digest,
+# unlike (1,) == (1.0,) == (True,). The long strings are not remembered, so
+# the memo stays small
+_MEMO_TYPES = frozenset([int, str])
+_MEMO_MAX_STR = 64
+_MEMO_SIZE = 4096
+
+
+class ArgsKeys:
+    """Returns `args_fingerprint` of the arguments. For the positional int
+    and str arguments, the digests are remembered, so a repeated call takes
+    a dict lookup instead of pickling and hashing."""
+
+    def __init__(self):
+        self._memo: Dict[Tuple, bytes] = dict()
+
+    def __call__(self, args: Tuple, kwargs: Dict[str, Any]) -> bytes:
+        if kwargs:
+            return args_fingerprint(args, kwargs)
+        for arg in args:
+            cls = type(arg)
+            if cls not in _MEMO_TYPES \
+                    or (cls is str and len(arg) > _MEMO_MAX_STR):
+                return args_fingerprint(args, kwargs)
+        digest = self._memo.get(args)
+        if digest is None:
+            digest = args_fingerprint(args, kwargs)
+            if len(self._memo) >= _MEMO_SIZE:
+                # all at once: cheaper than tracking the least recently used
+                self._memo.clear()
+            self._memo[args] = digest
+        return digest
@@ -0,0 +1,171 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+class LockTimeout(TimeoutError):
+    """Raised when a memoized function waited too long for another process
+    computing the same result."""
+
+
+def _create_exclusive(path: Path, content: bytes) -> bool:
+    try:
+        fd = os.open(str(path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return _create_exclusive(path, content)
+    try:
+        os.write(fd, content)
+    finally:
+        os.close(fd)
+    return True
+
+
+class FileLock:
+    """Inter-process lock based on exclusive creation of a file.
+
+    The lock works on all platforms and on network file systems, but it is
+    not released automatically when the holder crashes. So while the lock
+    is held, a background thread updates the modification time of the file.
+    A lock file that was not updated for `stale_after` seconds is considered
+    left by a crashed process and is removed by the next waiter.
+
+    The holder may also be alive, but stalled for that long. Then its lock
+    is taken over by other process. So the file contains a unique token,
+    and the holder only touches and removes the file with its own token.
+    The file is only removed under a short-lived guard file, so no one
+    creates a new lock between checking the file and removing it.
+    """
+
+    def __init__(self, path: Path, timeout: Optional[float] = None,
+                 stale_after: float = 30.0):
+        if stale_after <= 0:
+            raise ValueError('stale_after must be positive')
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self._token: Optional[bytes] = None
+        self._stop_heartbeat: Optional[threading.Event] = None
+
+    def _try_create(self) -> bool:
+        token = f'{socket.gethostname()} {os.getpid()} ' \
+                f'{uuid.uuid4().hex}'.encode()
+        if not _create_exclusive(self.path, token):
+            return False
+        self._token = token
+        return True
+
+    def _is_own(self) -> bool:
+        try:
+            return self.path.read_bytes() == self._token
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def _guard(self) -> Iterator[None]:
+        guard = self.path.with_name(self.path.name + '.guard')
+        while not _create_exclusive(guard, b''):
+            # the guard is held for microseconds, unless its holder crashed
+            try:
+                if time.time() - os.stat(str(guard)).st_mtime \
+                        > self.stale_after:
+                    os.remove(str(guard))
+            except FileNotFoundError:
+                pass
+            time.sleep(0.001)
+        try:
+            yield
+        finally:
+            os.remove(str(guard))
+
+    def _is_stale(self) -> bool:
+        try:
+            mtime = os.stat(str(self.path)).st_mtime
+        except FileNotFoundError:
+            return False
+        return time.time() - mtime > self.stale_after
+
+    def _remove_if_stale(self) -> None:
+        if not self._is_stale():
+            return
+        with self._guard():
+            # other waiter may have replaced the stale file by a fresh lock
+            # while we were waiting for the guard
+            if self._is_stale():
+                os.remove(str(self.path))
+
+    def _heartbeat(self, stop: threading.Event) -> None:
+        while not stop.wait(self.stale_after / 4):
+            if not self._is_own():
+                # the lock was considered stale and taken over by other
+                # process. Nothing we can do about it
+                return
+            try:
+                os.utime(str(self.path))
+            except FileNotFoundError:
+                return
+
+    def _check_timeout(self, started: float) -> None:
+        if self.timeout is not None \
+                and time.monotonic() - started >= self.timeout:
+            raise LockTimeout(f'Could not lock {self.path} '
+                              f'in {self.timeout} seconds')
+
+    def acquire(self) -> None:
+        started = time.monotonic()
+        delay = 0.01
+        while not self._try_create():
+            self._remove_if_stale()
+            self._check_timeout(started)
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        self._start_heartbeat()
+
+    async def acquire_async(self) -> None:
+        """The same as `acquire`, but waits with `asyncio.sleep`. Each
+        attempt to take the lock is a single non-blocking call. So when the
+        awaiting task is cancelled, the lock is either not taken, or taken
+        and released by the caller, never taken in background."""
+        started = time.monotonic()
+        delay = 0.01
+        while not self._try_create():
+            self._remove_if_stale()
+            self._check_timeout(started)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        self._start_heartbeat()
+
+    def _start_heartbeat(self) -> None:
+        self._stop_heartbeat = threading.Event()
+        threading.Thread(target=self._heartbeat,
+                         args=(self._stop_heartbeat,),
+                         daemon=True).start()
+
+    def release(self) -> None:
+        assert self._stop_heartbeat is not None
+        self._stop_heartbeat.set()
+        self._stop_heartbeat = None
+        with self._guard():
+            # if we stalled for too long, the file may be the lock of other
+            # process now
+            if self._is_own():
+                os.remove(str(self.path))
+        self._token = None
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.release()
@@ -0,0 +1,123 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import math
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Hashable, Tuple
+
+from pickledir._pickledir import Record
+
+
+def estimate_size(obj: Any) -> int:
+    """The approximate size of the object in bytes. The buffers, the arrays
+    and the strings are measured without copying them, since they may be
+    large. Other objects are measured as the length of their pickled data.
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    if isinstance(obj, tuple):
+        # the (exception, result) pairs, and the results that are tuples
+        # of arrays
+        return sum(estimate_size(item) for item in obj)
+    nbytes = getattr(obj, 'nbytes', None)
+    if isinstance(nbytes, int):
+        # memoryview, NumPy arrays and the like
+        return nbytes
+    return len(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+
+
+class MemoryCache:
+    """Bounded in-memory LRU storage for records read from or written to the
+    disk cache.
+
+    The records are the same `(created, expires, data)` tuples that
+    `PickleDir` returns, so the decorator checks their age exactly the same
+    way as for the records loaded from disk.
+
+    The size of the cache is limited by the number of items, or by the
+    approximate total size of the data in bytes, or by both. The size of a
+    record is estimated by `estimate_size`.
+
+    Each record may be stored with the time (seconds since the epoch) until
+    which it is fresh. Then `get_fresh` checks it with a single comparison.
+    """
+
+    def __init__(self, max_items: Optional[int] = None,
+                 max_bytes: Optional[int] = None):
+        if max_items is not None and max_items < 1:
+            raise ValueError('max_items must be positive')
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError('max_bytes must be positive')
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items: 'OrderedDict[Hashable, Tuple[Record, int, float]]' = \
+            OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _size_of(self, record: Record) -> int:
+        if self.max_bytes is None:
+            return 0
+        return estimate_size(record.data)
+
+    def get(self, key: Hashable) -> Optional[Record]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def get_fresh(self, key: Hashable, now: float) -> Optional[Record]:
+        """Returns the record if it's fresh at the `now` time. Otherwise
+        returns None, but keeps the record."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or now >= item[2]:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key: Hashable, record: Record,
+            fresh_until: float = math.inf) -> None:
+        size = self._size_of(record)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # the record will never fit. We also must not keep the previous
+            # value for the same key
+            self.discard(key)
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._items[key] = (record, size, fresh_until)
+            self.total_bytes += size
+            self._shrink()
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.total_bytes = 0
+
+    def _shrink(self) -> None:
+        # removing the least recently used items until the limits are met
+        while self._items and (
+                (self.max_items is not None
+                 and len(self._items) > self.max_items)
+                or (self.max_bytes is not None
+                    and self.total_bytes > self.max_bytes)):
+            _, (_, size, _) = self._items.popitem(last=False)
+            self.total_bytes -= size
@@ -0,0 +1,246 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import atexit
+import datetime as dt
+import hashlib
+import hmac
+import pickle
+import threading
+import urllib.error
+import urllib.request
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from filememo._atomic import write_atomic
+from filememo._backend import Record
+from filememo._keys import fingerprint
+
+# The remote tier is a store of immutable objects shared by many hosts.
+# The name of an object is a digest of the namespace of the project, the
+# function, its data version and the cache key, so the same call on any
+# host finds the same object. The object is the pickled record of a result;
+# exceptions are never shared.
+#
+# Unpickling runs code, so whoever can write to the storage can run code on
+# all the hosts. With a secret, the objects are signed by HMAC, and the
+# objects without the right signature are never unpickled.
+#
+# Each host still reads and writes its local cache first. The remote tier
+# is only asked on a local miss, and the found result is saved to the local
+# cache. The new results are uploaded in a background thread, so a slow or
+# unreachable remote never delays the calls.
+
+_FORMAT = 1
+
+_SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+
+def _signature(secret: bytes, data: bytes) -> bytes:
+    return hmac.new(secret, data, hashlib.sha256).digest()
+
+
+def encode_record(record: Record, secret: Optional[bytes] = None) -> bytes:
+    expires = record.expires.timestamp() \
+        if record.expires is not None else None
+    data = pickle.dumps(
+        (_FORMAT, record.created.timestamp(), expires, record.data[1]),
+        pickle.HIGHEST_PROTOCOL)
+    if secret is not None:
+        data = _signature(secret, data) + data
+    return data
+
+
+def decode_record(data: bytes,
+                  secret: Optional[bytes] = None) -> Optional[Record]:
+    """Returns the record with the `(None, result)` data, or None if the
+    object is damaged, has an unknown format, or is not signed by the
+    `secret`."""
+    if secret is not None:
+        signature, data = data[:_SIGNATURE_SIZE], data[_SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, _signature(secret, data)):
+            return None
+    try:
+        format_version, created, expires, result = pickle.loads(data)
+    except Exception:
+        return None
+    if format_version != _FORMAT:
+        return None
+    return Record(
+        dt.datetime.fromtimestamp(created, dt.timezone.utc),
+        (dt.datetime.fromtimestamp(expires, dt.timezone.utc)
+         if expires is not None else None),
+        (None, result))
+
+
+class Remote:
+    """The storage shared by the caches on many hosts.
+
+    Subclasses implement `get` and `put`. When they raise (usually an
+    `OSError` because the storage is unreachable), the calls of the
+    decorated function work with the local cache only.
+
+    The `namespace` names the project. It is a part of the object names, so
+    the functions of unrelated programs with the same module and name do
+    not share the results.
+
+    The results are unpickled, so anyone who can write to the storage can
+    run code on the hosts. With the `secret`, the objects are signed, and
+    the objects not signed by the same secret are ignored.
+
+    The objects are uploaded by `put_async` in a background thread. Not
+    more than `max_pending` objects wait for upload; the others are
+    dropped, since they are just not shared. When the program exits, the
+    uploads are awaited for up to `exit_timeout` seconds, and the rest are
+    dropped.
+    """
+
+    def __init__(self, *, namespace: str, max_pending: int = 1000,
+                 exit_timeout: float = 5.0, secret: Optional[bytes] = None):
+        if not isinstance(namespace, str) or not namespace:
+            raise ValueError('namespace must be a non-empty string')
+        self.namespace = namespace
+        self.secret = secret
+        self.max_pending = max_pending
+        self.exit_timeout = exit_timeout
+        self.uploaded = 0
+        self.dropped = 0
+        self.upload_errors = 0
+        self._pending: deque = deque()
+        # the objects queued or being uploaded right now
+        self._unfinished = 0
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self, name: str) -> Optional[bytes]:
+        """Returns the object, or None if there is no such object."""
+        raise NotImplementedError
+
+    def put(self, name: str, data: bytes) -> None:
+        """Saves the object, replacing the old one with the same name."""
+        raise NotImplementedError
+
+    def put_async(self, name: str, data: bytes) -> None:
+        with self._condition:
+            if self._unfinished >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append((name, data))
+            self._unfinished += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._upload, name='filememo-upload', daemon=True)
+                self._thread.start()
+                # the results computed just before the exit are uploaded
+                atexit.register(self._flush_at_exit)
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until the queued objects are uploaded. Returns False if the
+        timeout expired before that."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._unfinished == 0,
+                                            timeout)
+
+    def _flush_at_exit(self) -> None:
+        # an unreachable remote must not hang the exit: the daemon thread
+        # with the unfinished uploads stops with the interpreter
+        self.flush(self.exit_timeout)
+
+    def _upload(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+                name, data = self._pending.popleft()
+            try:
+                self.put(name, data)
+                uploaded = True
+            except Exception:
+                uploaded = False
+            with self._condition:
+                if uploaded:
+                    self.uploaded += 1
+                else:
+                    self.upload_errors += 1
+                self._unfinished -= 1
+                self._condition.notify_all()
+
+
+class DirRemote(Remote):
+    """Keeps the objects in a directory, usually on a network file system
+    mounted on all the hosts."""
+
+    def __init__(self, path: Union[Path, str], *, namespace: str,
+                 durability: str = 'none', max_pending: int = 1000,
+                 exit_timeout: float = 5.0, secret: Optional[bytes] = None):
+        super().__init__(namespace=namespace, max_pending=max_pending,
+                         exit_timeout=exit_timeout, secret=secret)
+        self.path = Path(path)
+        self.durability = durability
+
+    def _object_path(self, name: str) -> Path:
+        # the objects are spread over 256 subdirectories
+        return self.path / name[:2] / name
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            return self._object_path(name).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, name: str, data: bytes) -> None:
+        write_atomic(self._object_path(name), data, self.durability)
+
+
+class HttpRemote(Remote):
+    """Keeps the objects on an HTTP server. The object is read by
+    `GET {url}/{name}` and written by `PUT {url}/{name}`. A missing object
+    is a 404 response. The `headers`, like `Authorization`, are sent with
+    each request."""
+
+    def __init__(self, url: str, *, namespace: str, timeout: float = 10.0,
+                 headers: Optional[Dict[str, str]] = None,
+                 max_pending: int = 1000, exit_timeout: float = 5.0,
+                 secret: Optional[bytes] = None):
+        super().__init__(namespace=namespace, max_pending=max_pending,
+                         exit_timeout=exit_timeout, secret=secret)
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.headers = dict(headers) if headers is not None else dict()
+
+    def get(self, name: str) -> Optional[bytes]:
+        request = urllib.request.Request(f'{self.url}/{name}',
+                                         headers=self.headers)
+        try:
+            with urllib.request.urlopen(request,
+                                        timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def put(self, name: str, data: bytes) -> None:
+        request = urllib.request.Request(
+            f'{self.url}/{name}', data=data, method='PUT',
+            headers={'Content-Type': 'application/octet-stream',
+                     **self.headers})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def check_remote(remote: Optional[Remote]) -> None:
+    if remote is None or isinstance(remote, Remote):
+        return
+    if isinstance(remote, (str, Path)):
+        # the namespace cannot be guessed from the path or the URL
+        raise TypeError(f'Unexpected remote: {remote!r}. Pass '
+                        f'DirRemote(path, namespace=...) or '
+                        f'HttpRemote(url, namespace=...)')
+    raise TypeError(f'Unexpected remote: {remote!r}')
+
+
+def remote_name(remote: Remote, function_id: str, version: Any,
+                key: bytes) -> str:
+    return fingerprint((remote.namespace, function_id, version, key)).hex()
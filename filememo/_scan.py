@@ -0,0 +1,204 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import datetime as dt
+import os
+import sqlite3
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from pickledir import PickleDir
+
+from filememo._dir_for_func import PathCandidate
+from filememo._evict import function_dirs
+from filememo._gc import load_bucket, read_version
+from filememo._sidecar import SIDECARS_DIRNAME
+from filememo._sqlite import DB_BASENAME
+
+# Describes the cache directories for the command line tools. The cache may
+# have millions of files, so the directories are listed with `os.scandir`
+# (it gets the sizes without extra calls on most systems), and the files
+# are read by a pool of threads.
+
+# the upper bounds of the age histogram, in seconds
+AGE_BUCKETS: Tuple[Tuple[str, float], ...] = (
+    ('<1h', 3600),
+    ('<1d', 86400),
+    ('<1w', 7 * 86400),
+    ('<30d', 30 * 86400),
+)
+OLDER = '>=30d'
+
+AGE_NAMES = tuple(name for name, _ in AGE_BUCKETS) + (OLDER,)
+
+
+class FunctionInfo(NamedTuple):
+    path: Path
+    method_id: Optional[str]
+    """The file and the name of the function, as written in `func.txt`."""
+    backend: str
+    version: Optional[int]
+    """The version the function was decorated with the last time."""
+    files: int
+    bytes: int
+    entries: Optional[int] = None
+    """The number of records, including the expired ones. None unless the
+    records were read."""
+    expired: int = 0
+    versions: Dict[int, int] = dict()
+    """The number of records by their version."""
+    ages: Dict[str, int] = dict()
+    """The number of records by their age (see `AGE_BUCKETS`)."""
+    unreadable: int = 0
+    """The number of files that could not be read, so their records are
+    not counted."""
+
+
+class _Listing(NamedTuple):
+    path: Path
+    buckets: List[Path]
+    files: int
+    bytes: int
+    has_database: bool
+
+
+class _Counts:
+    def __init__(self):
+        self.entries = 0
+        self.expired = 0
+        self.versions: Counter = Counter()
+        self.ages: Counter = Counter()
+        self.unreadable = 0
+
+    def add(self, other: '_Counts') -> None:
+        self.entries += other.entries
+        self.expired += other.expired
+        self.unreadable += other.unreadable
+        self.versions.update(other.versions)
+        self.ages.update(other.ages)
+
+
+def _age_name(seconds: float) -> str:
+    for name, limit in AGE_BUCKETS:
+        if seconds < limit:
+            return name
+    return OLDER
+
+
+def _scandir_sizes(path: Path) -> List[Tuple[str, int]]:
+    sizes = []
+    try:
+        with os.scandir(str(path)) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        sizes.append((entry.name, entry.stat().st_size))
+                except FileNotFoundError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return sizes
+
+
+def _list_function(func_dir: Path) -> _Listing:
+    files = _scandir_sizes(func_dir)
+    sidecars = _scandir_sizes(func_dir / SIDECARS_DIRNAME)
+    buckets = [func_dir / name for name, _ in files
+               if PickleDir._is_data_basename(name)
+               and not name.startswith('~')]
+    return _Listing(path=func_dir, buckets=buckets,
+                    files=len(files) + len(sidecars),
+                    bytes=sum(size for _, size in files + sidecars),
+                    has_database=any(name == DB_BASENAME
+                                     for name, _ in files))
+
+
+def _count_bucket(path: Path, now: dt.datetime) -> _Counts:
+    counts = _Counts()
+    try:
+        # the classes of the results may be unknown here
+        _, data_version, items, _ = load_bucket(path)
+    except FileNotFoundError:
+        return counts
+    except Exception:
+        # being written right now, or corrupted
+        counts.unreadable = 1
+        return counts
+    counts.entries = len(items)
+    counts.versions[data_version] = len(items)
+    for record in items.values():
+        counts.ages[_age_name((now - record.created).total_seconds())] += 1
+        if record.expires is not None and record.expires <= now:
+            counts.expired += 1
+    return counts
+
+
+def _count_database(db_path: Path, now: dt.datetime) -> _Counts:
+    # the histogram is computed by the database, without reading the rows
+    # into Python
+    timestamp = now.timestamp()
+    cases = ' '.join(f'WHEN created > {timestamp - limit} THEN {index}'
+                     for index, (_, limit) in enumerate(AGE_BUCKETS))
+    counts = _Counts()
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        rows = conn.execute(
+            f'SELECT version, CASE {cases} ELSE {len(AGE_BUCKETS)} END, '
+            'expires IS NOT NULL AND expires <= ?, COUNT(*) '
+            'FROM records GROUP BY 1, 2, 3', (timestamp,)).fetchall()
+    except sqlite3.Error:
+        counts.unreadable = 1
+        return counts
+    finally:
+        conn.close()
+    for version, age, expired, count in rows:
+        counts.entries += count
+        counts.versions[version] += count
+        counts.ages[AGE_NAMES[age]] += count
+        if expired:
+            counts.expired += count
+    return counts
+
+
+def scan(root: Union[str, Path], deep: bool = True,
+         workers: Optional[int] = None) -> List[FunctionInfo]:
+    """Describes the functions cached in the `root` directory. Without
+    `deep`, only the directories are listed, and the records are not
+    read."""
+    now = dt.datetime.now(dt.timezone.utc)
+    with ThreadPoolExecutor(workers) as pool:
+        listings = list(pool.map(_list_function, function_dirs(Path(root))))
+
+        counts: List[Optional[_Counts]] = [None] * len(listings)
+        if deep:
+            counts = [_Counts() for _ in listings]
+            # the files of all the functions are read in the same pool
+            tasks = [(index, path, _count_bucket)
+                     for index, listing in enumerate(listings)
+                     for path in listing.buckets]
+            tasks += [(index, listing.path / DB_BASENAME, _count_database)
+                      for index, listing in enumerate(listings)
+                      if listing.has_database]
+            parts = pool.map(lambda task: task[2](task[1], now), tasks)
+            for (index, _, _), part in zip(tasks, parts):
+                counts[index].add(part)
+
+    infos = []
+    for listing, total in zip(listings, counts):
+        info = FunctionInfo(
+            path=listing.path,
+            method_id=PathCandidate(listing.path).method_id,
+            backend='sqlite' if listing.has_database else 'pickledir',
+            version=read_version(listing.path),
+            files=listing.files, bytes=listing.bytes)
+        if total is not None:
+            info = info._replace(
+                entries=total.entries, expired=total.expired,
+                versions=dict(sorted(total.versions.items())),
+                ages={name: total.ages[name] for name in AGE_NAMES},
+                unreadable=total.unreadable)
+        infos.append(info)
+    infos.sort(key=lambda info: (info.method_id or '', str(info.path)))
+    return infos
@@ -0,0 +1,216 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import bz2
+import gzip
+import io
+import lzma
+import pickle
+import struct
+from typing import Any, Dict, NamedTuple, Optional, Union
+
+
+class Encoded(NamedTuple):
+    """The result of a function stored by a serializer other than the
+    default one. The record keeps the name of the format, so the result is
+    decoded correctly even if the decorator now uses other serializer."""
+    format: str
+    payload: bytes
+
+
+class Serializer:
+    """Converts the results of the functions to bytes and back.
+
+    To use a custom format, subclass `Serializer`, give it a unique `name`
+    and pass an instance to `memoize(serializer=...)`.
+    """
+
+    name: str = None
+
+    def dumps(self, obj: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+    def check(self) -> None:
+        """Raises an exception if the serializer cannot be used, for example
+        because the optional library is not installed."""
+
+    def encode(self, obj: Any) -> Encoded:
+        return Encoded(self.name, self.dumps(obj))
+
+
+class PickleSerializer(Serializer):
+    name = 'pickle'
+
+    def dumps(self, obj: Any) -> bytes:
+        return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+class Pickle5Serializer(Serializer):
+    """Pickle protocol 5 with out-of-band buffers. The large buffers, like
+    the data of NumPy arrays, are not copied into the pickle stream, but
+    stored after it."""
+
+    name = 'pickle5'
+
+    def dumps(self, obj: Any) -> bytes:
+        buffers = []
+        main = pickle.dumps(obj, 5, buffer_callback=buffers.append)
+        raws = [b.raw() for b in buffers]
+        header = struct.pack(f'<{len(raws) + 2}Q', len(raws), len(main),
+                             *(r.nbytes for r in raws))
+        return b''.join([header, main, *raws])
+
+    def loads(self, data: bytes) -> Any:
+        view = memoryview(data)
+        (count,) = struct.unpack_from('<Q', view)
+        sizes = struct.unpack_from(f'<{count + 1}Q', view, 8)
+        pos = 8 * (count + 2)
+        main = view[pos:pos + sizes[0]]
+        pos += sizes[0]
+        buffers = []
+        for size in sizes[1:]:
+            # the buffers are copied once, so the objects get writable
+            # memory as they would get from the regular pickle
+            buffers.append(bytearray(view[pos:pos + size]))
+            pos += size
+        return pickle.loads(main, buffers=buffers)
+
+
+class _CompressedPickle(Serializer):
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.compress(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(self.decompress(data))
+
+
+class GzipSerializer(_CompressedPickle):
+    name = 'gzip'
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=6)
+
+    def decompress(self, data: bytes) -> bytes:
+        return gzip.decompress(data)
+
+
+class Bz2Serializer(_CompressedPickle):
+    name = 'bz2'
+
+    def compress(self, data: bytes) -> bytes:
+        return bz2.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return bz2.decompress(data)
+
+
+class LzmaSerializer(_CompressedPickle):
+    name = 'lzma'
+
+    def compress(self, data: bytes) -> bytes:
+        return lzma.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lzma.decompress(data)
+
+
+class ZstdSerializer(_CompressedPickle):
+    """Requires the `zstandard` package."""
+    name = 'zstd'
+
+    def check(self) -> None:
+        import zstandard  # noqa
+
+    def compress(self, data: bytes) -> bytes:
+        import zstandard
+        return zstandard.ZstdCompressor().compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+class Lz4Serializer(_CompressedPickle):
+    """Requires the `lz4` package."""
+    name = 'lz4'
+
+    def check(self) -> None:
+        import lz4.frame  # noqa
+
+    def compress(self, data: bytes) -> bytes:
+        import lz4.frame
+        return lz4.frame.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        import lz4.frame
+        return lz4.frame.decompress(data)
+
+
+class NpySerializer(Serializer):
+    """Stores NumPy arrays in the `.npy` format. Other results are stored
+    by the `pickle5` serializer. Requires the `numpy` package."""
+    name = 'npy'
+
+    def check(self) -> None:
+        import numpy  # noqa
+
+    def dumps(self, obj: Any) -> bytes:
+        import numpy
+        buffer = io.BytesIO()
+        numpy.save(buffer, obj, allow_pickle=False)
+        return buffer.getvalue()
+
+    def loads(self, data: bytes) -> Any:
+        import numpy
+        return numpy.load(io.BytesIO(data), allow_pickle=False)
+
+    def encode(self, obj: Any) -> Encoded:
+        import numpy
+        if isinstance(obj, numpy.ndarray) and not obj.dtype.hasobject:
+            return super().encode(obj)
+        return _serializers[Pickle5Serializer.name].encode(obj)
+
+
+_serializers: Dict[str, Serializer] = {
+    s.name: s for s in [PickleSerializer(), Pickle5Serializer(),
+                        GzipSerializer(), Bz2Serializer(), LzmaSerializer(),
+                        ZstdSerializer(), Lz4Serializer(), NpySerializer()]}
+
+
+def get_serializer(serializer: Union[str, Serializer, None]) \
+        -> Optional[Serializer]:
+    """Returns the serializer by its name. Returns None for the default
+    'pickle', since in this case the results are stored as they are, and
+    pickled by PickleDir."""
+    if serializer is None or serializer == PickleSerializer.name:
+        return None
+    if isinstance(serializer, Serializer):
+        if not serializer.name:
+            raise ValueError('The serializer must have a name')
+        _serializers[serializer.name] = serializer
+    else:
+        try:
+            serializer = _serializers[serializer]
+        except KeyError:
+            raise ValueError(f'Unknown serializer: {serializer!r}. '
+                             f'Known are {sorted(_serializers)}')
+    serializer.check()
+    return serializer
+
+
+def decode(encoded: Encoded) -> Any:
+    """Decodes the value stored by any known serializer. Raises KeyError if
+    the format is unknown."""
+    return _serializers[encoded.format].loads(encoded.payload)
@@ -0,0 +1,125 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import math
+import mmap
+import os
+import uuid
+from pathlib import Path
+from typing import Any, NamedTuple, Optional, Tuple
+
+from filememo._atomic import write_atomic
+
+# The large buffer-like results are stored as raw files in this subdirectory
+# of the function cache directory. The record only keeps the file name and
+# the metadata. When the result is read, the file is memory-mapped: it takes
+# constant time, and all the processes share the same pages of the OS
+# file cache.
+#
+# The file names start with the cache key. When the result is replaced, the
+# files of the previous results for the same key are removed.
+
+SIDECARS_DIRNAME = 'sidecars'
+
+
+class Sidecar(NamedTuple):
+    name: str
+    kind: str
+    """'ndarray' or 'bytes'"""
+    dtype: Any = None
+    shape: Optional[Tuple[int, ...]] = None
+    nbytes: Optional[int] = None
+    """The size of the file. None for the records written by the versions
+    that did not keep it"""
+
+
+def _numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def is_buffer_like(obj: Any) -> bool:
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return True
+    numpy = _numpy()
+    return (numpy is not None
+            and isinstance(obj, numpy.ndarray)
+            and not obj.dtype.hasobject)
+
+
+def _prefix(key: bytes) -> str:
+    return key.hex() + '-'
+
+
+def write_sidecar(func_dir: Path, key: bytes, obj: Any,
+                  durability: str = 'none') -> Sidecar:
+    """Writes the buffer to a new file. The name of the file is unique,
+    so the file is never modified after it is written."""
+    name = _prefix(key) + uuid.uuid4().hex + '.bin'
+    numpy = _numpy()
+    if numpy is not None and isinstance(obj, numpy.ndarray):
+        array = numpy.ascontiguousarray(obj)
+        buffer = memoryview(array.reshape(-1).view(numpy.uint8))
+        sidecar = Sidecar(name=name, kind='ndarray',
+                          dtype=numpy.lib.format.dtype_to_descr(array.dtype),
+                          shape=array.shape, nbytes=buffer.nbytes)
+    else:
+        buffer = memoryview(obj).cast('B')
+        sidecar = Sidecar(name=name, kind='bytes', nbytes=buffer.nbytes)
+
+    write_atomic(func_dir / SIDECARS_DIRNAME / sidecar.name, buffer,
+                 durability, temp_prefix='')
+    return sidecar
+
+
+def remove_replaced(func_dir: Path, key: bytes, sidecar: Sidecar) -> None:
+    """Removes the files of the previous results for the same key. The
+    processes that have mapped them keep the data, except on Windows,
+    where such files are not removed."""
+    prefix = _prefix(key)
+    try:
+        with os.scandir(str(func_dir / SIDECARS_DIRNAME)) as entries:
+            paths = [entry.path for entry in entries
+                     if entry.name.startswith(prefix)
+                     and entry.name != sidecar.name]
+    except FileNotFoundError:
+        return
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def open_sidecar(func_dir: Path, sidecar: Sidecar) -> Any:
+    """Returns a read-only `numpy.memmap` or `memoryview` mapped to the
+    file. Raises FileNotFoundError if the file was removed, and ValueError
+    if it has the wrong size, like a file truncated by a crash."""
+    path = func_dir / SIDECARS_DIRNAME / sidecar.name
+
+    with path.open('rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if sidecar.kind == 'ndarray':
+            numpy = _numpy()
+            if numpy is None:
+                raise ImportError('numpy is required to read the array')
+            dtype = numpy.lib.format.descr_to_dtype(sidecar.dtype)
+            expected = dtype.itemsize * math.prod(sidecar.shape)
+        else:
+            expected = sidecar.nbytes
+        if expected is not None and size != expected:
+            raise ValueError(f'{path} has {size} bytes instead of '
+                             f'{expected}')
+        if size == 0:
+            # empty files cannot be mapped, and the result is empty
+            if sidecar.kind == 'ndarray':
+                return numpy.empty(sidecar.shape, dtype=dtype)
+            return memoryview(b'')
+        if sidecar.kind == 'ndarray':
+            return numpy.memmap(str(path), dtype=dtype, mode='r',
+                                shape=sidecar.shape)
+        # the mapping remains valid after the file is closed
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
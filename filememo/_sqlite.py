@@ -0,0 +1,259 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import datetime as dt
+import os
+import pickle
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from pickledir._pickledir import Record
+
+from filememo._backend import Backend, BackendStats
+
+# All the results of a function are kept in a single SQLite database in the
+# function directory. It's one file instead of thousands, and a lookup is
+# a single indexed query instead of opening and unpickling a bucket file.
+#
+# The database is in the WAL mode, so the readers do not block the writer
+# and the writer does not block the readers. Several processes may use the
+# same database: the writers wait for each other up to `_BUSY_TIMEOUT`.
+
+DB_BASENAME = 'cache.sqlite'
+
+_BUSY_TIMEOUT = 60.0
+
+# SQLite before 3.32 allows at most 999 parameters in a query
+_MAX_PARAMS = 900
+
+# The durability of the decorator as the synchronous mode. Even with NORMAL
+# a crash never corrupts the database in the WAL mode: it may only lose the
+# last transactions
+_SYNCHRONOUS = {'none': 'NORMAL', 'file': 'FULL', 'dir': 'EXTRA'}
+
+# The expired records are not returned, but they stay in the database until
+# it is purged. It's done after this number of writes
+_PURGE_EVERY_WRITES = 1000
+
+# A regular (rowid) table: the tables WITHOUT ROWID are several times slower
+# for the rows larger than a few kilobytes. The indexes let the purge find
+# the outdated records without reading the whole table
+_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS records (
+        key BLOB PRIMARY KEY,
+        version INTEGER NOT NULL,
+        created REAL NOT NULL,
+        expires REAL,
+        data BLOB NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS records_version ON records (version)',
+    'CREATE INDEX IF NOT EXISTS records_expires ON records (expires)',
+)
+
+
+def _to_datetime(timestamp: Optional[float]) -> Optional[dt.datetime]:
+    if timestamp is None:
+        return None
+    return dt.datetime.fromtimestamp(timestamp, dt.timezone.utc)
+
+
+def _now() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+class SqliteBackend(Backend):
+    """Keeps the records of a function in a SQLite database."""
+
+    name = 'sqlite'
+
+    def __init__(self, find_dir: Callable[[], Path], version: int):
+        super().__init__(find_dir, version)
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # The connections cannot be shared by threads, and must not be
+        # inherited by the forked processes
+        conn, pid = getattr(self._local, 'conn', (None, None))
+        if conn is not None and pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(str(self.dirpath / DB_BASENAME),
+                               timeout=_BUSY_TIMEOUT,
+                               isolation_level=None,
+                               check_same_thread=False)
+        # reading the pages through the memory mapping avoids copying them
+        conn.execute('PRAGMA mmap_size=268435456')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={_SYNCHRONOUS[self.durability]}')
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        self._local.conn = conn, os.getpid()
+        return conn
+
+    def _to_record(self, row: Tuple) -> Optional[Record]:
+        version, created, expires, data = row
+        if version != self.version:
+            return None
+        if expires is not None and _now().timestamp() >= expires:
+            return None
+        self.count_bytes(read=len(data))
+        try:
+            value = pickle.loads(data)
+        except Exception:
+            # the data is corrupted, or was written by incompatible code
+            return None
+        return Record(_to_datetime(created), _to_datetime(expires), value)
+
+    def get_record(self, key: bytes) -> Optional[Record]:
+        row = self._connection().execute(
+            'SELECT version, created, expires, data FROM records '
+            'WHERE key=?', (key,)).fetchone()
+        if row is None:
+            return None
+        return self._to_record(row)
+
+    def _new_row(self, key: bytes, value: Any,
+                 max_age: Optional[dt.timedelta]) -> Tuple[tuple, Record]:
+        created = _now()
+        expires = created + max_age if max_age else None
+        row = (key, self.version, created.timestamp(),
+               expires.timestamp() if expires is not None else None,
+               pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        return row, Record(created, expires, value)
+
+    def set(self, key: bytes, value: Any,
+            max_age: Optional[dt.timedelta] = None) -> Record:
+        row, record = self._new_row(key, value, max_age)
+        self._connection().execute(
+            'INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)', row)
+        self._on_written([row])
+        return record
+
+    def delete(self, key: bytes) -> None:
+        self._connection().execute('DELETE FROM records WHERE key=?', (key,))
+
+    def iterate(self) -> Iterator[Tuple[bytes, Record]]:
+        rows = self._connection().execute(
+            'SELECT key, version, created, expires, data FROM records')
+        for row in rows:
+            record = self._to_record(row[1:])
+            if record is not None:
+                yield row[0], record
+
+    def stats(self) -> BackendStats:
+        (entries,) = self._connection().execute(
+            'SELECT COUNT(*) FROM records WHERE version=? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.version, _now().timestamp())).fetchone()
+        size = 0
+        for suffix in ('', '-wal'):
+            try:
+                size += os.path.getsize(
+                    str(self.dirpath / (DB_BASENAME + suffix)))
+            except FileNotFoundError:
+                pass
+        return BackendStats(entries=entries, bytes=size)
+
+    def get_records(self, keys: Sequence[bytes]) -> List[Optional[Record]]:
+        """Returns the records for the keys in the same order. Missing keys
+        are returned as None."""
+        conn = self._connection()
+        found = dict()
+        unique = list(set(keys))
+        for start in range(0, len(unique), _MAX_PARAMS):
+            chunk = unique[start:start + _MAX_PARAMS]
+            rows = conn.execute(
+                'SELECT key, version, created, expires, data FROM records '
+                f'WHERE key IN ({",".join("?" * len(chunk))})', chunk)
+            for row in rows:
+                found[row[0]] = row[1:]
+        return [self._to_record(found[key]) if key in found else None
+                for key in keys]
+
+    def set_records(
+            self, items: Sequence[Tuple[bytes, Any, Optional[dt.timedelta]]]
+    ) -> List[Record]:
+        """Saves many `(key, value, max_age)` items in one transaction.
+        Returns the records in the same order."""
+        rows_and_records = [self._new_row(key, value, max_age)
+                            for key, value, max_age in items]
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)',
+                [row for row, _ in rows_and_records])
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        self._on_written([row for row, _ in rows_and_records])
+        return [record for _, record in rows_and_records]
+
+    def _on_written(self, rows: List[tuple]) -> None:
+        self.count_bytes(written=sum(len(row[-1]) for row in rows))
+        # not exact when called from many threads, but it does not matter
+        self._writes += len(rows)
+        if self._writes >= _PURGE_EVERY_WRITES:
+            self._writes = 0
+            self.purge()
+
+    def purge(self) -> int:
+        """Removes the expired records and the records of other versions.
+        Returns the number of removed records."""
+        return _delete_outdated(self._connection(), self.version)
+
+
+def _delete_outdated(conn: sqlite3.Connection,
+                     version: Optional[int]) -> int:
+    # Two statements, since SQLite searches the indexes for each of them,
+    # but scans the table for the `version != ? OR expires <= ?`
+    now = _now().timestamp()
+    removed = conn.execute('DELETE FROM records WHERE expires <= ?',
+                           (now,)).rowcount
+    if version is not None:
+        removed += conn.execute(
+            'DELETE FROM records WHERE version < ? OR version > ?',
+            (version, version)).rowcount
+    return removed
+
+
+def _compact(conn: sqlite3.Connection) -> None:
+    (free,) = conn.execute('PRAGMA freelist_count').fetchone()
+    (pages,) = conn.execute('PRAGMA page_count').fetchone()
+    if free * 2 > pages:
+        # the readers in other processes do not block it in the WAL
+        # mode, the writers wait for it up to the busy timeout
+        conn.execute('VACUUM')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+def collect_garbage(db_path: Path, version: Optional[int]) -> int:
+    """Removes the expired records, and the records of other versions if
+    the `version` is known. Compacts the database if most of it is free.
+    Returns the number of removed records."""
+    conn = sqlite3.connect(str(db_path), timeout=_BUSY_TIMEOUT,
+                           isolation_level=None)
+    try:
+        removed = _delete_outdated(conn, version)
+        _compact(conn)
+        return removed
+    finally:
+        conn.close()
+
+
+def clear_database(db_path: Path) -> int:
+    """Removes all the records. The file is not removed, since other
+    processes may have it open. Returns the number of removed records."""
+    conn = sqlite3.connect(str(db_path), timeout=_BUSY_TIMEOUT,
+                           isolation_level=None)
+    try:
+        cursor = conn.execute('DELETE FROM records')
+        _compact(conn)
+        return cursor.rowcount
+    finally:
+        conn.close()
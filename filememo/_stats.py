@@ -0,0 +1,171 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import threading
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+
+class CacheStats(NamedTuple):
+    """The counters of a decorated function since it was decorated.
+
+    Each call looks up the cache once, and the lookup is counted either as
+    a hit, a miss or an expired result. The times are in seconds.
+    """
+
+    hits: int
+    """The results (or exceptions) returned from the cache."""
+    memory_hits: int
+    """The hits that were served by the in-memory tier."""
+    exception_hits: int
+    """The hits that raised the cached exceptions."""
+    stale_hits: int
+    """The hits that returned an outdated result, while the new one was
+    computed in background (see `stale_while_revalidate`)."""
+    misses: int
+    """The lookups that found nothing in the cache."""
+    expired: int
+    """The lookups that found an outdated result."""
+    remote_hits: int
+    """The misses and expired results of the local cache that were found
+    in the remote tier (see `remote`)."""
+    computations: int
+    """The calls of the original function."""
+    compute_time: float
+    read_time: float
+    """The time spent reading and decoding the records from the storage."""
+    write_time: float
+    bytes_read: int
+    bytes_written: int
+
+
+class CacheEvent(NamedTuple):
+    """Passed to the `on_event` callback of `memoize`.
+
+    The `kind` is one of:
+
+    - 'hit', 'miss', 'expired': the result of the cache lookup. For hits,
+      `memory` tells whether the result was found in the in-memory tier,
+      `exception` whether it is a cached exception, and `stale` whether
+      it is an outdated result returned while the new one is computed
+    - 'remote': the result missing in the local cache was found in the
+      remote tier
+    - 'call': the original function is about to be called with `args` and
+      `kwargs`
+    - 'computed': the original function returned or raised after
+      `seconds`. The `exception` tells whether it raised
+    - 'read', 'write': the storage was read or written for `seconds`
+    """
+
+    kind: str
+    seconds: float = 0.0
+    exception: bool = False
+    memory: bool = False
+    stale: bool = False
+    args: Tuple = ()
+    kwargs: Optional[Dict[str, Any]] = None
+
+
+class StatsCounter:
+    """Thread-safe counters behind `cache_stats()`. Also passes the events
+    to the optional callback.
+
+    The counters are updated on every call, so they are plain attributes
+    changed under a lock, without any indirection."""
+
+    def __init__(self, on_event: Optional[Callable[[CacheEvent], None]]):
+        self.on_event = on_event
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.exception_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.remote_hits = 0
+        self.computations = 0
+        self.compute_time = 0.0
+        self.read_time = 0.0
+        self.write_time = 0.0
+
+    def lookup(self, data: Optional[Tuple], found: bool,
+               memory: bool, stale: bool = False) -> None:
+        """Counts the result of a lookup. The `data` is the `(exception,
+        result)` pair, or None if nothing usable was found. `found` tells
+        whether there was a record at all."""
+        if data is not None:
+            exception = data[0] is not None
+            with self._lock:
+                self.hits += 1
+                if memory:
+                    self.memory_hits += 1
+                if exception:
+                    self.exception_hits += 1
+                if stale:
+                    self.stale_hits += 1
+            if self.on_event is not None:
+                self.on_event(CacheEvent('hit', exception=exception,
+                                         memory=memory, stale=stale))
+        elif found:
+            with self._lock:
+                self.expired += 1
+            if self.on_event is not None:
+                self.on_event(CacheEvent('expired'))
+        else:
+            with self._lock:
+                self.misses += 1
+            if self.on_event is not None:
+                self.on_event(CacheEvent('miss'))
+
+    def memory_hit(self, data: Tuple) -> None:
+        """The same as `lookup` for a fresh record found in memory. It's
+        the most frequent case, so it has the shortest path."""
+        with self._lock:
+            self.hits += 1
+            self.memory_hits += 1
+            if data[0] is not None:
+                self.exception_hits += 1
+        if self.on_event is not None:
+            self.on_event(CacheEvent('hit', exception=data[0] is not None,
+                                     memory=True))
+
+    def remote_hit(self) -> None:
+        with self._lock:
+            self.remote_hits += 1
+        if self.on_event is not None:
+            self.on_event(CacheEvent('remote'))
+
+    def call(self, args: Tuple, kwargs: Dict[str, Any]) -> None:
+        if self.on_event is not None:
+            self.on_event(CacheEvent('call', args=args, kwargs=kwargs))
+
+    def computed(self, seconds: float, exception: bool) -> None:
+        with self._lock:
+            self.computations += 1
+            self.compute_time += seconds
+        if self.on_event is not None:
+            self.on_event(CacheEvent('computed', seconds=seconds,
+                                     exception=exception))
+
+    def read(self, seconds: float) -> None:
+        with self._lock:
+            self.read_time += seconds
+        if self.on_event is not None:
+            self.on_event(CacheEvent('read', seconds=seconds))
+
+    def write(self, seconds: float) -> None:
+        with self._lock:
+            self.write_time += seconds
+        if self.on_event is not None:
+            self.on_event(CacheEvent('write', seconds=seconds))
+
+    def snapshot(self, bytes_read: int, bytes_written: int) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self.hits, memory_hits=self.memory_hits,
+                exception_hits=self.exception_hits,
+                stale_hits=self.stale_hits, misses=self.misses,
+                expired=self.expired, remote_hits=self.remote_hits,
+                computations=self.computations,
+                compute_time=self.compute_time, read_time=self.read_time,
+                write_time=self.write_time, bytes_read=bytes_read,
+                bytes_written=bytes_written)
@@ -22,7 +22,14 @@ setup(
     url='https://github.com/rtmigo/filememo_py#readme',
 
     python_requires='>=3.8',  # needed by pickledir
-    install_requires=['pickledir>=0.3.5'],
+    # filememo reads and writes the pickledir files through its internals,
+    # so the file format and these internals must not change
+    install_requires=['pickledir>=0.3.5,<0.4'],
+    extras_require={
+        'zstd': ['zstandard'],
+        'lz4': ['lz4'],
+        'numpy': ['numpy'],
+    },
     packages=[name],
 
     description="File-based memoization decorator. Stores the results of "
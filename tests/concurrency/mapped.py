@@ -0,0 +1,17 @@
+import os
+import tempfile
+from pathlib import Path
+
+from filememo import memoize
+
+cache_dir = Path(tempfile.gettempdir()) / 'filememo_tests' / 'mapped'
+
+
+@memoize(dir_path=cache_dir)
+def square_with_pid(x):
+    return x * x, os.getpid()
+
+
+@memoize(dir_path=cache_dir)
+def cube_with_pid(x):
+    return x * x * x, os.getpid()
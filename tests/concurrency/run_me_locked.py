@@ -0,0 +1,20 @@
+import sys
+import time
+from pathlib import Path
+
+from filememo import memoize
+
+cache_dir = Path(sys.argv[1])
+calls_file = Path(sys.argv[2])
+
+
+@memoize(dir_path=cache_dir, lock=True)
+def expensive(x):
+    with calls_file.open('a') as f:
+        f.write('call\n')
+    time.sleep(1)
+    return x * 2
+
+
+if __name__ == "__main__":
+    assert expensive(21) == 42
@@ -0,0 +1,12 @@
+import os
+import tempfile
+from pathlib import Path
+
+from filememo import memoize
+
+cache_dir = Path(tempfile.gettempdir()) / 'filememo_tests' / 'shared_sqlite'
+
+
+@memoize(dir_path=cache_dir, backend='sqlite')
+def cube_with_pid(x):
+    return x * x * x, os.getpid()
@@ -0,0 +1,11 @@
+import tempfile
+from pathlib import Path
+
+from filememo import memoize
+
+cache_dir = Path(tempfile.gettempdir()) / 'filememo_tests' / 'warmed'
+
+
+@memoize(dir_path=cache_dir)
+def power(x, y):
+    return x ** y
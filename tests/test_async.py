@@ -0,0 +1,210 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import threading
+import unittest
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from pickledir import PickleDir
+
+from filememo import memoize, FunctionException
+
+
+class TestAsync(unittest.TestCase):
+
+    def test_caches_result_not_coroutine(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td)
+            async def function(a, b):
+                nonlocal calls
+                calls += 1
+                await asyncio.sleep(0.01)
+                return a + b
+
+            self.assertTrue(asyncio.iscoroutinefunction(function))
+
+            async def main():
+                self.assertEqual(await function(1, 2), 3)
+                self.assertEqual(await function(1, 2), 3)
+
+            asyncio.run(main())
+            self.assertEqual(calls, 1)
+
+            # the result survives the event loop
+            asyncio.run(main())
+            self.assertEqual(calls, 1)
+
+    def test_io_not_in_loop_thread(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            async def function(a):
+                return a
+
+            io_threads = set()
+            original = PickleDir._get_record
+
+            def spy(*args, **kwargs):
+                io_threads.add(threading.get_ident())
+                return original(*args, **kwargs)
+
+            async def main():
+                with patch.object(PickleDir, '_get_record', spy):
+                    await function(1)
+                    await function(1)
+                return threading.get_ident()
+
+            loop_thread = asyncio.run(main())
+            self.assertTrue(io_threads)
+            self.assertNotIn(loop_thread, io_threads)
+
+    def test_concurrent_awaits(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td)
+            async def function(a):
+                nonlocal calls
+                calls += 1
+                await asyncio.sleep(0.2)
+                return a * 2
+
+            async def main():
+                return await asyncio.gather(*[function(5) for _ in range(10)])
+
+            self.assertEqual(asyncio.run(main()), [10] * 10)
+            self.assertEqual(calls, 1)
+
+    def test_exceptions(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td)
+            async def divide(a, b):
+                nonlocal calls
+                calls += 1
+                return a / b
+
+            async def main():
+                for _ in range(2):
+                    with self.assertRaises(FunctionException) as cm:
+                        await divide(1, 0)
+                    self.assertIsInstance(cm.exception.inner,
+                                          ZeroDivisionError)
+
+            asyncio.run(main())
+            self.assertEqual(calls, 1)
+
+    def test_memory_and_lock(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, memory_items=10, lock=True,
+                     lock_timeout=timedelta(seconds=5))
+            async def function(a):
+                nonlocal calls
+                calls += 1
+                return a
+
+            async def main():
+                await function(1)
+                with patch.object(PickleDir, '_get_record') as disk_read:
+                    self.assertEqual(await function(1), 1)
+                    disk_read.assert_not_called()
+
+            asyncio.run(main())
+            self.assertEqual(calls, 1)
+
+    def test_cancelled_leader(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td)
+            async def function(a):
+                nonlocal calls
+                calls += 1
+                await asyncio.sleep(0.2)
+                return a
+
+            async def main():
+                task = asyncio.ensure_future(function(1))
+                await asyncio.sleep(0.05)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+                # nothing is cached, nothing is stuck
+                self.assertEqual(await function(1), 1)
+
+            asyncio.run(main())
+            self.assertEqual(calls, 2)
+
+    def test_cancelled_leader_with_waiters(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td)
+            async def function(a):
+                nonlocal calls
+                calls += 1
+                await asyncio.sleep(0.2)
+                return a
+
+            async def main():
+                leader = asyncio.ensure_future(function(1))
+                await asyncio.sleep(0.05)
+                waiters = [asyncio.ensure_future(function(1))
+                           for _ in range(3)]
+                await asyncio.sleep(0.05)
+                leader.cancel()
+                # the waiters were not cancelled, so they get the result
+                self.assertEqual(await asyncio.gather(*waiters), [1] * 3)
+                self.assertTrue(leader.cancelled())
+
+            asyncio.run(main())
+            self.assertEqual(calls, 2)
+
+    def test_cancelled_while_waiting_for_lock(self):
+        with TemporaryDirectory() as td:
+            release = None
+
+            def create():
+                # the same function in two processes
+                @memoize(dir_path=td, lock=True,
+                         lock_stale_age=timedelta(seconds=1))
+                async def function(a):
+                    await release.wait()
+                    return a
+
+                return function
+
+            holder, waiter = create(), create()
+
+            async def main():
+                nonlocal release
+                release = asyncio.Event()
+                holding = asyncio.ensure_future(holder(1))
+                await asyncio.sleep(0.1)
+                waiting = asyncio.ensure_future(waiter(1))
+                await asyncio.sleep(0.1)
+                waiting.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await waiting
+                release.set()
+                self.assertEqual(await holding, 1)
+
+                # nobody holds the lock anymore
+                await asyncio.sleep(0.2)
+                locks = waiter.data.dirpath / 'locks'
+                self.assertEqual(list(locks.iterdir()), [])
+                self.assertEqual(
+                    await asyncio.wait_for(waiter(1), timeout=5), 1)
+
+            asyncio.run(main())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import time
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from pickledir import PickleDir
+from pickledir._pickledir import Record
+
+from filememo import memoize, FunctionException, Backend
+from filememo._backend import PickleDirBackend, MemoryBackend
+from filememo._sqlite import SqliteBackend
+
+
+class TestBackends(unittest.TestCase):
+    """The same checks for all the built-in backends."""
+
+    backends = [PickleDirBackend, SqliteBackend, MemoryBackend]
+
+    def test_set_get_delete(self):
+        for cls in self.backends:
+            with self.subTest(cls.name), TemporaryDirectory() as td:
+                backend = cls(lambda: Path(td), version=1)
+                record = backend.set(b'k' * 16, (None, 'A'))
+                self.assertEqual(record.data, (None, 'A'))
+                self.assertEqual(backend.get_record(b'k' * 16).data,
+                                 (None, 'A'))
+                self.assertIsNone(backend.get_record(b'x' * 16))
+
+                backend.delete(b'k' * 16)
+                self.assertIsNone(backend.get_record(b'k' * 16))
+                backend.delete(b'k' * 16)  # not an error
+
+    def test_expired(self):
+        for cls in self.backends:
+            with self.subTest(cls.name), TemporaryDirectory() as td:
+                backend = cls(lambda: Path(td), version=1)
+                backend.set(b'a' * 16, 1, max_age=timedelta(seconds=0.1))
+                backend.set(b'b' * 16, 2)
+                time.sleep(0.2)
+                self.assertIsNone(backend.get_record(b'a' * 16))
+                self.assertEqual(
+                    [(key, record.data) for key, record in backend.iterate()],
+                    [(b'b' * 16, 2)])
+
+    def test_bulk_and_stats(self):
+        for cls in self.backends:
+            with self.subTest(cls.name), TemporaryDirectory() as td:
+                backend = cls(lambda: Path(td), version=1)
+                keys = [bytes([i]) * 16 for i in range(50)]
+                backend.set_records([(key, key[0], None) for key in keys])
+                records = backend.get_records(keys + [b'z' * 16])
+                self.assertEqual([r.data for r in records[:50]],
+                                 list(range(50)))
+                self.assertIsNone(records[50])
+                stats = backend.stats()
+                self.assertEqual(stats.entries, 50)
+                self.assertGreater(stats.bytes, 0)
+
+
+class TestPickleDirBackend(unittest.TestCase):
+
+    def test_pickledir_internals(self):
+        # the internals of pickledir used by filememo. If a new version
+        # of pickledir changes them, the pinned version range must not
+        # be extended
+        for name in ('_key_to_bytes', '_bytes_to_key', '_key_bytes_to_hash',
+                     '_key_bytes_to_file', '_load_file', '_save_file',
+                     '_now', '_is_data_basename', '_get_record'):
+            self.assertTrue(callable(getattr(PickleDir, name, None)), name)
+        self.assertEqual(Record._fields, ('created', 'expires', 'data'))
+
+
+class TestBackendArgument(unittest.TestCase):
+
+    def test_memory(self):
+        calls = 0
+
+        @memoize(backend='memory', exceptions_max_age=None)
+        def function(a):
+            nonlocal calls
+            calls += 1
+            if a < 0:
+                raise ValueError
+            return [a]
+
+        self.assertEqual(function(1), [1])
+        # the results are copied, like when they are read from disk
+        function(1).append(2)
+        self.assertEqual(function(1), [1])
+        self.assertEqual(calls, 1)
+
+        for _ in range(2):
+            with self.assertRaises(FunctionException):
+                function(-1)
+        self.assertEqual(calls, 3)
+
+    def test_custom(self):
+        class CountingBackend(MemoryBackend):
+            name = 'counting'
+            gets = 0
+
+            def get_record(self, key):
+                CountingBackend.gets += 1
+                return super().get_record(key)
+
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, backend=CountingBackend)
+            def function(a):
+                return a * 2
+
+            self.assertEqual(function(2), 4)
+            gets = CountingBackend.gets
+            self.assertEqual(function(2), 4)
+            self.assertEqual(CountingBackend.gets, gets + 1)
+            self.assertIsInstance(function.data, Backend)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            memoize(lambda: None, backend='unknown')
+
+    def test_size_limits(self):
+        with self.assertRaises(ValueError):
+            memoize(lambda: None, backend='memory', max_entries=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from pickledir import PickleDir
+
+from filememo import memoize, FunctionException
+from filememo._bulk import get_records, set_records
+
+
+class TestBulk(unittest.TestCase):
+
+    def test_set_get(self):
+        with TemporaryDirectory() as td:
+            pd = PickleDir(Path(td))
+            set_records(pd, [(i, str(i), None) for i in range(100)])
+            records = get_records(pd, list(range(110)))
+            self.assertEqual([r.data for r in records[:100]],
+                             [str(i) for i in range(100)])
+            self.assertEqual(records[100:], [None] * 10)
+
+            # the records are compatible with PickleDir
+            self.assertEqual(pd.get(5), '5')
+
+    def test_each_file_loaded_once(self):
+        with TemporaryDirectory() as td:
+            pd = PickleDir(Path(td))
+            for i in range(10):
+                pd.set(i, i)
+            with patch.object(PickleDir, '_load_file',
+                              side_effect=PickleDir._load_file,
+                              autospec=True) as load:
+                get_records(pd, [1, 1, 1, 2, 2, 2])
+                self.assertEqual(load.call_count, 2)
+
+
+class TestGetMany(unittest.TestCase):
+
+    def test_hits_and_misses(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function(a, b):
+                return a + b
+
+            function(1, 2)
+            function(3, 4)
+
+            result = function.get_many([(1, 2), (5, 6), (3, 4)])
+            self.assertEqual(result.hits, {0: 3, 2: 7})
+            self.assertEqual(result.misses, [1])
+
+    def test_executor(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, max_age=timedelta(days=1))
+            def function(a):
+                nonlocal calls
+                calls += 1
+                return a * 2
+
+            function(0)
+            with ThreadPoolExecutor(4) as executor:
+                result = function.get_many([(i,) for i in range(10)],
+                                           executor=executor)
+            self.assertEqual(result.hits, {i: i * 2 for i in range(10)})
+            self.assertEqual(result.misses, [])
+            self.assertEqual(calls, 10)
+
+            # all the results are cached now
+            result = function.get_many([(i,) for i in range(10)])
+            self.assertEqual(len(result.hits), 10)
+            self.assertEqual(function(7), 14)
+            self.assertEqual(calls, 10)
+
+    def test_exceptions(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def divide(a, b):
+                return a / b
+
+            with ThreadPoolExecutor(2) as executor:
+                result = divide.get_many([(1, 0), (4, 2)], executor=executor)
+            self.assertIsInstance(result.hits[0], FunctionException)
+            self.assertEqual(result.hits[1], 2)
+
+            result = divide.get_many([(1, 0)])
+            self.assertIsInstance(result.hits[0].inner, ZeroDivisionError)
+
+    def test_memory(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, memory_items=100)
+            def function(a):
+                return a
+
+            for i in range(5):
+                function(i)
+            with patch.object(PickleDir, '_load_file') as load:
+                self.assertEqual(len(function.get_many(
+                    [(i,) for i in range(5)]).hits), 5)
+                load.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
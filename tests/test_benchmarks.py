@@ -0,0 +1,26 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import json
+import unittest
+
+from benchmarks.run import run
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Only checks that the harness works. The numbers are not checked."""
+
+    def test_quick_run(self):
+        report = run(['latency', 'hot', 'scaling'], quick=True,
+                     max_entries=1000)
+        names = {result['name'] for result in report['results']}
+        self.assertTrue({'cold_miss', 'warm_hit', 'expired_hit',
+                         'scaled_hit', 'hot_hit'} <= names)
+        for result in report['results']:
+            self.assertGreater(result['median'], 0)
+        # the report is serializable
+        json.dumps(report)
+
+
+if __name__ == "__main__":
+    unittest.main()
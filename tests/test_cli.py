@@ -0,0 +1,189 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import io
+import json
+import time
+import unittest
+from contextlib import redirect_stdout
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+
+from filememo import memoize
+from filememo._cli import main
+from filememo._evict import _sweep_lock
+from filememo._scan import scan
+from .test_gc import unknown_module, _data_files
+
+
+def run(*argv) -> str:
+    output = io.StringIO()
+    with redirect_stdout(output):
+        main(list(argv))
+    return output.getvalue()
+
+
+def create_functions(dir_path):
+    @memoize(dir_path=dir_path, max_age=timedelta(seconds=0.1))
+    def short(a):
+        return a
+
+    @memoize(dir_path=dir_path, backend='sqlite')
+    def in_database(a):
+        return a
+
+    for i in range(10):
+        short(i)
+        in_database(i)
+    return short, in_database
+
+
+class TestScan(unittest.TestCase):
+
+    def test_scan(self):
+        with TemporaryDirectory() as td:
+            short, in_database = create_functions(td)
+            time.sleep(0.2)
+
+            infos = {info.path: info for info in scan(td)}
+            self.assertEqual(len(infos), 2)
+
+            info = infos[short.data.dirpath]
+            self.assertTrue(info.method_id.endswith('short'))
+            self.assertEqual(info.backend, 'pickledir')
+            self.assertEqual((info.entries, info.expired), (10, 10))
+            self.assertEqual(info.versions, {1: 10})
+            self.assertEqual(info.ages['<1h'], 10)
+            self.assertGreater(info.bytes, 0)
+
+            info = infos[in_database.data.dirpath]
+            self.assertEqual(info.backend, 'sqlite')
+            self.assertEqual((info.entries, info.expired), (10, 0))
+            self.assertEqual(info.versions, {1: 10})
+            self.assertEqual(info.ages['<1h'], 10)
+
+    def test_not_deep(self):
+        with TemporaryDirectory() as td:
+            create_functions(td)
+            for info in scan(td, deep=False):
+                self.assertIsNone(info.entries)
+                self.assertGreater(info.files, 0)
+
+    def test_unknown_result_classes(self):
+        with TemporaryDirectory() as td:
+            with unknown_module() as result_class:
+                @memoize(dir_path=td)
+                def function(a):
+                    return result_class(a)
+
+                for i in range(20):
+                    function(i)
+
+            (info,) = scan(td)
+            self.assertEqual((info.entries, info.unreadable), (20, 0))
+
+    def test_unreadable(self):
+        with TemporaryDirectory() as td:
+            short, _ = create_functions(td)
+            path = _data_files(short.data.dirpath)[0]
+            path.write_bytes(b'damaged')
+            info = {info.path: info for info in scan(td)}[short.data.dirpath]
+            self.assertEqual(info.unreadable, 1)
+            self.assertLess(info.entries, 10)
+
+    def test_versions(self):
+        with TemporaryDirectory() as td:
+            for version in (1, 2):
+                @memoize(dir_path=td, version=version)
+                def function(a):
+                    return a
+
+                function(version)
+            # the files of the previous version may still be on disk
+            (info,) = scan(td)
+            self.assertEqual(info.version, 2)
+            self.assertEqual(sum(info.versions.values()), info.entries)
+
+
+class TestCommands(unittest.TestCase):
+
+    def test_ls(self):
+        with TemporaryDirectory() as td:
+            short, in_database = create_functions(td)
+            lines = run('ls', td).splitlines()
+            self.assertEqual(len(lines), 3)
+            self.assertTrue(any(line.endswith('short') for line in lines))
+            self.assertTrue(any(' sqlite ' in line for line in lines))
+
+    def test_stats_json(self):
+        with TemporaryDirectory() as td:
+            create_functions(td)
+            infos = json.loads(run('stats', td, '--json',
+                                   '--function', 'in_database'))
+            self.assertEqual(len(infos), 1)
+            self.assertEqual(infos[0]['entries'], 10)
+
+    def test_stats_text(self):
+        with TemporaryDirectory() as td:
+            create_functions(td)
+            text = run('stats', td)
+            self.assertIn('entries:  10', text)
+            self.assertIn('<1h: 10', text)
+
+    def test_purge_expired(self):
+        with TemporaryDirectory() as td:
+            short, in_database = create_functions(td)
+            time.sleep(0.2)
+            run('purge', td, '--expired')
+            infos = {info.path: info for info in scan(td)}
+            self.assertEqual(infos[short.data.dirpath].entries, 0)
+            self.assertEqual(infos[in_database.data.dirpath].entries, 10)
+
+    def test_purge_one_function(self):
+        with TemporaryDirectory() as td:
+            short, in_database = create_functions(td)
+            run('purge', td, '--all', '--function', 'in_database')
+            infos = {info.path: info for info in scan(td)}
+            self.assertEqual(infos[short.data.dirpath].entries, 10)
+            self.assertEqual(infos[in_database.data.dirpath].entries, 0)
+
+            # the function still works with the cleared directory
+            self.assertEqual(in_database(5), 5)
+            self.assertEqual(sum(info.entries for info in scan(td)), 11)
+
+    def test_purge_max_bytes(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function(a):
+                return bytes(1000)
+
+            for i in range(20):
+                function(i)
+            run('purge', td, '--max-bytes', '5000')
+            (info,) = scan(td)
+            self.assertLess(info.entries, 20)
+
+    def test_purge_max_bytes_while_sweeping(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function(a):
+                return bytes(1000)
+
+            for i in range(20):
+                function(i)
+            # the lock of a sweep by the decorated function
+            with _sweep_lock(function.data.dirpath):
+                text = run('purge', td, '--max-bytes', '5000')
+            self.assertIn('skipped', text)
+            (info,) = scan(td)
+            self.assertEqual(info.entries, 20)
+
+    def test_purge_no_match(self):
+        with TemporaryDirectory() as td:
+            create_functions(td)
+            with self.assertRaises(SystemExit):
+                run('purge', td, '--all', '--function', 'missing')
+
+
+if __name__ == '__main__':
+    unittest.main()
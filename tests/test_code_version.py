@@ -0,0 +1,170 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import unittest
+from tempfile import TemporaryDirectory
+
+import filememo._keys
+from filememo import memoize
+from filememo._code_version import code_version
+
+FILENAME = '/project/module.py'
+
+
+def define(source: str, name: str = 'function', **namespace):
+    # the same function, as if the module was loaded in other process
+    exec(compile(source, FILENAME, 'exec'), namespace)
+    return namespace[name]
+
+
+SOURCE = '''
+def function(a, b=2):
+    rate = 0.5
+    return helper(a) * b * rate
+'''
+
+
+class TestCodeVersion(unittest.TestCase):
+
+    def test_same_code(self):
+        self.assertEqual(code_version(define(SOURCE)),
+                         code_version(define(SOURCE)))
+
+    def test_lines_and_file_ignored(self):
+        moved = define('\n\n# comment\n' + SOURCE)
+        self.assertEqual(code_version(define(SOURCE)), code_version(moved))
+
+        other_file = dict()
+        exec(compile(SOURCE, '/other/path.py', 'exec'), other_file)
+        self.assertEqual(code_version(define(SOURCE)),
+                         code_version(other_file['function']))
+
+    def test_changes(self):
+        version = code_version(define(SOURCE))
+        for changed in (SOURCE.replace('0.5', '0.6'),
+                        SOURCE.replace('b=2', 'b=3'),
+                        SOURCE.replace('helper', 'other_helper'),
+                        SOURCE.replace('* b', '+ b')):
+            with self.subTest(changed):
+                self.assertNotEqual(version,
+                                    code_version(define(changed)))
+
+    def test_nested_function(self):
+        source = '''
+def function(a):
+    def inner(x):
+        return x + 1
+    return inner(a)
+'''
+        self.assertNotEqual(code_version(define(source)),
+                            code_version(define(source.replace('+ 1',
+                                                               '+ 2'))))
+
+    def test_depends_on(self):
+        helper_source = 'def helper(x):\n    return x * 2\n'
+        helper = define(helper_source, 'helper')
+        changed = define(helper_source.replace('* 2', '* 3'), 'helper')
+        function = define(SOURCE)
+
+        self.assertNotEqual(code_version(function),
+                            code_version(function, [helper]))
+        self.assertEqual(code_version(function, [helper]),
+                         code_version(function, [define(helper_source,
+                                                        'helper')]))
+        self.assertNotEqual(code_version(function, [helper]),
+                            code_version(function, [changed]))
+
+    def test_modules_and_classes(self):
+        function = define(SOURCE)
+        self.assertEqual(code_version(function, ['filememo._keys']),
+                         code_version(function, [filememo._keys]))
+
+        source = '''
+class Model:
+    factor = 2
+
+    def predict(self, x):
+        return x * self.factor
+'''
+        model = define(source, 'Model')
+        self.assertEqual(code_version(function, [model]),
+                         code_version(function, [define(source, 'Model')]))
+        self.assertNotEqual(
+            code_version(function, [model]),
+            code_version(function, [define(source.replace('= 2', '= 3'),
+                                           'Model')]))
+
+    def test_fits_sqlite_integer(self):
+        self.assertLess(code_version(define(SOURCE)), 2 ** 63)
+
+
+class TestAutoVersion(unittest.TestCase):
+
+    def test_recomputed_when_code_changes(self):
+        for backend in ('pickledir', 'sqlite'):
+            with self.subTest(backend=backend), TemporaryDirectory() as td:
+                runs = []
+
+                def helper(x):
+                    runs.append(x)
+                    return x
+
+                def decorated(source):
+                    return memoize(define(source, helper=helper),
+                                   dir_path=td, version='auto',
+                                   backend=backend)
+
+                function = decorated(SOURCE)
+                self.assertEqual(function(3), 3.0)
+                self.assertEqual(runs, [3])
+                self.assertIsInstance(function.version, int)
+
+                # the same code in a new process: the result is cached
+                function = decorated(SOURCE)
+                function(3)
+                self.assertEqual(runs, [3])
+
+                # the changed code: the result is computed again, and
+                # the cache directory is the same
+                changed = decorated(SOURCE.replace('0.5', '0.6'))
+                changed(3)
+                self.assertEqual(runs, [3, 3])
+                self.assertEqual(changed.data.dirpath,
+                                 function.data.dirpath)
+
+    def test_depends_on(self):
+        with TemporaryDirectory() as td:
+            runs = []
+            helper_source = 'def helper(x):\n    runs.append(x)\n' \
+                            '    return x\n'
+
+            def decorated(helper):
+                return memoize(define(SOURCE, helper=helper), dir_path=td,
+                               version='auto', depends_on=[helper])
+
+            decorated(define(helper_source, 'helper', runs=runs))(3)
+            decorated(define(helper_source, 'helper', runs=runs))(3)
+            self.assertEqual(runs, [3])
+            decorated(define(helper_source.replace('x\n', 'x + 1\n'),
+                             'helper', runs=runs))(3)
+            self.assertEqual(runs, [3, 3])
+
+    def test_recursive_nested(self):
+        with TemporaryDirectory() as td:
+            def create():
+                @memoize(dir_path=td, version='auto')
+                def fib(n):
+                    return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+                return fib
+
+            self.assertEqual(create()(10), 55)
+            self.assertEqual(create().version, create().version)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            memoize(lambda: 1, version=2, depends_on=[len])
+
+
+if __name__ == '__main__':
+    unittest.main()
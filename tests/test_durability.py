@@ -0,0 +1,137 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import os
+import threading
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from pickledir import PickleDir
+
+from filememo import memoize
+from filememo._atomic import write_atomic
+
+
+def _data_files(dir_path: Path):
+    return [p for p in dir_path.iterdir()
+            if PickleDir._is_data_basename(p.name)]
+
+
+class TestWriteAtomic(unittest.TestCase):
+
+    def test_write(self):
+        with TemporaryDirectory() as td:
+            path = Path(td) / 'sub' / 'file'
+            write_atomic(path, b'abc')
+            self.assertEqual(path.read_bytes(), b'abc')
+            self.assertEqual(os.listdir(str(path.parent)), ['file'])
+
+    def test_failed_write_leaves_nothing(self):
+        with TemporaryDirectory() as td:
+            path = Path(td) / 'file'
+            path.write_bytes(b'old')
+            with mock.patch('filememo._atomic.os.replace',
+                            side_effect=OSError):
+                with self.assertRaises(OSError):
+                    write_atomic(path, b'new')
+            self.assertEqual(path.read_bytes(), b'old')
+            self.assertEqual(os.listdir(td), ['file'])
+
+    def test_fsync(self):
+        with TemporaryDirectory() as td:
+            path = Path(td) / 'file'
+            for durability, min_calls in (('none', 0), ('file', 1),
+                                          ('dir', 1 if os.name == 'nt'
+                                          else 2)):
+                with mock.patch('filememo._atomic.os.fsync') as fsync:
+                    write_atomic(path, b'abc', durability)
+                self.assertEqual(fsync.call_count, min_calls)
+
+
+class TestDurability(unittest.TestCase):
+
+    def test_options(self):
+        for durability in ('none', 'file', 'dir'):
+            with TemporaryDirectory() as td:
+                @memoize(dir_path=td, durability=durability)
+                def function(a):
+                    return a * 2
+
+                with mock.patch('filememo._atomic.os.fsync') as fsync:
+                    self.assertEqual(function(2), 4)
+                self.assertEqual(fsync.called, durability != 'none')
+                self.assertEqual(function(2), 4)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            memoize(lambda: 1, durability='always')
+
+    def test_sqlite(self):
+        for durability, mode in (('none', 1), ('file', 2), ('dir', 3)):
+            with TemporaryDirectory() as td:
+                @memoize(dir_path=td, backend='sqlite',
+                         durability=durability)
+                def function(a):
+                    return a
+
+                function(1)
+                (synchronous,) = function.data._connection().execute(
+                    'PRAGMA synchronous').fetchone()
+                self.assertEqual(synchronous, mode)
+
+    def test_corrupt_file_is_miss(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td)
+            def function(a):
+                nonlocal calls
+                calls += 1
+                return a
+
+            function(1)
+            (path,) = _data_files(function.data.dirpath)
+            # as if the file was truncated by a crash
+            path.write_bytes(path.read_bytes()[:10])
+
+            self.assertEqual(function(1), 1)
+            self.assertEqual(calls, 2)
+            # and the file was replaced
+            self.assertEqual(function(1), 1)
+            self.assertEqual(calls, 2)
+
+    def test_concurrent_writes_of_same_key(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function(a):
+                return a
+
+            key = b'0123456789abcdef'
+            errors = []
+
+            def write(value):
+                try:
+                    for _ in range(50):
+                        function.data.set(key, (None, value))
+                except BaseException as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=write, args=(i,))
+                       for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(errors, [])
+            # one of the values won, and no temporary files are left
+            self.assertIn(function.data.get_record(key).data[1], range(8))
+            self.assertEqual(
+                [p.name for p in _data_files(function.data.dirpath)],
+                [function.data.data_file(key)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import os
+import pickle
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from pickledir import PickleDir
+
+from filememo import memoize, evict
+from filememo import _evict
+from filememo._evict import function_dirs
+
+
+def _data_files(dir_path: Path):
+    return [p for func_dir in function_dirs(dir_path)
+            for p in func_dir.iterdir()
+            if PickleDir._is_data_basename(p.name)]
+
+
+def _dir_size(dir_path: Path) -> int:
+    return sum(p.stat().st_size for p in _data_files(dir_path))
+
+
+class TestEvict(unittest.TestCase):
+
+    def test_max_entries(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, max_entries=10)
+            def function(a):
+                nonlocal calls
+                calls += 1
+                return a
+
+            for i in range(30):
+                function(i)
+
+            self.assertLessEqual(len(_data_files(Path(td))), 10)
+            # the latest results are still cached
+            calls = 0
+            function(29)
+            self.assertEqual(calls, 0)
+
+    def test_max_bytes(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, max_bytes=50_000)
+            def function(a):
+                return b'x' * 10_000
+
+            for i in range(20):
+                function(i)
+
+            self.assertLessEqual(_dir_size(Path(td)), 50_000)
+            self.assertGreater(_dir_size(Path(td)), 20_000)
+
+    def test_sweeps_amortized(self):
+        # once the limit is reached, the sweep frees some room, so that
+        # the next writes do not rescan the directory each time
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, max_bytes=20_000)
+            def function(a):
+                return b'x' * 100
+
+            with mock.patch('filememo._evict._evict_unlocked',
+                            wraps=_evict._evict_unlocked) as sweep:
+                for i in range(300):
+                    function(i)
+
+            self.assertLessEqual(_dir_size(Path(td)), 20_000)
+            self.assertLess(sweep.call_count, 50)
+
+    def test_entries_counts_not_growing(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function(a):
+                return a
+
+            for i in range(300):
+                function(i)
+                if i % 10 == 0:
+                    # each sweep sees the rewritten files
+                    evict(td, max_entries=1000)
+
+            known = [path for path in _evict._entries_counts
+                     if path.startswith(td)]
+            self.assertLessEqual(len(known), len(_data_files(Path(td))))
+
+            evict(td, max_entries=0)
+            self.assertFalse([path for path in _evict._entries_counts
+                              if path.startswith(td)])
+
+    def test_damaged_file(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, max_entries=5)
+            def function(a):
+                return a
+
+            function(1)
+            (path,) = _data_files(Path(td))
+            # a pickle of the wrong shape
+            path.write_bytes(pickle.dumps((1, 2)))
+            for i in range(2, 20):
+                self.assertEqual(function(i), i)
+            self.assertLessEqual(len(_data_files(Path(td))), 5)
+
+    def test_lru(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function(a):
+                return a
+
+            for i in range(5):
+                function(i)
+            files = sorted(_data_files(Path(td)),
+                           key=lambda p: p.stat().st_mtime)
+            # making the first file the most recently used
+            now = time.time()
+            os.utime(str(files[0]), (now + 10, now + 10))
+
+            result = evict(td, max_entries=1)
+            self.assertEqual(result.files_removed, 4)
+            self.assertEqual(result.entries_left, 1)
+            self.assertEqual(_data_files(Path(td)), [files[0]])
+
+    def test_lru_touched_on_hit(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, max_entries=3)
+            def function(a):
+                nonlocal calls
+                calls += 1
+                return a
+
+            function(0)
+            for p in _data_files(Path(td)):
+                os.utime(str(p), (0, 0))
+            function(1)
+            function(2)
+            function(0)  # hit, updates the time of the file
+            function(3)  # evicts the least recently used
+            calls = 0
+            function(0)
+            self.assertEqual(calls, 0)
+            function(1)
+            self.assertEqual(calls, 1)
+
+    def test_lfu(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, max_entries=3, eviction='lfu')
+            def function(a):
+                nonlocal calls
+                calls += 1
+                return a
+
+            for i in range(3):
+                function(i)
+            for _ in range(5):
+                function(0)
+                function(2)
+
+            function(3)  # evicts 1, the least frequently used
+            calls = 0
+            function(0)
+            function(2)
+            function(3)
+            self.assertEqual(calls, 0)
+            function(1)
+            self.assertEqual(calls, 1)
+
+    def test_shared_dir(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function_a(a):
+                return b'a' * 1000
+
+            @memoize(dir_path=td)
+            def function_b(a):
+                return b'b' * 1000
+
+            for i in range(10):
+                function_a(i)
+                function_b(i)
+
+            self.assertEqual(len(function_dirs(Path(td))), 2)
+            result = evict(td, max_entries=5)
+            self.assertEqual(result.entries_left, 5)
+            self.assertEqual(len(_data_files(Path(td))), 5)
+
+    def test_wrong_policy(self):
+        with self.assertRaises(ValueError):
+            memoize(eviction='fifo', max_entries=1)(lambda: None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
 # SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
 # SPDX-License-Identifier: MIT
 
+import sys
 import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
 
+from filememo import memoize
 from filememo._dir_for_func import _file_and_method, _caller_not_filememo
 from filememo._indirect_caller import get_caller_indirect
 
@@ -64,3 +68,43 @@ class Test(unittest.TestCase):
             matroska1(),
             '/test_function_id.py/matroska1.<locals>'
             '.matroska2.<locals>.matroska3')
+
+    def test_wrapped_in_other_module(self):
+        # @memoize @logged def compute() in two files, where `logged` is
+        # defined in a third one. The functions must not share the cache
+        deco_source = (
+            'import functools\n'
+            'def logged(function):\n'
+            '    @functools.wraps(function)\n'
+            '    def wrapper(*args):\n'
+            '        return function(*args)\n'
+            '    return wrapper\n')
+        with TemporaryDirectory() as td:
+            files = {'deco_mod': deco_source}
+            for name in ('mod_a', 'mod_b'):
+                files[name] = (
+                    'from deco_mod import logged\n'
+                    'def compute(x):\n'
+                    f'    return {name!r}\n')
+            for name, source in files.items():
+                (Path(td) / f'{name}.py').write_text(source)
+
+            sys.path.insert(0, td)
+            try:
+                import mod_a
+                import mod_b
+                import deco_mod
+            finally:
+                sys.path.remove(td)
+                for name in files:
+                    sys.modules.pop(name, None)
+
+            self.assertEnds(_file_and_method(deco_mod.logged(mod_a.compute)),
+                            '/mod_a.py/compute')
+
+            cache_dir = Path(td) / 'cache'
+            a = memoize(deco_mod.logged(mod_a.compute), dir_path=cache_dir)
+            b = memoize(deco_mod.logged(mod_b.compute), dir_path=cache_dir)
+            self.assertEqual(a(1), 'mod_a')
+            self.assertEqual(b(1), 'mod_b')
+            self.assertNotEqual(a.data.dirpath, b.data.dirpath)
@@ -0,0 +1,231 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import pickle
+import sys
+import threading
+import time
+import types
+import unittest
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from pickledir import PickleDir
+
+from filememo import memoize, gc, start_gc
+from filememo._evict import function_dirs
+from filememo._sidecar import SIDECARS_DIRNAME
+
+
+def _data_files(dir_path: Path):
+    return [p for func_dir in function_dirs(dir_path)
+            for p in func_dir.iterdir()
+            if PickleDir._is_data_basename(p.name)]
+
+
+def _records_count(dir_path: Path) -> int:
+    # all the records in the files, including the expired ones
+    count = 0
+    for path in _data_files(dir_path):
+        with path.open('rb') as f:
+            count += len(pickle.load(f)[2])
+    return count
+
+
+@contextmanager
+def unknown_module():
+    # the results of the class that cannot be imported after the exit, as
+    # in the other process that runs the collector
+    name = 'filememo_test_results'
+    module = types.ModuleType(name)
+    exec('class Result:\n'
+         '    def __init__(self, a):\n'
+         '        self.a = a\n', module.__dict__)
+    sys.modules[name] = module
+    try:
+        yield module.Result
+    finally:
+        del sys.modules[name]
+
+
+class TestGc(unittest.TestCase):
+
+    def test_expired(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, max_age=timedelta(seconds=0.2))
+            def short(a):
+                return a
+
+            @memoize(dir_path=td)
+            def long(a):
+                return a
+
+            for i in range(20):
+                short(i)
+                long(i)
+            time.sleep(0.3)
+
+            result = gc(td)
+            self.assertEqual(result.functions, 2)
+            self.assertEqual(result.records_removed, 20)
+            self.assertGreaterEqual(result.files_removed, 1)
+            self.assertGreater(result.bytes_reclaimed, 0)
+            self.assertEqual(_data_files(short.data.dirpath), [])
+            self.assertEqual(_records_count(long.data.dirpath), 20)
+
+            # nothing left to collect
+            self.assertEqual(gc(td).records_removed, 0)
+
+    def test_old_version(self):
+        with TemporaryDirectory() as td:
+            def create(version):
+                @memoize(dir_path=td, version=version)
+                def function(a):
+                    return a * version
+
+                return function
+
+            first = create(1)
+            for i in range(10):
+                first(i)
+            second = create(2)
+            second(100)
+
+            result = gc(td)
+            self.assertEqual(result.records_removed, 10)
+            self.assertEqual(_records_count(Path(td)), 1)
+            self.assertEqual(second(100), 200)
+
+    def test_without_version_marker(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function(a):
+                return a
+
+            function(1)
+            (function.data.dirpath / 'version.txt').unlink()
+            # we do not know which version is current, so the records of
+            # any version are kept
+            self.assertEqual(gc(td).records_removed, 0)
+            self.assertEqual(_records_count(Path(td)), 1)
+
+    def test_orphan_sidecars(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, mmap=True, max_age=timedelta(seconds=0.2))
+            def short(a):
+                return bytes(1000) + bytes([a])
+
+            short(1)
+            sidecars = short.data.dirpath / SIDECARS_DIRNAME
+            self.assertEqual(len(list(sidecars.iterdir())), 1)
+
+            # the sidecars are not removed while they are new
+            time.sleep(0.3)
+            gc(td)
+            self.assertEqual(len(list(sidecars.iterdir())), 1)
+
+            gc(td, grace=timedelta(0))
+            self.assertEqual(list(sidecars.iterdir()), [])
+
+    def test_referenced_sidecars_kept(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, mmap=True)
+            def function(a):
+                return bytes(1000) + bytes([a])
+
+            function(1)
+            gc(td, grace=timedelta(0))
+            sidecars = function.data.dirpath / SIDECARS_DIRNAME
+            self.assertEqual(len(list(sidecars.iterdir())), 1)
+
+    def test_unknown_result_classes(self):
+        with TemporaryDirectory() as td:
+            with unknown_module() as result_class:
+                @memoize(dir_path=td, max_age=timedelta(seconds=0.2))
+                def short(a):
+                    return result_class(a)
+
+                @memoize(dir_path=td)
+                def long(a):
+                    return result_class(a)
+
+                for i in range(20):
+                    short(i)
+                    long(i)
+            time.sleep(0.3)
+
+            result = gc(td)
+            self.assertEqual(result.records_removed, 20)
+            self.assertEqual(_data_files(short.data.dirpath), [])
+            with unknown_module():
+                self.assertEqual(_records_count(long.data.dirpath), 20)
+
+    def test_sqlite(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, backend='sqlite',
+                     max_age=timedelta(seconds=0.2))
+            def function(a):
+                return a
+
+            for i in range(10):
+                function(i)
+            time.sleep(0.3)
+            function(100)
+
+            self.assertEqual(gc(td).records_removed, 10)
+            self.assertEqual(function.data.stats().entries, 1)
+
+    def test_while_writing(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, max_age=timedelta(seconds=0.05))
+            def function(a):
+                return a * 2
+
+            stop = threading.Event()
+            errors = []
+
+            def work():
+                try:
+                    while not stop.is_set():
+                        for i in range(50):
+                            self.assertEqual(function(i), i * 2)
+                except BaseException as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            try:
+                for _ in range(20):
+                    gc(td)
+                    time.sleep(0.01)
+            finally:
+                stop.set()
+                for thread in threads:
+                    thread.join()
+            self.assertEqual(errors, [])
+
+    def test_background(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, max_age=timedelta(seconds=0.1))
+            def function(a):
+                return a
+
+            function(1)
+            time.sleep(0.2)
+            thread = start_gc(td, interval=timedelta(seconds=0.05))
+            try:
+                deadline = time.monotonic() + 5
+                while _data_files(Path(td)) and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                self.assertEqual(_data_files(Path(td)), [])
+                self.assertIsNotNone(thread.last_result)
+            finally:
+                thread.stop()
+                thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
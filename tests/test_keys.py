@@ -0,0 +1,235 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import importlib.util
+import pickle
+import unittest
+from dataclasses import dataclass
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from filememo import memoize, fingerprint, register_key, \
+    FunctionException
+from filememo._keys import args_fingerprint
+
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+
+@dataclass
+class Point:
+    x: int
+    y: int
+
+
+class Opaque:
+    def __init__(self, value):
+        self.value = value
+
+
+class Named:
+    def __init__(self, name, payload):
+        self.name = name
+        self.payload = payload
+
+
+register_key(Named, lambda obj: obj.name)
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_dict_order(self):
+        a = {'x': 1, 'y': [1, 2, {'z': 3, 'w': 4}]}
+        b = {'y': [1, 2, {'w': 4, 'z': 3}], 'x': 1}
+        self.assertEqual(fingerprint(a), fingerprint(b))
+        self.assertNotEqual(fingerprint(a), fingerprint({'x': 1}))
+
+    def test_sets(self):
+        self.assertEqual(fingerprint({'a', 'b', 'c'}),
+                         fingerprint({'c', 'b', 'a'}))
+        # they are equal in Python
+        self.assertEqual(fingerprint({1}), fingerprint(frozenset({1})))
+
+    def test_types_differ(self):
+        values = [1, 1.0, True, '1', b'1', (1,), [1], None, 0, False, '',
+                  b'', (), [], {}]
+        digests = {fingerprint(v) for v in values}
+        self.assertEqual(len(digests), len(values))
+
+    def test_nested_not_ambiguous(self):
+        self.assertNotEqual(fingerprint(('ab', 'c')), fingerprint(('a', 'bc')))
+        self.assertNotEqual(fingerprint([[1], 2]), fingerprint([1, [2]]))
+
+    def test_numbers_fast_path(self):
+        self.assertEqual(fingerprint(list(range(1000))),
+                         fingerprint(list(range(1000))))
+        self.assertNotEqual(fingerprint([1, 2]), fingerprint([1, 2.0]))
+        self.assertNotEqual(fingerprint([1, 2]), fingerprint((1, 2)))
+
+    def test_stable(self):
+        # the digests must not change between versions and platforms,
+        # otherwise the cached results will be lost
+        self.assertEqual(fingerprint(('abc', 1, None, {'k': [1.5]})).hex(),
+                         'ff09c3df1b34f9cd5afbabf5d580b451')
+        self.assertEqual(len(fingerprint('x')), 16)
+
+    def test_dataclass(self):
+        self.assertEqual(fingerprint(Point(1, 2)), fingerprint(Point(1, 2)))
+        self.assertNotEqual(fingerprint(Point(1, 2)),
+                            fingerprint(Point(2, 1)))
+
+    def test_pickled_fallback(self):
+        self.assertEqual(fingerprint(Path('/a/b')), fingerprint(Path('/a/b')))
+
+    def test_registered(self):
+        self.assertEqual(fingerprint(Named('a', 1)),
+                         fingerprint(Named('a', 2)))
+        self.assertNotEqual(fingerprint(Named('a', 1)),
+                            fingerprint(Named('b', 1)))
+        # and not equal to the name itself
+        self.assertNotEqual(fingerprint(Named('a', 1)), fingerprint('a'))
+
+    def test_kwargs_order_matters(self):
+        self.assertNotEqual(args_fingerprint((), {'a': 1, 'b': 2}),
+                            args_fingerprint((), {'b': 2, 'a': 1}))
+        self.assertNotEqual(args_fingerprint((1,), {}),
+                            args_fingerprint((), {'a': 1}))
+
+    def test_identity_does_not_matter(self):
+        # pickle stores the second reference to the same string as a link
+        # to the first one, but the key must depend on the values only
+        x = ''.join(['ab', 'c'])
+        y = ''.join(['a', 'bc'])
+        self.assertIsNot(x, y)
+        self.assertEqual(args_fingerprint((x, x), {}),
+                         args_fingerprint((x, y), {}))
+        self.assertEqual(fingerprint([x, x]), fingerprint([x, y]))
+
+    def test_large_ints(self):
+        large = 10 ** 5000
+        self.assertEqual(fingerprint(large), fingerprint(10 ** 5000))
+        self.assertNotEqual(fingerprint(large), fingerprint(large + 1))
+        self.assertNotEqual(fingerprint(large), fingerprint(-large))
+        self.assertNotEqual(fingerprint(2 ** 2048), fingerprint(2 ** 2047))
+        self.assertEqual(fingerprint([large, 'a', Opaque(1)]),
+                         fingerprint([10 ** 5000, 'a', Opaque(1)]))
+
+    def test_large_bytes_not_pickled(self):
+        data = b'x' * 10_000_000
+        with patch.object(pickle, 'dumps') as dumps:
+            fingerprint(data)
+            fingerprint([data, {'k': data}])
+            dumps.assert_not_called()
+
+    @unittest.skipUnless(HAS_NUMPY, 'numpy is not installed')
+    def test_ndarray(self):
+        import numpy as np
+        a = np.arange(12).reshape((3, 4))
+        self.assertEqual(fingerprint(a), fingerprint(a.copy()))
+        self.assertEqual(fingerprint(a.T), fingerprint(a.T.copy()))
+        self.assertNotEqual(fingerprint(a), fingerprint(a.reshape((4, 3))))
+        self.assertNotEqual(fingerprint(a), fingerprint(a.astype(np.int8)))
+
+
+class TestKeyArgument(unittest.TestCase):
+
+    def test_equal_dicts(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td)
+            def function(d):
+                nonlocal calls
+                calls += 1
+                return sorted(d)
+
+            function({'a': 1, 'b': 2})
+            function({'b': 2, 'a': 1})
+            self.assertEqual(calls, 1)
+
+    def test_key_function(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, key=lambda url, session: url)
+            def download(url, session):
+                nonlocal calls
+                calls += 1
+                return url.upper()
+
+            self.assertEqual(download('a', session=object()), 'A')
+            self.assertEqual(download('a', session=object()), 'A')
+            self.assertEqual(calls, 1)
+            self.assertEqual(download('b', object()), 'B')
+            self.assertEqual(calls, 2)
+
+    def test_opaque_args(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td)
+            def function(o):
+                nonlocal calls
+                calls += 1
+                return o.value
+
+            self.assertEqual(function(Opaque(5)), 5)
+            self.assertEqual(function(Opaque(5)), 5)
+            self.assertEqual(calls, 1)
+
+
+class TestNormalizeArgs(unittest.TestCase):
+
+    def test_call_styles_share_entry(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, normalize_args=True)
+            def function(a, b=2, *, c=3, **other):
+                nonlocal calls
+                calls += 1
+                return a + b + c + sum(other.values())
+
+            self.assertEqual(function(1, b=2), 6)
+            self.assertEqual(function(a=1, b=2), 6)
+            self.assertEqual(function(b=2, a=1), 6)
+            self.assertEqual(function(1), 6)
+            self.assertEqual(function(1, 2, c=3), 6)
+            self.assertEqual(calls, 1)
+
+            self.assertEqual(function(1, x=1, y=2), 9)
+            self.assertEqual(function(1, y=2, x=1), 9)
+            self.assertEqual(calls, 2)
+
+            self.assertEqual(function(1, 3), 7)
+            self.assertEqual(calls, 3)
+
+    def test_disabled_by_default(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td)
+            def function(a, b=2):
+                nonlocal calls
+                calls += 1
+                return a + b
+
+            function(1)
+            function(1, 2)
+            function(a=1, b=2)
+            self.assertEqual(calls, 3)
+
+    def test_wrong_arguments(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, normalize_args=True)
+            def function(a):
+                return a
+
+            # the error is raised by the function, like without normalizing
+            with self.assertRaises(FunctionException) as cm:
+                function(1, 2)
+            self.assertIsInstance(cm.exception.inner, TypeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
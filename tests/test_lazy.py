@@ -0,0 +1,61 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import inspect
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from filememo import memoize
+
+
+class TestLazyDecoration(unittest.TestCase):
+
+    def test_no_stack_inspection(self):
+        with TemporaryDirectory() as td:
+            with patch.object(inspect, 'stack') as stack:
+                @memoize(dir_path=td)
+                def function():
+                    return 1
+
+                self.assertEqual(function(), 1)
+                stack.assert_not_called()
+
+    def test_no_file_system_until_called(self):
+        with TemporaryDirectory() as td:
+            cache_dir = Path(td) / 'cache'
+
+            @memoize(dir_path=cache_dir)
+            def function():
+                return 1
+
+            self.assertFalse(cache_dir.exists())
+            self.assertEqual(function(), 1)
+            self.assertTrue(cache_dir.exists())
+
+    def test_same_dir_as_before(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function():
+                return 1
+
+            def function_2():
+                return 2
+
+            # the same name in the same file means the same function
+            function_2.__qualname__ = function.__qualname__
+            function()
+            self.assertEqual(memoize(dir_path=td)(function_2)(), 1)
+
+    def test_callable_object(self):
+        class Callable:
+            def __call__(self, x):
+                return x
+
+        with TemporaryDirectory() as td:
+            self.assertEqual(memoize(dir_path=td)(Callable())(5), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
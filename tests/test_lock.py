@@ -0,0 +1,152 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from filememo import memoize, LockTimeout
+from filememo._lock import FileLock
+
+
+class TestFileLock(unittest.TestCase):
+
+    def test_exclusive(self):
+        with TemporaryDirectory() as td:
+            path = Path(td) / 'sub' / 'x.lock'
+            with FileLock(path):
+                self.assertTrue(path.exists())
+                with self.assertRaises(LockTimeout):
+                    FileLock(path, timeout=0.1).acquire()
+            self.assertFalse(path.exists())
+            with FileLock(path, timeout=0.1):
+                pass
+
+    def test_stale(self):
+        with TemporaryDirectory() as td:
+            path = Path(td) / 'x.lock'
+            path.write_text('crashed process')
+            old = time.time() - 60
+            os.utime(str(path), (old, old))
+            # the lock was not updated for a minute
+            with FileLock(path, timeout=1, stale_after=10):
+                pass
+
+    def test_stale_removed_by_other_waiter(self):
+        # Two waiters saw the same stale lock. The first one removed it
+        # and created its own lock while the second one was waiting for
+        # the guard. The fresh lock must survive
+        with TemporaryDirectory() as td:
+            path = Path(td) / 'x.lock'
+            path.write_text('crashed process')
+            old = time.time() - 60
+            os.utime(str(path), (old, old))
+
+            first = FileLock(path, timeout=1, stale_after=10)
+            second = FileLock(path, stale_after=10)
+            guard = second._guard
+
+            @contextmanager
+            def guard_after_first():
+                first.acquire()
+                with guard():
+                    yield
+
+            with mock.patch.object(second, '_guard', guard_after_first):
+                second._remove_if_stale()
+            try:
+                self.assertTrue(first._is_own())
+                self.assertEqual(os.listdir(td), ['x.lock'])
+                with self.assertRaises(LockTimeout):
+                    FileLock(path, timeout=0.1, stale_after=10).acquire()
+            finally:
+                first.release()
+
+    def test_stalled_holder_keeps_new_lock(self):
+        # The holder stalled for longer than stale_after, and its lock was
+        # taken over. Then it resumed: it must not touch or remove the lock
+        # of the new holder
+        with TemporaryDirectory() as td:
+            path = Path(td) / 'x.lock'
+            stalled = FileLock(path, stale_after=0.1)
+            with mock.patch.object(stalled, '_start_heartbeat'):
+                stalled.acquire()
+            old = time.time() - 60
+            os.utime(str(path), (old, old))
+            new_holder = FileLock(path, timeout=1, stale_after=10)
+            new_holder.acquire()
+            os.utime(str(path), (old, old))
+
+            stalled._heartbeat(threading.Event())
+            self.assertEqual(os.stat(str(path)).st_mtime, old)
+            stalled._stop_heartbeat = threading.Event()
+            stalled.release()
+
+            self.assertTrue(new_holder._is_own())
+            new_holder.release()
+            self.assertEqual(os.listdir(td), [])
+
+    def test_stale_guard(self):
+        with TemporaryDirectory() as td:
+            path = Path(td) / 'x.lock'
+            guard = Path(td) / 'x.lock.guard'
+            guard.write_bytes(b'')
+            old = time.time() - 60
+            os.utime(str(guard), (old, old))
+            # the guard was left by a process crashed while holding it
+            with FileLock(path, timeout=1, stale_after=10):
+                pass
+            self.assertEqual(os.listdir(td), [])
+
+    def test_heartbeat_keeps_lock_alive(self):
+        with TemporaryDirectory() as td:
+            path = Path(td) / 'x.lock'
+            with FileLock(path, stale_after=0.2):
+                time.sleep(0.6)
+                with self.assertRaises(LockTimeout):
+                    FileLock(path, timeout=0.3, stale_after=0.2).acquire()
+
+
+class TestLockedMemoize(unittest.TestCase):
+
+    def test_single_process(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, lock=True,
+                     lock_timeout=timedelta(seconds=5))
+            def function(a):
+                nonlocal calls
+                calls += 1
+                return a
+
+            self.assertEqual(function(1), 1)
+            self.assertEqual(function(1), 1)
+            self.assertEqual(calls, 1)
+            # locks are removed after computing
+            self.assertEqual(
+                list((function.data.dirpath / 'locks').iterdir()), [])
+
+    def test_processes_compute_once(self):
+        with TemporaryDirectory() as td:
+            calls_file = Path(td) / 'calls.txt'
+            processes = [
+                subprocess.Popen((sys.executable, '-m',
+                                  'tests.concurrency.run_me_locked',
+                                  str(Path(td) / 'cache'), str(calls_file)))
+                for _ in range(4)]
+            for p in processes:
+                self.assertEqual(p.wait(), 0)
+            self.assertEqual(calls_file.read_text(), 'call\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import os
+import shutil
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from tempfile import TemporaryDirectory
+
+from filememo import memoize, FunctionException
+from .concurrency.mapped import square_with_pid, cube_with_pid, cache_dir
+
+
+class TestMap(unittest.TestCase):
+
+    def test_without_executor(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td)
+            def function(a, b):
+                nonlocal calls
+                calls += 1
+                return a + b
+
+            self.assertEqual(list(function.map([1, 2, 3], [10, 20, 30])),
+                             [11, 22, 33])
+            self.assertEqual(list(function.map([1, 2, 3], [10, 20, 30])),
+                             [11, 22, 33])
+            self.assertEqual(calls, 3)
+
+    def test_only_misses_computed(self):
+        with TemporaryDirectory() as td:
+            computed = []
+
+            @memoize(dir_path=td)
+            def function(a):
+                computed.append(a)
+                return a * 2
+
+            function(1)
+            function(3)
+            computed.clear()
+            with ThreadPoolExecutor(4) as executor:
+                self.assertEqual(
+                    list(function.map(range(5), executor=executor)),
+                    [0, 2, 4, 6, 8])
+            self.assertEqual(sorted(computed), [0, 2, 4])
+
+    def test_duplicates_computed_once(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td)
+            def function(a):
+                nonlocal calls
+                calls += 1
+                time.sleep(0.1)
+                return a
+
+            with ThreadPoolExecutor(4) as executor:
+                self.assertEqual(
+                    list(function.map([7] * 4, executor=executor)), [7] * 4)
+            self.assertEqual(calls, 1)
+
+    def test_unordered(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function(a):
+                time.sleep(a)
+                return a
+
+            function(0.3)
+            with ThreadPoolExecutor(4) as executor:
+                results = list(function.map([0.5, 0.3, 0.1],
+                                            executor=executor,
+                                            ordered=False))
+            # the cached one goes first, then in order of completion
+            self.assertEqual(results, [0.3, 0.1, 0.5])
+
+    def test_exception(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def inverse(a):
+                return 1 / a
+
+            with ThreadPoolExecutor(2) as executor:
+                results = inverse.map([1, 0], executor=executor)
+                self.assertEqual(next(results), 1)
+                with self.assertRaises(FunctionException):
+                    next(results)
+
+    def test_process_pool(self):
+        if cache_dir.exists():
+            shutil.rmtree(cache_dir)
+
+        with ProcessPoolExecutor(2) as executor:
+            results = list(square_with_pid.map(range(6), executor=executor))
+
+        self.assertEqual([square for square, _ in results],
+                         [0, 1, 4, 9, 16, 25])
+        pids = [pid for _, pid in results]
+        self.assertNotIn(os.getpid(), pids)
+
+        # the workers saved the results to the same cache
+        self.assertEqual(list(square_with_pid.map(range(6))), results)
+
+    def test_get_many_process_pool(self):
+        if cache_dir.exists():
+            shutil.rmtree(cache_dir)
+
+        args_list = [(x,) for x in range(4)]
+        with ProcessPoolExecutor(2) as executor:
+            result = cube_with_pid.get_many(args_list, executor=executor)
+
+        self.assertEqual([result.hits[i][0] for i in range(4)],
+                         [0, 1, 8, 27])
+        self.assertNotIn(os.getpid(), [pid for _, pid in
+                                       result.hits.values()])
+        self.assertEqual(cube_with_pid.get_many(args_list).hits,
+                         result.hits)
+
+
+if __name__ == "__main__":
+    unittest.main()
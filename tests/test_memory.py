@@ -0,0 +1,178 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import time
+import unittest
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from pickledir import PickleDir
+from pickledir._pickledir import Record
+
+from filememo import memoize, FunctionException
+from filememo._memory import MemoryCache
+
+
+class TestMemoryCache(unittest.TestCase):
+
+    def test_lru_items(self):
+        mc = MemoryCache(max_items=2)
+        mc.put('a', 'A')
+        mc.put('b', 'B')
+        self.assertEqual(mc.get('a'), 'A')  # 'a' is now the most recent
+        mc.put('c', 'C')
+        self.assertEqual(len(mc), 2)
+        self.assertIsNone(mc.get('b'))
+        self.assertEqual(mc.get('a'), 'A')
+        self.assertEqual(mc.get('c'), 'C')
+
+    def test_bytes(self):
+        mc = MemoryCache(max_bytes=1000)
+        mc.put(1, Record(None, None, b'x' * 400))
+        mc.put(2, Record(None, None, b'x' * 400))
+        mc.put(3, Record(None, None, b'x' * 400))
+        self.assertLessEqual(mc.total_bytes, 1000)
+        self.assertIsNone(mc.get(1))
+        self.assertIsNotNone(mc.get(3))
+
+        # too large to be stored at all
+        mc.put(4, Record(None, None, b'x' * 2000))
+        self.assertIsNone(mc.get(4))
+
+    def test_buffers_not_pickled(self):
+        mc = MemoryCache(max_bytes=10000)
+        with patch('filememo._memory.pickle.dumps') as dumps:
+            mc.put(1, Record(None, None, (None, b'x' * 400)))
+            mc.put(2, Record(None, None, (None, memoryview(b'x' * 400))))
+            mc.put(3, Record(None, None, (None, 'x' * 400)))
+        dumps.assert_not_called()
+        self.assertEqual(mc.total_bytes, 1200)
+
+        mc.put(4, Record(None, None, (None, {'a': 1})))
+        self.assertGreater(mc.total_bytes, 1200)
+
+
+class TestMemoryTier(unittest.TestCase):
+
+    def test_hot_keys_do_not_touch_disk(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, memory_items=10)
+            def function(a, b):
+                nonlocal calls
+                calls += 1
+                return {'sum': a + b}
+
+            self.assertEqual(function(1, 2), {'sum': 3})
+            self.assertEqual(calls, 1)
+
+            with patch.object(PickleDir, '_get_record') as disk_read:
+                self.assertEqual(function(1, 2), {'sum': 3})
+                self.assertEqual(function(1, 2), {'sum': 3})
+                disk_read.assert_not_called()
+            self.assertEqual(calls, 1)
+
+    def test_unhashable_args(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, memory_items=10)
+            def function(items: list):
+                nonlocal calls
+                calls += 1
+                return sum(items)
+
+            self.assertEqual(function([1, 2, 3]), 6)
+            self.assertEqual(function([1, 2, 3]), 6)
+            self.assertEqual(calls, 1)
+
+    def test_loaded_from_disk(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            def function(a):
+                nonlocal calls
+                calls += 1
+                return a * 2
+
+            memoize(dir_path=td)(function)(5)
+            self.assertEqual(calls, 1)
+
+            cached = memoize(dir_path=td, memory_items=10)(function)
+            self.assertEqual(cached(5), 10)  # read from disk
+            with patch.object(PickleDir, '_get_record') as disk_read:
+                self.assertEqual(cached(5), 10)  # read from memory
+                disk_read.assert_not_called()
+            self.assertEqual(calls, 1)
+
+    def test_max_age(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, memory_items=10,
+                     max_age=timedelta(seconds=0.2))
+            def function(a):
+                nonlocal calls
+                calls += 1
+                return a
+
+            function(1)
+            function(1)
+            self.assertEqual(calls, 1)
+            time.sleep(0.5)
+            function(1)
+            self.assertEqual(calls, 2)
+
+    def test_exceptions(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, memory_items=10,
+                     exceptions_max_age=timedelta(seconds=0.2))
+            def divide(a, b):
+                nonlocal calls
+                calls += 1
+                return a / b
+
+            for _ in range(2):
+                with self.assertRaises(FunctionException) as cm:
+                    divide(1, 0)
+                self.assertIsInstance(cm.exception.inner, ZeroDivisionError)
+            self.assertEqual(calls, 1)
+
+            time.sleep(0.5)
+            with self.assertRaises(FunctionException):
+                divide(1, 0)
+            self.assertEqual(calls, 2)
+
+    def test_version(self):
+        with TemporaryDirectory() as td:
+            def function():
+                return 'v1'
+
+            self.assertEqual(
+                memoize(dir_path=td, version=1, memory_items=10)(function)(),
+                'v1')
+
+            def function():
+                return 'v2'
+
+            self.assertEqual(
+                memoize(dir_path=td, version=2, memory_items=10)(function)(),
+                'v2')
+
+    def test_lru_eviction(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, memory_items=2)
+            def function(a):
+                return a
+
+            for i in range(5):
+                function(i)
+            self.assertEqual(len(function.memory), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import importlib.util
+import shutil
+import time
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from filememo import memoize
+from filememo._sidecar import SIDECARS_DIRNAME
+
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+
+class TestMmap(unittest.TestCase):
+
+    def test_bytes(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, mmap=True)
+            def function(n):
+                nonlocal calls
+                calls += 1
+                return b'x' * n
+
+            self.assertEqual(function(100_000), b'x' * 100_000)
+            cached = function(100_000)
+            self.assertIsInstance(cached, memoryview)
+            self.assertTrue(cached.readonly)
+            self.assertEqual(bytes(cached), b'x' * 100_000)
+            self.assertEqual(bytes(function(0)), b'')
+            self.assertEqual(bytes(function(0)), b'')
+            self.assertEqual(calls, 2)
+
+            sidecars = list(function.data.dirpath.glob(
+                f'{SIDECARS_DIRNAME}/*.bin'))
+            self.assertEqual(sorted(p.stat().st_size for p in sidecars),
+                             [0, 100_000])
+
+    def test_other_results_as_usual(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, mmap=True)
+            def function():
+                return {'a': 1}
+
+            self.assertEqual(function(), {'a': 1})
+            self.assertEqual(function(), {'a': 1})
+            self.assertFalse((function.data.dirpath / SIDECARS_DIRNAME)
+                             .exists())
+
+    def test_removed_sidecar_is_miss(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, mmap=True)
+            def function():
+                nonlocal calls
+                calls += 1
+                return b'data'
+
+            function()
+            shutil.rmtree(function.data.dirpath / SIDECARS_DIRNAME)
+            self.assertEqual(bytes(function()), b'data')
+            self.assertEqual(calls, 2)
+
+    def test_damaged_sidecar_is_miss(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, mmap=True)
+            def function():
+                nonlocal calls
+                calls += 1
+                return b'data'
+
+            for size in (0, 2):
+                function()
+                (path,) = (function.data.dirpath / SIDECARS_DIRNAME).iterdir()
+                # as if the file was truncated by a crash
+                path.write_bytes(b'data'[:size])
+                self.assertEqual(bytes(function()), b'data')
+            self.assertEqual(calls, 3)
+
+    @unittest.skipUnless(HAS_NUMPY, 'numpy is not installed')
+    def test_damaged_array_is_miss(self):
+        import numpy as np
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, mmap=True)
+            def function():
+                return np.arange(1000)
+
+            function()
+            (path,) = (function.data.dirpath / SIDECARS_DIRNAME).iterdir()
+            for data in (b'', path.read_bytes()[:100]):
+                path.write_bytes(data)
+                self.assertTrue(np.array_equal(function(), np.arange(1000)))
+                (path,) = (function.data.dirpath
+                           / SIDECARS_DIRNAME).iterdir()
+
+    def test_replaced_sidecar_removed(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, mmap=True,
+                     max_age=timedelta(seconds=0.05))
+            def function(a):
+                return b'x' * a
+
+            for _ in range(5):
+                function(1000)
+                function(2000)
+                time.sleep(0.1)
+
+            sidecars = (function.data.dirpath / SIDECARS_DIRNAME).iterdir()
+            self.assertEqual(sorted(p.stat().st_size for p in sidecars),
+                             [1000, 2000])
+
+    @unittest.skipUnless(HAS_NUMPY, 'numpy is not installed')
+    def test_ndarray(self):
+        import numpy as np
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, mmap=True)
+            def function(shape):
+                nonlocal calls
+                calls += 1
+                return np.arange(np.prod(shape), dtype=np.float32) \
+                    .reshape(shape)
+
+            expected = np.arange(12, dtype=np.float32).reshape((3, 4))
+            self.assertTrue(np.array_equal(function((3, 4)), expected))
+
+            cached = function((3, 4))
+            self.assertIsInstance(cached, np.memmap)
+            self.assertEqual(cached.dtype, np.float32)
+            self.assertEqual(cached.shape, (3, 4))
+            self.assertFalse(cached.flags.writeable)
+            self.assertTrue(np.array_equal(cached, expected))
+
+            self.assertEqual(function((0,)).shape, (0,))
+            self.assertEqual(function((0,)).shape, (0,))
+            self.assertEqual(calls, 2)
+
+    @unittest.skipUnless(HAS_NUMPY, 'numpy is not installed')
+    def test_non_contiguous_and_structured(self):
+        import numpy as np
+        with TemporaryDirectory() as td:
+            structured = np.array([(1, 2.0), (3, 4.0)],
+                                  dtype=[('a', '<i4'), ('b', '<f8')])
+
+            @memoize(dir_path=td, mmap=True)
+            def function(kind):
+                if kind == 'transposed':
+                    return np.arange(6).reshape((2, 3)).T
+                return structured
+
+            for _ in range(2):
+                self.assertTrue(np.array_equal(
+                    function('transposed'), np.arange(6).reshape((2, 3)).T))
+                self.assertTrue(np.array_equal(function('structured'),
+                                               structured))
+
+    def test_counted_by_eviction(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, mmap=True, max_bytes=50_000)
+            def function(i):
+                return b'x' * 10_000
+
+            for i in range(20):
+                function(i)
+
+            size = sum(p.stat().st_size
+                       for p in Path(td).rglob(f'{SIDECARS_DIRNAME}/*.bin'))
+            self.assertLessEqual(size, 50_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
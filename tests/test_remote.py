@@ -0,0 +1,314 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict
+from unittest import mock
+
+from filememo import memoize, DirRemote, HttpRemote, FunctionException
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # the objects of all the servers, by the path
+    objects: Dict[str, bytes] = dict()
+
+    def do_GET(self):
+        data = self.objects.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_PUT(self):
+        length = int(self.headers['Content-Length'])
+        self.objects[self.path] = self.rfile.read(length)
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server:
+    def __enter__(self) -> str:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_port}/cache'
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def two_hosts(local_a, local_b, remote, **kwargs):
+    # the same function on two hosts: they have different local caches,
+    # but share the remote one
+    runs = []
+
+    def create(local):
+        @memoize(dir_path=local, remote=remote, **kwargs)
+        def function(a):
+            runs.append(a)
+            if a < 0:
+                raise ValueError
+            return a * 2
+
+        return function
+
+    return create(local_a), create(local_b), runs
+
+
+class TestDirRemote(unittest.TestCase):
+
+    def test_shared(self):
+        with TemporaryDirectory() as a, TemporaryDirectory() as b, \
+                TemporaryDirectory() as shared:
+            remote = DirRemote(shared, namespace='test')
+            on_a, on_b, runs = two_hosts(a, b, remote)
+
+            self.assertEqual(on_a(1), 2)
+            self.assertTrue(remote.flush(5))
+            self.assertEqual(remote.uploaded, 1)
+
+            self.assertEqual(on_b(1), 2)
+            self.assertEqual(on_b(1), 2)
+            self.assertEqual(runs, [1])
+            self.assertEqual(on_b.cache_stats().remote_hits, 1)
+            # the downloaded result is saved to the local cache
+            self.assertEqual(len(list(on_b.data.iterate())), 1)
+
+    def test_namespace_required(self):
+        with TemporaryDirectory() as shared:
+            for remote in (shared, Path(shared), 'http://localhost/cache'):
+                with self.assertRaises(TypeError):
+                    memoize(lambda: 1, remote=remote)
+            with self.assertRaises(TypeError):
+                DirRemote(shared)
+            with self.assertRaises(ValueError):
+                DirRemote(shared, namespace='')
+
+    def test_namespaces_not_shared(self):
+        with TemporaryDirectory() as a, TemporaryDirectory() as b, \
+                TemporaryDirectory() as shared:
+            on_a, _, runs = two_hosts(
+                a, b, DirRemote(shared, namespace='first'))
+            _, on_b, _ = two_hosts(
+                a, b, DirRemote(shared, namespace='second'))
+            on_a(1)
+            on_a.remote.flush()
+            on_b(1)
+            on_b.remote.flush()
+            self.assertEqual(on_b.cache_stats().remote_hits, 0)
+
+    def test_scripts_not_shared(self):
+        # two scripts run as __main__ with the functions of the same name
+        with TemporaryDirectory() as a, TemporaryDirectory() as b, \
+                TemporaryDirectory() as shared:
+            remote = DirRemote(shared, namespace='test')
+
+            def script(file_name, local, result):
+                namespace = {'__name__': '__main__', 'memoize': memoize,
+                             'remote': remote}
+                exec(compile(f'@memoize(dir_path={local!r}, remote=remote)\n'
+                             f'def compute(x):\n'
+                             f'    return {result!r}\n',
+                             f'/project/{file_name}', 'exec'), namespace)
+                return namespace['compute']
+
+            self.assertEqual(script('first.py', a, 'first')(1), 'first')
+            remote.flush()
+            self.assertEqual(script('second.py', b, 'second')(1), 'second')
+            remote.flush()
+
+    def test_signed(self):
+        with TemporaryDirectory() as a, TemporaryDirectory() as b, \
+                TemporaryDirectory() as c, TemporaryDirectory() as shared:
+            signed = DirRemote(shared, namespace='test', secret=b'key')
+            on_a, on_b, runs = two_hosts(a, b, signed)
+            on_a(1)
+            signed.flush()
+            self.assertEqual(on_b(1), 2)
+            self.assertEqual(runs, [1])
+
+            # the objects written without the secret are not trusted
+            unsigned = DirRemote(shared, namespace='test')
+            on_c, _, runs = two_hosts(c, b, unsigned)
+            on_c(2)
+            unsigned.flush()
+            on_b(2)
+            signed.flush()
+            self.assertEqual(on_b.cache_stats().remote_hits, 1)
+
+    def test_exceptions_not_shared(self):
+        with TemporaryDirectory() as a, TemporaryDirectory() as b, \
+                TemporaryDirectory() as shared:
+            remote = DirRemote(shared, namespace='test')
+            on_a, on_b, runs = two_hosts(a, b, remote)
+            for function in (on_a, on_b):
+                with self.assertRaises(FunctionException):
+                    function(-1)
+            remote.flush()
+            self.assertEqual(runs, [-1, -1])
+            self.assertEqual(list(Path(shared).iterdir()), [])
+
+    def test_outdated_not_used(self):
+        with TemporaryDirectory() as a, TemporaryDirectory() as b, \
+                TemporaryDirectory() as shared:
+            remote = DirRemote(shared, namespace='test')
+            on_a, on_b, runs = two_hosts(a, b, remote,
+                                         max_age=timedelta(seconds=0.2))
+            on_a(1)
+            remote.flush()
+            time.sleep(0.25)
+            on_b(1)
+            remote.flush()
+            self.assertEqual(runs, [1, 1])
+            self.assertEqual(on_b.cache_stats().remote_hits, 0)
+
+    def test_keeps_lifetime(self):
+        with TemporaryDirectory() as a, TemporaryDirectory() as b, \
+                TemporaryDirectory() as shared:
+            remote = DirRemote(shared, namespace='test')
+            on_a, on_b, runs = two_hosts(a, b, remote,
+                                         max_age=timedelta(days=1))
+            on_a(1)
+            remote.flush()
+            on_b(1)
+            ((_, record_a),) = on_a.data.iterate()
+            ((_, record_b),) = on_b.data.iterate()
+            # expires when the result computed on the other host does
+            self.assertAlmostEqual(record_a.expires.timestamp(),
+                                   record_b.expires.timestamp(), delta=0.01)
+
+    def test_other_version_not_used(self):
+        with TemporaryDirectory() as a, TemporaryDirectory() as b, \
+                TemporaryDirectory() as shared:
+            remote = DirRemote(shared, namespace='test')
+            on_a, _, runs = two_hosts(a, b, remote, version=1)
+            _, on_b, _ = two_hosts(a, b, remote, version=2)
+            on_a(1)
+            remote.flush()
+            on_b(1)
+            remote.flush()
+            self.assertEqual(on_b.cache_stats().remote_hits, 0)
+
+    def test_serializer(self):
+        with TemporaryDirectory() as a, TemporaryDirectory() as b, \
+                TemporaryDirectory() as shared:
+            remote = DirRemote(shared, namespace='test')
+            on_a, on_b, runs = two_hosts(a, b, remote, serializer='gzip')
+            on_a(1)
+            remote.flush()
+            self.assertEqual(on_b(1), 2)
+            self.assertEqual(runs, [1])
+
+    def test_get_many(self):
+        with TemporaryDirectory() as a, TemporaryDirectory() as b, \
+                TemporaryDirectory() as shared:
+            remote = DirRemote(shared, namespace='test')
+            on_a, on_b, runs = two_hosts(a, b, remote)
+            on_a(1)
+            remote.flush()
+            with ThreadPoolExecutor() as executor:
+                result = on_b.get_many([(1,), (2,)], executor=executor)
+            self.assertEqual(result.hits, {0: 2, 1: 4})
+            self.assertEqual(sorted(runs), [1, 2])
+            remote.flush()
+            self.assertEqual(remote.uploaded, 2)
+
+    def test_async(self):
+        with TemporaryDirectory() as a, TemporaryDirectory() as b, \
+                TemporaryDirectory() as shared:
+            remote = DirRemote(shared, namespace='test')
+            runs = []
+
+            def create(local):
+                @memoize(dir_path=local, remote=remote)
+                async def function(x):
+                    runs.append(x)
+                    return x * 2
+
+                return function
+
+            on_a, on_b = create(a), create(b)
+            self.assertEqual(asyncio.run(on_a(1)), 2)
+            remote.flush()
+            self.assertEqual(asyncio.run(on_b(1)), 2)
+            self.assertEqual(runs, [1])
+
+
+class TestHttpRemote(unittest.TestCase):
+
+    def test_shared(self):
+        with _Server() as url, TemporaryDirectory() as a, \
+                TemporaryDirectory() as b:
+            on_a, on_b, runs = two_hosts(
+                a, b, HttpRemote(url, namespace='test',
+                                 headers={'Authorization': 'Bearer token'}))
+
+            on_a(1)
+            on_a(2)
+            self.assertTrue(on_a.remote.flush(5))
+            self.assertEqual(on_a.remote.uploaded, 2)
+
+            self.assertEqual(on_b(1), 2)
+            self.assertEqual(on_b(3), 6)
+            self.assertEqual(runs, [1, 2, 3])
+            self.assertEqual(on_b.cache_stats().remote_hits, 1)
+
+    def test_unreachable(self):
+        with _Server() as url:
+            pass
+        with TemporaryDirectory() as a, TemporaryDirectory() as b:
+            on_a, on_b, runs = two_hosts(
+                a, b, HttpRemote(url, namespace='test', timeout=1))
+            self.assertEqual(on_a(1), 2)
+            self.assertEqual(on_a(1), 2)
+            self.assertTrue(on_a.remote.flush(5))
+            self.assertEqual(on_a.remote.upload_errors, 1)
+            self.assertEqual(runs, [1])
+
+    def test_max_pending(self):
+        with TemporaryDirectory() as shared:
+            remote = DirRemote(shared, namespace='test',
+                               max_pending=0)
+            remote.put_async('00aa', b'data')
+            self.assertEqual(remote.dropped, 1)
+            self.assertIsNone(remote.get('00aa'))
+
+    def test_exit_not_delayed(self):
+        with TemporaryDirectory() as shared:
+            release = threading.Event()
+
+            class SlowRemote(DirRemote):
+                def put(self, name, data):
+                    release.wait()
+
+            remote = SlowRemote(shared, namespace='test', exit_timeout=0.1)
+            with mock.patch('filememo._remote.atexit.register') as register:
+                remote.put_async('00aa', b'data')
+            (callback,), _ = register.call_args
+
+            started = time.monotonic()
+            callback()
+            self.assertLess(time.monotonic() - started, 2)
+            self.assertEqual(remote.uploaded, 0)
+            release.set()
+            self.assertTrue(remote.flush(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import importlib.util
+import pickle
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from filememo import memoize, Serializer, FunctionException
+from filememo._serial import get_serializer, decode, Encoded
+
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+sample = {'list': list(range(1000)), 'text': 'abc' * 1000,
+          'bytes': b'\0' * 1000}
+
+
+def _dir_size(path: str) -> int:
+    return sum(p.stat().st_size for p in Path(path).rglob('*') if p.is_file())
+
+
+class Reversed(Serializer):
+    name = 'test_reversed'
+
+    def dumps(self, obj):
+        return obj.encode()[::-1]
+
+    def loads(self, data):
+        return data[::-1].decode()
+
+
+class TestSerializers(unittest.TestCase):
+
+    def test_round_trip(self):
+        for name in ['pickle5', 'gzip', 'bz2', 'lzma']:
+            with self.subTest(name):
+                serializer = get_serializer(name)
+                encoded = serializer.encode(sample)
+                self.assertEqual(encoded.format, name)
+                self.assertEqual(decode(encoded), sample)
+
+    def test_pickle5_buffers(self):
+        s = get_serializer('pickle5')
+        data = bytearray(b'abc' * 1000)
+        dumped = s.dumps(['x', pickle.PickleBuffer(data), 'y'])
+        # the buffer is stored after the pickle stream, once
+        self.assertEqual(dumped.count(b'abc' * 1000), 1)
+        self.assertTrue(dumped.endswith(data))
+        self.assertEqual(s.loads(dumped), ['x', data, 'y'])
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            get_serializer('no-such-format')
+        with self.assertRaises(KeyError):
+            decode(Encoded('no-such-format', b''))
+
+    def test_memoize_compressed(self):
+        with TemporaryDirectory() as plain_dir, TemporaryDirectory() as gz_dir:
+            calls = 0
+
+            def function():
+                nonlocal calls
+                calls += 1
+                return sample
+
+            self.assertEqual(memoize(dir_path=plain_dir)(function)(), sample)
+            gz = memoize(dir_path=gz_dir, serializer='gzip')(function)
+            self.assertEqual(gz(), sample)
+            self.assertEqual(gz(), sample)
+            self.assertEqual(calls, 2)
+            self.assertLess(_dir_size(gz_dir), _dir_size(plain_dir) / 2)
+
+    def test_switching_format(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            def function(x):
+                nonlocal calls
+                calls += 1
+                return [x] * 100
+
+            memoize(dir_path=td, serializer='lzma')(function)(1)
+            memoize(dir_path=td, serializer='gzip')(function)(2)
+            memoize(dir_path=td)(function)(3)
+            self.assertEqual(calls, 3)
+
+            # every record is decoded by the format it was saved with
+            for serializer in ['pickle', 'gzip', 'bz2']:
+                cached = memoize(dir_path=td, serializer=serializer)(function)
+                self.assertEqual([cached(x) for x in (1, 2, 3)],
+                                 [[1] * 100, [2] * 100, [3] * 100])
+            self.assertEqual(calls, 3)
+
+    def test_custom(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, serializer=Reversed())
+            def function(x):
+                return 'hello ' + x
+
+            self.assertEqual(function('world'), 'hello world')
+            self.assertEqual(function('world'), 'hello world')
+
+    def test_exceptions(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, serializer='gzip')
+            def divide(a, b):
+                return a / b
+
+            for _ in range(2):
+                with self.assertRaises(FunctionException):
+                    divide(1, 0)
+
+    @unittest.skipUnless(HAS_NUMPY, 'numpy is not installed')
+    def test_npy(self):
+        import numpy as np
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, serializer='npy')
+            def function(x):
+                if x == 'array':
+                    return np.arange(1000, dtype=np.float32)
+                return {'not': 'array'}
+
+            for _ in range(2):
+                array = function('array')
+                self.assertEqual(array.dtype, np.float32)
+                self.assertTrue(np.array_equal(array, np.arange(1000)))
+                self.assertEqual(function('dict'), {'not': 'array'})
+
+
+if __name__ == "__main__":
+    unittest.main()
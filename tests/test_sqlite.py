@@ -0,0 +1,217 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import os
+import shutil
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from filememo import memoize, FunctionException
+from filememo._sqlite import SqliteBackend, DB_BASENAME
+from .concurrency.shared_sqlite import cube_with_pid, cache_dir
+
+
+class TestSqliteRecords(unittest.TestCase):
+
+    def test_set_get(self):
+        with TemporaryDirectory() as td:
+            sd = SqliteBackend(lambda: Path(td), version=1)
+            sd.set(b'a', 'A')
+            self.assertEqual(sd.get_record(b'a').data, 'A')
+            self.assertIsNone(sd.get_record(b'b'))
+            self.assertTrue((Path(td) / DB_BASENAME).exists())
+
+    def test_version(self):
+        with TemporaryDirectory() as td:
+            SqliteBackend(lambda: Path(td), version=1).set(b'a', 'A')
+            self.assertIsNone(
+                SqliteBackend(lambda: Path(td), version=2).get_record(b'a'))
+
+    def test_expired(self):
+        with TemporaryDirectory() as td:
+            sd = SqliteBackend(lambda: Path(td), version=1)
+            sd.set(b'a', 'A', max_age=timedelta(seconds=0.1))
+            sd.set(b'b', 'B')
+            self.assertEqual(sd.get_record(b'a').data, 'A')
+            time.sleep(0.2)
+            self.assertIsNone(sd.get_record(b'a'))
+            self.assertEqual(sd.purge(), 1)
+            self.assertEqual(sd.get_record(b'b').data, 'B')
+
+    def test_purge_uses_indexes(self):
+        with TemporaryDirectory() as td:
+            sd = SqliteBackend(lambda: Path(td), version=1)
+            conn = sd._connection()
+            statements = []
+            conn.set_trace_callback(statements.append)
+            sd.purge()
+            conn.set_trace_callback(None)
+            self.assertTrue(statements)
+            for statement in statements:
+                plan = conn.execute('EXPLAIN QUERY PLAN ' + statement)
+                self.assertFalse([row for row in plan
+                                  if row[-1].startswith('SCAN')], statement)
+
+    def test_many(self):
+        with TemporaryDirectory() as td:
+            sd = SqliteBackend(lambda: Path(td), version=1)
+            keys = [str(i).encode() for i in range(2000)]
+            sd.set_records([(key, key.decode(), None) for key in keys])
+            records = sd.get_records(keys + [b'x', keys[0]])
+            self.assertEqual([r.data for r in records[:2000]],
+                             [str(i) for i in range(2000)])
+            self.assertIsNone(records[2000])
+            self.assertEqual(records[2001].data, '0')
+
+    def test_delete_iterate_stats(self):
+        with TemporaryDirectory() as td:
+            sd = SqliteBackend(lambda: Path(td), version=1)
+            sd.set_records([(b'a', 'A', None), (b'b', 'B', None)])
+            sd.delete(b'a')
+            self.assertEqual([(key, record.data)
+                              for key, record in sd.iterate()], [(b'b', 'B')])
+            stats = sd.stats()
+            self.assertEqual(stats.entries, 1)
+            self.assertGreater(stats.bytes, 0)
+
+    def test_corrupted(self):
+        with TemporaryDirectory() as td:
+            sd = SqliteBackend(lambda: Path(td), version=1)
+            sd.set(b'a', 'A')
+            sd._connection().execute("UPDATE records SET data=x'0102'")
+            self.assertIsNone(sd.get_record(b'a'))
+
+
+class TestSqliteDecorator(unittest.TestCase):
+
+    def test_cached(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, backend='sqlite')
+            def function(a, b):
+                nonlocal calls
+                calls += 1
+                return a + b
+
+            self.assertEqual(function(1, 2), 3)
+            self.assertEqual(function(1, 2), 3)
+            self.assertEqual(function(2, 2), 4)
+            self.assertEqual(calls, 2)
+
+            # the files of PickleDir are not created
+            names = {p.name for p in function.data.dirpath.iterdir()}
+            self.assertIn(DB_BASENAME, names)
+            self.assertFalse(any(len(name) == 3 for name in names))
+
+    def test_persistent_and_versioned(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            def create(version):
+                @memoize(dir_path=td, backend='sqlite', version=version)
+                def function(a):
+                    nonlocal calls
+                    calls += 1
+                    return a * 2
+
+                return function
+
+            create(1)(5)
+            create(1)(5)
+            self.assertEqual(calls, 1)
+            create(2)(5)
+            self.assertEqual(calls, 2)
+
+    def test_exceptions(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, backend='sqlite',
+                     exceptions_max_age=timedelta(seconds=0.1))
+            def function(a):
+                nonlocal calls
+                calls += 1
+                raise ValueError(a)
+
+            for _ in range(2):
+                with self.assertRaises(FunctionException) as cm:
+                    function(1)
+                self.assertIsInstance(cm.exception.inner, ValueError)
+            self.assertEqual(calls, 1)
+
+            time.sleep(0.2)
+            with self.assertRaises(FunctionException):
+                function(1)
+            self.assertEqual(calls, 2)
+
+    def test_max_age(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, backend='sqlite',
+                     max_age=timedelta(seconds=0.1))
+            def function(a):
+                nonlocal calls
+                calls += 1
+                return a
+
+            function(1)
+            function(1)
+            self.assertEqual(calls, 1)
+            time.sleep(0.2)
+            function(1)
+            self.assertEqual(calls, 2)
+
+    def test_get_many(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, backend='sqlite')
+            def square(x):
+                return x * x
+
+            square(3)
+            result = square.get_many([(i,) for i in range(5)])
+            self.assertEqual(result.hits, {3: 9})
+            with ThreadPoolExecutor(2) as executor:
+                result = square.get_many([(i,) for i in range(5)],
+                                         executor=executor)
+            self.assertEqual(result.hits, {i: i * i for i in range(5)})
+            self.assertEqual(square.get_many([(4,)]).hits, {0: 16})
+
+    def test_threads(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, backend='sqlite')
+            def square(x):
+                return x * x
+
+            with ThreadPoolExecutor(8) as executor:
+                results = list(executor.map(square, list(range(200)) * 2))
+            self.assertEqual(results, [x * x for x in range(200)] * 2)
+
+    def test_processes(self):
+        if cache_dir.exists():
+            shutil.rmtree(cache_dir)
+
+        with ProcessPoolExecutor(2) as executor:
+            results = list(executor.map(cube_with_pid, range(100)))
+
+        self.assertEqual([cube for cube, _ in results],
+                         [x ** 3 for x in range(100)])
+        self.assertNotIn(os.getpid(), [pid for _, pid in results])
+
+        # the workers saved the results to the same database
+        self.assertEqual([cube_with_pid(x) for x in range(100)], results)
+
+    def test_size_limits_not_supported(self):
+        with self.assertRaises(ValueError):
+            memoize(lambda: None, backend='sqlite', max_bytes=1000)
+        with self.assertRaises(ValueError):
+            memoize(lambda: None, backend='unknown')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import threading
+import time
+import unittest
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+
+from filememo import memoize
+
+MAX_AGE = timedelta(seconds=0.3)
+WINDOW = timedelta(seconds=60)
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        time.sleep(0.01)
+
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+
+    def test_stale_returned_and_refreshed(self):
+        with TemporaryDirectory() as td:
+            runs = []
+
+            @memoize(dir_path=td, max_age=MAX_AGE,
+                     stale_while_revalidate=WINDOW)
+            def function(a):
+                runs.append(a)
+                return a * 10 + len(runs)
+
+            self.assertEqual(function(1), 11)
+            self.assertEqual(function(1), 11)
+            time.sleep(MAX_AGE.total_seconds() + 0.05)
+
+            # the stale value is returned right away
+            self.assertEqual(function(1), 11)
+            wait_for(lambda: len(runs) == 2)
+            wait_for(lambda: function(1) == 12)
+            self.assertEqual(runs, [1, 1])
+
+            stats = function.cache_stats()
+            self.assertEqual(stats.stale_hits, 1)
+
+    def test_single_refresh_per_key(self):
+        with TemporaryDirectory() as td:
+            runs = []
+            release = threading.Event()
+
+            @memoize(dir_path=td, max_age=MAX_AGE,
+                     stale_while_revalidate=WINDOW)
+            def function(a):
+                runs.append(a)
+                if len(runs) > 1:
+                    release.wait(5)
+                return len(runs)
+
+            function(1)
+            time.sleep(MAX_AGE.total_seconds() + 0.05)
+
+            started = time.monotonic()
+            for _ in range(20):
+                self.assertEqual(function(1), 1)
+            # the callers did not wait for the slow refresh
+            self.assertLess(time.monotonic() - started, 2)
+
+            release.set()
+            wait_for(lambda: function(1) == 2)
+            self.assertEqual(len(runs), 2)
+
+    def test_beyond_window_computed_in_foreground(self):
+        with TemporaryDirectory() as td:
+            runs = []
+
+            @memoize(dir_path=td, max_age=timedelta(seconds=0.1),
+                     stale_while_revalidate=timedelta(seconds=0.1))
+            def function(a):
+                runs.append(a)
+                return len(runs)
+
+            self.assertEqual(function(1), 1)
+            time.sleep(0.3)
+            self.assertEqual(function(1), 2)
+            self.assertEqual(function.cache_stats().stale_hits, 0)
+
+    def test_failed_refresh_keeps_stale(self):
+        with TemporaryDirectory() as td:
+            runs = []
+
+            @memoize(dir_path=td, max_age=MAX_AGE,
+                     stale_while_revalidate=WINDOW)
+            def function(a):
+                runs.append(a)
+                if len(runs) > 1:
+                    raise ValueError
+                return 'first'
+
+            function(1)
+            time.sleep(MAX_AGE.total_seconds() + 0.05)
+            self.assertEqual(function(1), 'first')
+            wait_for(lambda: len(runs) == 2)
+            # the exception was not cached, so the stale value is served,
+            # and the refresh is tried again
+            wait_for(lambda: len(runs) >= 3 or function(1) != 'first')
+            self.assertEqual(function(1), 'first')
+
+    def test_with_memory(self):
+        with TemporaryDirectory() as td:
+            runs = []
+
+            @memoize(dir_path=td, max_age=MAX_AGE, memory_items=10,
+                     stale_while_revalidate=WINDOW)
+            def function(a):
+                runs.append(a)
+                return len(runs)
+
+            function(1)
+            time.sleep(MAX_AGE.total_seconds() + 0.05)
+            self.assertEqual(function(1), 1)
+            wait_for(lambda: function(1) == 2)
+
+    def test_async(self):
+        with TemporaryDirectory() as td:
+            runs = []
+
+            @memoize(dir_path=td, max_age=MAX_AGE,
+                     stale_while_revalidate=WINDOW)
+            async def function(a):
+                runs.append(a)
+                await asyncio.sleep(0.01)
+                return len(runs)
+
+            async def main():
+                self.assertEqual(await function(1), 1)
+                await asyncio.sleep(MAX_AGE.total_seconds() + 0.05)
+                self.assertEqual(await function(1), 1)
+                for _ in range(100):
+                    if await function(1) == 2:
+                        break
+                    await asyncio.sleep(0.02)
+                self.assertEqual(await function(1), 2)
+                self.assertEqual(len(runs), 2)
+
+            asyncio.run(main())
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            memoize(lambda: 1, stale_while_revalidate=timedelta(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import time
+import unittest
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+
+from filememo import memoize, FunctionException, CacheEvent
+
+
+class TestCacheStats(unittest.TestCase):
+
+    def test_counters(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, exceptions_max_age=timedelta(days=1))
+            def function(a):
+                time.sleep(0.05)
+                if a < 0:
+                    raise ValueError
+                return a
+
+            function(1)
+            function(1)
+            function(2)
+            for _ in range(2):
+                with self.assertRaises(FunctionException):
+                    function(-1)
+
+            stats = function.cache_stats()
+            self.assertEqual(stats.hits, 2)
+            self.assertEqual(stats.exception_hits, 1)
+            self.assertEqual(stats.memory_hits, 0)
+            self.assertEqual(stats.misses, 3)
+            self.assertEqual(stats.expired, 0)
+            self.assertEqual(stats.computations, 3)
+            self.assertGreaterEqual(stats.compute_time, 0.15)
+            self.assertGreater(stats.read_time, 0)
+            self.assertGreater(stats.write_time, 0)
+            self.assertGreater(stats.bytes_read, 0)
+            self.assertGreater(stats.bytes_written, 0)
+
+    def test_memory(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, memory_items=10)
+            def function(a):
+                return a
+
+            function(1)
+            function(1)
+            stats = function.cache_stats()
+            self.assertEqual((stats.misses, stats.hits, stats.memory_hits),
+                             (1, 1, 1))
+
+    def test_expired(self):
+        with TemporaryDirectory() as td:
+            def create(max_age):
+                @memoize(dir_path=td, max_age=max_age)
+                def function(a):
+                    return a
+
+                return function
+
+            create(timedelta(days=1))(1)
+            time.sleep(0.2)
+            # the result is still on disk, but is too old for this decorator
+            function = create(timedelta(seconds=0.1))
+            function(1)
+            stats = function.cache_stats()
+            self.assertEqual((stats.expired, stats.misses, stats.hits),
+                             (1, 0, 0))
+
+    def test_get_many_and_map(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function(a):
+                return a
+
+            function(1)
+            function.get_many([(1,), (2,)])
+            list(function.map([1, 3]))
+
+            stats = function.cache_stats()
+            self.assertEqual(stats.hits, 2)
+            # one for the direct call, one for get_many, one for map
+            self.assertEqual(stats.misses, 3)
+
+    def test_async(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            async def function(a):
+                return a
+
+            async def main():
+                await function(1)
+                await function(1)
+
+            asyncio.run(main())
+            stats = function.cache_stats()
+            self.assertEqual((stats.hits, stats.misses, stats.computations),
+                             (1, 1, 1))
+
+
+class TestOnEvent(unittest.TestCase):
+
+    def test_events(self):
+        with TemporaryDirectory() as td:
+            events = []
+
+            @memoize(dir_path=td, on_event=events.append)
+            def function(a):
+                return a
+
+            function(5)
+            function(5)
+
+            kinds = [event.kind for event in events]
+            self.assertEqual(kinds, ['read', 'miss', 'read', 'call',
+                                     'computed', 'write', 'read', 'hit'])
+            call = events[kinds.index('call')]
+            self.assertEqual((call.args, call.kwargs), ((5,), {}))
+            self.assertTrue(all(isinstance(e, CacheEvent) for e in events))
+
+    def test_private_on_call_still_works(self):
+        with TemporaryDirectory() as td:
+            calls = []
+            events = []
+
+            @memoize(dir_path=td, on_event=events.append,
+                     _on_call=lambda *args, **kwargs: calls.append(args))
+            def function(a):
+                return a
+
+            function(1)
+            function(1)
+            self.assertEqual(calls, [(1,)])
+            self.assertIn('call', [event.kind for event in events])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+
+from filememo import memoize, FunctionException
+from filememo._inflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_same_key_once(self):
+        sf = SingleFlight()
+        calls = 0
+        started = threading.Event()
+
+        def slow():
+            nonlocal calls
+            calls += 1
+            started.set()
+            time.sleep(0.3)
+            return object()
+
+        with ThreadPoolExecutor(8) as pool:
+            futures = [pool.submit(sf.run, 'key', slow) for _ in range(8)]
+            results = [f.result() for f in futures]
+
+        self.assertEqual(calls, 1)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(len(sf), 0)
+
+    def test_exception_shared(self):
+        sf = SingleFlight()
+
+        def fail():
+            time.sleep(0.2)
+            raise ValueError
+
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(sf.run, 'key', fail) for _ in range(4)]
+            for f in futures:
+                with self.assertRaises(ValueError):
+                    f.result()
+        self.assertEqual(len(sf), 0)
+
+    def test_recursive(self):
+        sf = SingleFlight()
+        self.assertEqual(sf.run('key', lambda: sf.run('key', lambda: 5)), 5)
+
+
+class TestThreadedMemoize(unittest.TestCase):
+
+    def test_computed_once(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td)
+            def function(a):
+                nonlocal calls
+                calls += 1
+                time.sleep(0.3)
+                return a * 2
+
+            with ThreadPoolExecutor(8) as pool:
+                results = list(pool.map(function, [5] * 8))
+
+            self.assertEqual(results, [10] * 8)
+            self.assertEqual(calls, 1)
+
+    def test_uncached_exception_shared(self):
+        with TemporaryDirectory() as td:
+            calls = 0
+
+            @memoize(dir_path=td, exceptions_max_age=None)
+            def function(a):
+                nonlocal calls
+                calls += 1
+                time.sleep(0.3)
+                raise ValueError(a)
+
+            def call(a):
+                try:
+                    function(a)
+                except FunctionException as e:
+                    return e.inner
+
+            with ThreadPoolExecutor(8) as pool:
+                errors = list(pool.map(call, [5] * 8))
+
+            self.assertEqual(calls, 1)
+            self.assertTrue(all(e is errors[0] for e in errors))
+            self.assertIsInstance(errors[0], ValueError)
+
+            # the exception was not cached
+            call(5)
+            self.assertEqual(calls, 2)
+
+    def test_different_keys_in_parallel(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, max_age=timedelta(days=1))
+            def function(a):
+                time.sleep(0.3)
+                return a
+
+            t = time.monotonic()
+            with ThreadPoolExecutor(4) as pool:
+                self.assertEqual(list(pool.map(function, range(4))),
+                                 list(range(4)))
+            self.assertLess(time.monotonic() - t, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
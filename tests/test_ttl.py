@@ -0,0 +1,165 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+
+from filememo import memoize
+from .test_stale import wait_for
+
+SHORT = timedelta(seconds=0.2)
+
+
+def empty_briefly(result):
+    return SHORT if not result else None
+
+
+class TestTtl(unittest.TestCase):
+
+    def test_lifetime_depends_on_result(self):
+        for backend in ('pickledir', 'sqlite', 'memory'):
+            with self.subTest(backend=backend), TemporaryDirectory() as td:
+                runs = []
+
+                @memoize(dir_path=td, backend=backend, ttl=empty_briefly)
+                def find(a):
+                    runs.append(a)
+                    return [a] if a > 0 else []
+
+                self.assertEqual(find(0), [])
+                self.assertEqual(find(1), [1])
+                self.assertEqual(find(0), [])
+                self.assertEqual(runs, [0, 1])
+
+                time.sleep(SHORT.total_seconds() + 0.05)
+                # the empty result is outdated, the other one is not
+                self.assertEqual(find(0), [])
+                self.assertEqual(find(1), [1])
+                self.assertEqual(runs, [0, 1, 0])
+
+    def test_stored_with_lifetime(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, ttl=empty_briefly)
+            def find(a):
+                return None if a == 0 else a
+
+            find(0)
+            find(1)
+            records = {record.data[1]: record
+                       for _, record in find.data.iterate()}
+            self.assertEqual(records[None].expires
+                             - records[None].created, SHORT)
+            self.assertIsNone(records[1].expires)
+
+    def test_memory_tier(self):
+        with TemporaryDirectory() as td:
+            runs = []
+
+            @memoize(dir_path=td, memory_items=10, ttl=empty_briefly)
+            def find(a):
+                runs.append(a)
+                return None
+
+            find(1)
+            find(1)
+            self.assertEqual(runs, [1])
+            time.sleep(SHORT.total_seconds() + 0.05)
+            find(1)
+            self.assertEqual(runs, [1, 1])
+
+    def test_not_longer_than_max_age(self):
+        with TemporaryDirectory() as td:
+            runs = []
+
+            @memoize(dir_path=td, max_age=SHORT,
+                     ttl=lambda result: timedelta(days=1))
+            def function(a):
+                runs.append(a)
+                return a
+
+            function(1)
+            time.sleep(SHORT.total_seconds() + 0.05)
+            function(1)
+            self.assertEqual(runs, [1, 1])
+
+    def test_zero_is_not_stored(self):
+        with TemporaryDirectory() as td:
+            runs = []
+
+            @memoize(dir_path=td,
+                     ttl=lambda result: timedelta(0) if result is None
+                     else None)
+            def function(a):
+                runs.append(a)
+                return None if a == 0 else a
+
+            function(0)
+            function(0)
+            function(1)
+            function(1)
+            self.assertEqual(runs, [0, 0, 1])
+            self.assertEqual(len(list(function.data.iterate())), 1)
+
+    def test_exceptions_not_affected(self):
+        with TemporaryDirectory() as td:
+            runs = []
+            lifetimes = []
+
+            def ttl(result):
+                lifetimes.append(result)
+                return SHORT
+
+            @memoize(dir_path=td, ttl=ttl)
+            def function(a):
+                runs.append(a)
+                raise ValueError
+
+            for _ in range(2):
+                with self.assertRaises(BaseException):
+                    function(1)
+            time.sleep(SHORT.total_seconds() + 0.05)
+            with self.assertRaises(BaseException):
+                function(1)
+            # the exception is cached with exceptions_max_age
+            self.assertEqual(runs, [1])
+            self.assertEqual(lifetimes, [])
+
+    def test_stale_while_revalidate(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, max_age=timedelta(days=1),
+                     stale_while_revalidate=timedelta(seconds=60),
+                     ttl=empty_briefly)
+            def find(a):
+                return []
+
+            find(1)
+            (record,) = [record for _, record in find.data.iterate()]
+            self.assertEqual(record.expires - record.created,
+                             SHORT + timedelta(seconds=60))
+            time.sleep(SHORT.total_seconds() + 0.05)
+            # outdated by its own lifetime, so returned as stale
+            find(1)
+            self.assertEqual(find.cache_stats().stale_hits, 1)
+            # the refresh writes to the directory, so it must finish
+            # before the directory is removed
+            wait_for(lambda: not any(thread.name == 'filememo-revalidate'
+                                     for thread in threading.enumerate()))
+
+    def test_get_many(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td, ttl=empty_briefly)
+            def find(a):
+                return [a] if a > 0 else []
+
+            with ThreadPoolExecutor() as executor:
+                find.get_many([(0,), (1,)], executor=executor)
+            time.sleep(SHORT.total_seconds() + 0.05)
+            self.assertEqual(find.get_many([(0,), (1,)]).misses, [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
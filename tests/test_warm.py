@@ -0,0 +1,141 @@
+# SPDX-FileCopyrightText: (c) 2022 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from filememo import memoize
+from .concurrency.warmed import power, cache_dir
+
+
+class TestWarm(unittest.TestCase):
+
+    def test_warm(self):
+        with TemporaryDirectory() as td:
+            calls = []
+
+            @memoize(dir_path=td)
+            def function(a, b):
+                calls.append((a, b))
+                return a + b
+
+            function(1, 1)
+            counts = function.warm((i, i) for i in range(10))
+            self.assertEqual((counts.cached, counts.computed, counts.failed),
+                             (1, 9, 0))
+            self.assertEqual(counts.done, 10)
+            self.assertEqual(len(calls), 10)
+
+            # all the results are cached now
+            calls.clear()
+            self.assertEqual([function(i, i) for i in range(10)],
+                             [i * 2 for i in range(10)])
+            self.assertEqual(calls, [])
+            # warming itself is not counted as the lookups
+            self.assertEqual(function.cache_stats().hits, 10)
+
+    def test_resume(self):
+        with TemporaryDirectory() as td:
+            calls = []
+
+            @memoize(dir_path=td)
+            def function(a):
+                if a == 5 and not calls:
+                    calls.append(a)
+                    raise KeyboardInterrupt
+                return a
+
+            with self.assertRaises(KeyboardInterrupt):
+                function.warm((i,) for i in range(10))
+            counts = function.warm((i,) for i in range(10))
+            # the results computed before the interruption are kept
+            self.assertGreaterEqual(counts.cached, 5)
+            self.assertEqual(counts.cached + counts.computed, 10)
+
+    def test_failed(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function(a):
+                if a < 0:
+                    raise ValueError
+                return a
+
+            counts = function.warm([(1,), (-1,), (2,)])
+            self.assertEqual((counts.computed, counts.failed), (2, 1))
+
+    def test_workers_limit(self):
+        with TemporaryDirectory() as td:
+            running = 0
+            max_running = 0
+            lock = threading.Lock()
+
+            @memoize(dir_path=td)
+            def function(a):
+                nonlocal running, max_running
+                with lock:
+                    running += 1
+                    max_running = max(max_running, running)
+                time.sleep(0.02)
+                with lock:
+                    running -= 1
+                return a
+
+            function.warm(((i,) for i in range(30)), workers=3)
+            self.assertEqual(max_running, 3)
+
+    def test_progress(self):
+        with TemporaryDirectory() as td:
+            @memoize(dir_path=td)
+            def function(a):
+                return a
+
+            reported = []
+            function.warm([(i,) for i in range(5)],
+                          progress=lambda counts: reported.append(counts.done))
+            self.assertEqual(reported, [1, 2, 3, 4, 5])
+
+    def test_async_not_supported(self):
+        @memoize
+        async def function(a):
+            return a
+
+        with self.assertRaises(TypeError):
+            function.warm([(1,)])
+
+
+class TestWarmCommand(unittest.TestCase):
+
+    def test_command(self):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        with TemporaryDirectory() as td:
+            args_file = Path(td) / 'args.jsonl'
+            args_file.write_text('[2, 3]\n[3, 2]\n\n[2, 10]\n')
+            output = subprocess.run(
+                [sys.executable, '-m', 'filememo', 'warm',
+                 f'{__package__}.concurrency.warmed:power',
+                 '--args', str(args_file), '--workers', '2'],
+                cwd=str(Path(__file__).parent.parent),
+                check=True, capture_output=True, text=True)
+        self.assertIn('3 done: 0 cached, 3 computed, 0 failed',
+                      output.stderr)
+        result = power.get_many([(2, 3), (3, 2), (2, 10), (5, 5)])
+        self.assertEqual(result.hits, {0: 8, 1: 9, 2: 1024})
+        self.assertEqual(result.misses, [3])
+
+    def test_not_decorated(self):
+        output = subprocess.run(
+            [sys.executable, '-m', 'filememo', 'warm', 'os.path:join'],
+            cwd=str(Path(__file__).parent.parent),
+            capture_output=True, text=True, input='')
+        self.assertNotEqual(output.returncode, 0)
+        self.assertIn('not decorated', output.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()